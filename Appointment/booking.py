@@ -0,0 +1,99 @@
+"""
+Slot reservation
+
+Reservations never check whether a slot is free before inserting. The partial
+unique constraint on (doctor, start_at) decides between concurrent requests,
+so a booking costs a single INSERT and no row or table lock is held while
+the patient decides whether to confirm.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from Doctor.availability import BookingChange, availability_index
+
+from .models import CANCELLED, CONFIRMED, EXPIRED, HELD, Appointment
+
+
+class BookingError(Exception):
+    pass
+
+
+class SlotUnavailable(BookingError):
+    pass
+
+
+class HoldExpired(BookingError):
+    pass
+
+
+def hold_seconds():
+    return getattr(settings, 'APPOINTMENT_HOLD_SECONDS', 300)
+
+
+def _slots_changed(changes):
+    """Publish the slots taken or released once committed; only the booked slots of the index are updated"""
+    transaction.on_commit(lambda: availability_index.booking_changed(changes))
+
+
+def hold(patient, doctor_id, start_at):
+    """Reserve a slot for the patient until the hold expires"""
+    if start_at <= timezone.now() or not availability_index.is_bookable(doctor_id, start_at):
+        raise SlotUnavailable("The doctor does not receive patients at this time.")
+    now = timezone.now()
+    with transaction.atomic():
+        # a stale hold of this very slot must not block the new one
+        Appointment.objects.filter(
+            doctor_id=doctor_id, start_at=start_at, status=HELD, hold_expires_at__lte=now,
+        ).update(status=EXPIRED)
+        try:
+            with transaction.atomic():
+                appointment = Appointment.objects.create(
+                    doctor_id=doctor_id,
+                    patient=patient,
+                    start_at=start_at,
+                    status=HELD,
+                    hold_expires_at=now + timedelta(seconds=hold_seconds()),
+                )
+        except IntegrityError:
+            raise SlotUnavailable("The slot is already taken.")
+        _slots_changed([BookingChange(doctor_id, start_at, True)])
+    return appointment
+
+
+def confirm(appointment):
+    """Turn a hold into a confirmed appointment, unless it expired in the meantime"""
+    updated = Appointment.objects.filter(
+        pk=appointment.pk, status=HELD, hold_expires_at__gt=timezone.now(),
+    ).update(status=CONFIRMED, hold_expires_at=None)
+    if not updated:
+        appointment.refresh_from_db(fields=['status', 'hold_expires_at'])
+        if appointment.status != CONFIRMED:
+            raise HoldExpired("The hold expired, the slot has to be booked again.")
+        return appointment
+    appointment.status, appointment.hold_expires_at = CONFIRMED, None
+    return appointment
+
+
+def cancel(appointment):
+    updated = Appointment.objects.filter(pk=appointment.pk, status__in=(HELD, CONFIRMED)).update(status=CANCELLED)
+    appointment.refresh_from_db(fields=['status'])
+    if updated:
+        _slots_changed([BookingChange(appointment.doctor_id, appointment.start_at, False)])
+    return appointment
+
+
+def expire_holds():
+    """Release all expired holds, returns how many were released"""
+    expired = Appointment.objects.filter(status=HELD, hold_expires_at__lte=timezone.now())
+    rows = list(expired.values_list('pk', 'doctor_id', 'start_at'))
+    count = expired.filter(pk__in=[pk for pk, _, _ in rows]).update(status=EXPIRED)
+    if count == len(rows):
+        _slots_changed([BookingChange(doctor_id, start_at, False) for _, doctor_id, start_at in rows])
+    else:
+        # a hold() expired some of them first and may have taken their slots again
+        doctor_ids = {doctor_id for _, doctor_id, _ in rows}
+        transaction.on_commit(lambda: availability_index.invalidate_many(doctor_ids))
+    return count
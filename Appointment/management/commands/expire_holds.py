@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from Appointment.booking import expire_holds
+
+
+class Command(BaseCommand):
+    help = "Release appointment holds that were not confirmed in time"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0,
+                            help="Keep running and repeat every INTERVAL seconds")
+
+    def handle(self, *args, interval, **options):
+        while True:
+            count = expire_holds()
+            self.stdout.write(f"Released {count} expired hold(s)")
+            if not interval:
+                break
+            time.sleep(interval)
@@ -0,0 +1,54 @@
+import uuid
+
+from django.db import models
+from django.db.models import Q
+from django.utils import timezone
+
+HELD = 'held'
+CONFIRMED = 'confirmed'
+CANCELLED = 'cancelled'
+EXPIRED = 'expired'
+
+OPTIONS_STATUS = (
+    (HELD, 'Held'),
+    (CONFIRMED, 'Confirmed'),
+    (CANCELLED, 'Cancelled'),
+    (EXPIRED, 'Expired'),
+)
+
+ACTIVE_STATUSES = (HELD, CONFIRMED)
+
+
+class AppointmentQuerySet(models.QuerySet):
+
+    def active(self):
+        """Appointments occupying their slot: confirmed ones and holds that did not expire yet"""
+        return self.filter(Q(status=CONFIRMED) | Q(status=HELD, hold_expires_at__gt=timezone.now()))
+
+
+class Appointment(models.Model):
+    """
+       Model of a patient's appointment with a doctor
+       A slot is first held for a limited time and then confirmed by the patient
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    doctor = models.ForeignKey('Doctor.Doctor', on_delete=models.CASCADE)
+    patient = models.ForeignKey('Patient.Patient', on_delete=models.CASCADE)
+    start_at = models.DateTimeField()
+    status = models.CharField(max_length=10, choices=OPTIONS_STATUS, default=HELD)
+    hold_expires_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
+
+    objects = AppointmentQuerySet.as_manager()
+
+    class Meta:
+        ordering = ('start_at',)
+        constraints = [
+            # the database is the single arbiter of who gets a slot
+            models.UniqueConstraint(fields=['doctor', 'start_at'],
+                                    condition=Q(status__in=ACTIVE_STATUSES),
+                                    name='unique_active_appointment_slot'),
+        ]
+        indexes = [
+            models.Index(fields=['status', 'hold_expires_at']),
+        ]
@@ -0,0 +1,23 @@
+from rest_framework import serializers
+
+from Polyclinic.profiling import ProfiledListSerializer, ProfiledSerializerMixin
+
+from .models import Appointment
+
+
+class AppointmentSerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
+    class Meta:
+        list_serializer_class = ProfiledListSerializer
+        model = Appointment
+        fields = [
+            'id',
+            'doctor',
+            'patient',
+            'start_at',
+            'status',
+            'hold_expires_at',
+            'created_at',
+        ]
+        read_only_fields = ['patient', 'status', 'hold_expires_at', 'created_at']
+        # the slot constraint is enforced by the database on insert, not checked beforehand
+        validators = []
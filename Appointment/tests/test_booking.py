@@ -0,0 +1,135 @@
+from datetime import datetime, time, timedelta
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from Appointment import booking
+from Appointment.models import CANCELLED, CONFIRMED, EXPIRED, HELD, Appointment
+from Doctor.availability import AvailabilityIndex, availability_index
+from Doctor.models import Doctor, OpeningHours
+from Patient.models import CustomUser, Patient
+
+MONDAY_8 = timezone.make_aware(datetime(2030, 1, 7, 8, 0))
+
+
+class BookingTest(TestCase):
+
+    def setUp(self):
+        """A doctor receiving on Monday 8:00-9:00 and two patients"""
+        cache.clear()
+        availability_index.reset()
+        doctor_user = CustomUser.objects.create(
+            username="testdoctor",
+            first_name="Test",
+            last_name="Doctor",
+            phone_number="1234567890",
+            email="doctor@example.com",
+            gender="Male",
+            birth_date="1980-01-01",
+        )
+        self.doctor = Doctor.objects.create(user=doctor_user, specialty="Cardiology",
+                                            phone_general="987654321", cabinet="101")
+        OpeningHours.objects.create(weekday=1, open_hour=time(8, 0), close_hour=time(9, 0), doctor=self.doctor)
+        self.patients = [self.create_patient(str(number)) for number in range(2)]
+
+    def create_patient(self, suffix):
+        user = CustomUser.objects.create(
+            username=f"patient{suffix}",
+            first_name="Test",
+            last_name="Patient",
+            phone_number=f"098765432{suffix}",
+            email=f"patient{suffix}@example.com",
+            gender="Woman",
+            birth_date="1990-01-01",
+        )
+        return Patient.objects.create(user=user, region="Region", neighborhood="Neighborhood", city="City",
+                                      allergy="None", blood_type="O+")
+
+    def test_hold_slot(self):
+        appointment = booking.hold(self.patients[0], self.doctor.pk, MONDAY_8)
+        self.assertEqual(appointment.status, HELD)
+        self.assertGreater(appointment.hold_expires_at, timezone.now())
+
+    def test_double_booking_is_rejected(self):
+        """The unique slot constraint rejects the second hold"""
+        booking.hold(self.patients[0], self.doctor.pk, MONDAY_8)
+        with self.assertRaises(booking.SlotUnavailable):
+            booking.hold(self.patients[1], self.doctor.pk, MONDAY_8)
+        self.assertEqual(Appointment.objects.filter(start_at=MONDAY_8).count(), 1)
+
+    def test_slot_outside_opening_hours_is_rejected(self):
+        with self.assertRaises(booking.SlotUnavailable):
+            booking.hold(self.patients[0], self.doctor.pk, MONDAY_8 + timedelta(hours=1))
+
+    def test_expired_hold_releases_slot(self):
+        first = booking.hold(self.patients[0], self.doctor.pk, MONDAY_8)
+        Appointment.objects.filter(pk=first.pk).update(hold_expires_at=timezone.now() - timedelta(seconds=1))
+        second = booking.hold(self.patients[1], self.doctor.pk, MONDAY_8)
+        first.refresh_from_db()
+        self.assertEqual(first.status, EXPIRED)
+        self.assertEqual(second.status, HELD)
+
+    def test_confirm(self):
+        appointment = booking.confirm(booking.hold(self.patients[0], self.doctor.pk, MONDAY_8))
+        self.assertEqual(appointment.status, CONFIRMED)
+        self.assertIsNone(appointment.hold_expires_at)
+
+    def test_confirm_expired_hold(self):
+        appointment = booking.hold(self.patients[0], self.doctor.pk, MONDAY_8)
+        Appointment.objects.filter(pk=appointment.pk).update(hold_expires_at=timezone.now() - timedelta(seconds=1))
+        with self.assertRaises(booking.HoldExpired):
+            booking.confirm(appointment)
+
+    def test_expire_holds(self):
+        appointment = booking.hold(self.patients[0], self.doctor.pk, MONDAY_8)
+        Appointment.objects.filter(pk=appointment.pk).update(hold_expires_at=timezone.now() - timedelta(seconds=1))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(booking.expire_holds(), 1)
+        appointment.refresh_from_db()
+        self.assertEqual(appointment.status, EXPIRED)
+        self.assertEqual(len(availability_index.free_slots(MONDAY_8, MONDAY_8 + timedelta(hours=1))), 2)
+
+    def test_booked_slot_is_not_available(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            booking.hold(self.patients[0], self.doctor.pk, MONDAY_8)
+        slots = availability_index.free_slots(MONDAY_8, MONDAY_8 + timedelta(hours=1))
+        self.assertEqual([slot[1] for slot in slots], [MONDAY_8 + timedelta(minutes=30)])
+
+    def test_cancel_frees_slot(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment = booking.cancel(booking.hold(self.patients[0], self.doctor.pk, MONDAY_8))
+        self.assertEqual(appointment.status, CANCELLED)
+        slots = availability_index.free_slots(MONDAY_8, MONDAY_8 + timedelta(hours=1))
+        self.assertEqual(len(slots), 2)
+
+    def test_other_workers_replay_bookings_without_queries(self):
+        """A booking only updates the booked slots of the other workers, their schedules are not reloaded"""
+        worker = AvailabilityIndex()
+        worker.free_slots(MONDAY_8, MONDAY_8 + timedelta(hours=1))
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment = booking.hold(self.patients[0], self.doctor.pk, MONDAY_8)
+        with self.assertNumQueries(0):
+            slots = worker.free_slots(MONDAY_8, MONDAY_8 + timedelta(hours=1))
+        self.assertEqual([slot[1] for slot in slots], [MONDAY_8 + timedelta(minutes=30)])
+        with self.captureOnCommitCallbacks(execute=True):
+            booking.cancel(appointment)
+            booking.cancel(appointment)
+        with self.assertNumQueries(0):
+            self.assertEqual(len(worker.free_slots(MONDAY_8, MONDAY_8 + timedelta(hours=1))), 2)
+
+    def test_booking_api(self):
+        client = APIClient()
+        client.force_authenticate(self.patients[0].user)
+        response = client.post('/api/v1/appointment/', {'doctor': self.doctor.pk, 'start_at': MONDAY_8.isoformat()})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['status'], HELD)
+
+        response = client.post(f"/api/v1/appointment/{response.data['id']}/confirm/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], CONFIRMED)
+
+        client.force_authenticate(self.patients[1].user)
+        response = client.post('/api/v1/appointment/', {'doctor': self.doctor.pk, 'start_at': MONDAY_8.isoformat()})
+        self.assertEqual(response.status_code, 409)
@@ -0,0 +1,9 @@
+from django.urls import path
+
+from .views import AppointmentActionView, AppointmentListView
+
+urlpatterns = [
+    path('', AppointmentListView.as_view(), name='appointment-list'),
+    path('<uuid:pk>/confirm/', AppointmentActionView.as_view(action='confirm'), name='appointment-confirm'),
+    path('<uuid:pk>/cancel/', AppointmentActionView.as_view(action='cancel'), name='appointment-cancel'),
+]
@@ -0,0 +1,54 @@
+from rest_framework import generics, status
+from rest_framework.exceptions import APIException, PermissionDenied
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from Patient.models import Patient
+
+from . import booking
+from .models import Appointment
+from .serializers import AppointmentSerializer
+
+
+class Conflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'The request conflicts with the current state of the slot.'
+    default_code = 'conflict'
+
+
+def get_patient(user):
+    try:
+        return user.patient
+    except Patient.DoesNotExist:
+        raise PermissionDenied("Only patients can book appointments.")
+
+
+class AppointmentListView(generics.ListCreateAPIView):
+    """Appointments of the current patient; POST holds a slot"""
+    serializer_class = AppointmentSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return Appointment.objects.filter(patient=get_patient(self.request.user))
+
+    def perform_create(self, serializer):
+        data = serializer.validated_data
+        try:
+            serializer.instance = booking.hold(get_patient(self.request.user), data['doctor'].pk, data['start_at'])
+        except booking.BookingError as e:
+            raise Conflict(str(e))
+
+
+class AppointmentActionView(APIView):
+    """Confirm or cancel an appointment of the current patient"""
+    permission_classes = [IsAuthenticated]
+    action = None
+
+    def post(self, request, pk):
+        appointment = generics.get_object_or_404(Appointment, pk=pk, patient=get_patient(request.user))
+        try:
+            getattr(booking, self.action)(appointment)
+        except booking.BookingError as e:
+            raise Conflict(str(e))
+        return Response(AppointmentSerializer(appointment).data)
@@ -0,0 +1,186 @@
+"""
+Write-behind log of patient and medical record reads
+
+Inserting an AccessEvent during every read would add a database round trip
+to the record endpoints. `record()` only appends the events to a buffer of
+the worker process; they are written in batches of AUDIT['BATCH_SIZE'] (with
+COPY on PostgreSQL, else bulk_create), at the latest AUDIT['FLUSH_INTERVAL']
+seconds after they were recorded, and at worker shutdown.
+
+Servers (wsgi.py, asgi.py) call `start_background_flush()`, so that a thread
+of each worker writes the batches. Elsewhere (e.g. the test client) the
+buffer is written at the end of every request, after the response was sent,
+except by async views, which write it before returning: request_finished may
+reach them in a thread of its own (the ASGI test client closes responses
+with thread_sensitive=False), without the connection of the request.
+
+A failed write keeps its events for the next one; past AUDIT['MAX_PENDING']
+unwritten events, reads write the buffer themselves, so that a database
+outage fails the reads instead of leaving them unaudited.
+Events still buffered when a worker is killed (SIGKILL, OOM) are lost.
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connections
+from django.utils import timezone
+
+from Polyclinic.bulk import copy_instances
+
+from .models import READ, AccessEvent
+
+logger = logging.getLogger(__name__)
+
+
+def audit_settings():
+    return {
+        'BATCH_SIZE': 500,
+        'FLUSH_INTERVAL': 1.0,
+        'MAX_PENDING': 50000,
+        # COPY on PostgreSQL
+        'COPY': True,
+        **getattr(settings, 'AUDIT', {}),
+    }
+
+
+def client_address(request):
+    return request.META.get('REMOTE_ADDR') or None
+
+
+def events(request, instances, action=READ):
+    """Unsaved AccessEvents of reading `instances` (patients or records) in a request"""
+    user = getattr(request, 'user', None)
+    actor_id = user.pk if user is not None and user.is_authenticated else None
+    match = getattr(request, 'resolver_match', None)
+    endpoint = match.view_name if match else ''
+    now = timezone.now()
+    return [AccessEvent(occurred_at=now, actor_id=actor_id, action=action, object_type=instance._meta.label,
+                        object_id=instance.pk, patient_id=getattr(instance, 'patient_id', instance.pk),
+                        endpoint=endpoint, remote_addr=client_address(request))
+            for instance in instances]
+
+
+class AuditBuffer:
+    """The events of this process not written yet"""
+
+    def __init__(self):
+        self.events = []
+        # monotonic time of the oldest buffered event
+        self.since = None
+        self.condition = threading.Condition()
+        # one write at a time, in the order of the events
+        self.write_lock = threading.Lock()
+        self.background = False
+        self.thread = None
+        self.pid = None
+
+    def add(self, new_events):
+        """Buffer the events; returns whether the caller has to write the buffer itself (too much is pending)"""
+        if not new_events:
+            return False
+        options = audit_settings()
+        with self.condition:
+            if not self.events:
+                self.since = time.monotonic()
+            self.events.extend(new_events)
+            pending = len(self.events)
+            if self.background:
+                self.start_thread()
+                if pending >= options['BATCH_SIZE']:
+                    self.condition.notify()
+        return pending >= options['MAX_PENDING']
+
+    def due(self):
+        options = audit_settings()
+        with self.condition:
+            return bool(self.events) and (len(self.events) >= options['BATCH_SIZE']
+                                          or time.monotonic() - self.since >= options['FLUSH_INTERVAL'])
+
+    def take(self):
+        with self.condition:
+            taken, self.events, self.since = self.events, [], None
+        return taken
+
+    def restore(self, taken):
+        """Put back the events of a failed write, ahead of those recorded meanwhile"""
+        with self.condition:
+            self.events[:0] = taken
+            self.since = time.monotonic() if self.events else None
+
+    def flush(self, using='default'):
+        """Write the buffered events; returns how many, re-raises (keeping them) when the write fails"""
+        with self.write_lock:
+            taken = self.take()
+            if not taken:
+                return 0
+            try:
+                write(taken, using)
+            except Exception:
+                self.restore(taken)
+                raise
+        return len(taken)
+
+    def clear(self):
+        self.take()
+
+    def start_thread(self):
+        # a worker forked after the server module was imported does not inherit the thread
+        if self.thread is None or not self.thread.is_alive() or self.pid != os.getpid():
+            self.pid = os.getpid()
+            self.thread = threading.Thread(target=self.run, name='audit-flush', daemon=True)
+            self.thread.start()
+
+    def run(self):
+        while True:
+            options = audit_settings()
+            with self.condition:
+                self.condition.wait(options['FLUSH_INTERVAL'])
+            if not self.due():
+                continue
+            close_old_connections()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Writing the audit log failed, retrying in %ss", options['FLUSH_INTERVAL'])
+
+
+def write(batch, using='default'):
+    connection = connections[using]
+    options = audit_settings()
+    if options['COPY'] and connection.vendor == 'postgresql':
+        copy_instances(connection, AccessEvent, batch)
+    else:
+        AccessEvent.objects.using(using).bulk_create(batch, batch_size=options['BATCH_SIZE'])
+
+
+buffer = AuditBuffer()
+
+
+def record(request, instances, action=READ):
+    """Log the reading of patients or records by a request"""
+    if buffer.add(events(request, instances, action)):
+        buffer.flush()
+
+
+async def arecord(request, instances, action=READ):
+    """record() for async views"""
+    if buffer.add(events(request, instances, action)) or not buffer.background:
+        await sync_to_async(buffer.flush)()
+
+
+def start_background_flush():
+    """Write the buffer from a thread of each worker process, instead of at the end of requests"""
+    buffer.background = True
+
+
+@atexit.register
+def flush_at_exit():
+    try:
+        buffer.flush()
+    except Exception:
+        logger.exception("Writing the audit log at shutdown failed, %s event(s) lost", len(buffer.events))
@@ -0,0 +1,29 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+
+from Audit import partitions
+
+
+class Command(BaseCommand):
+    help = ("Create the monthly partitions of the access log ahead of time (run it monthly), and detach old "
+            "ones to archive them. PostgreSQL only, see Audit.partitions")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ahead', type=int, default=None,
+                            help="Months to create after the current one, defaults to AUDIT['PARTITIONS_AHEAD']")
+        parser.add_argument('--detach-before', type=date.fromisoformat, default=None,
+                            help="Detach the partitions of the months before this date (YYYY-MM-DD)")
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, ahead, detach_before, database, **options):
+        connection = connections[database]
+        if connection.vendor != 'postgresql':
+            self.stdout.write(f"The access log is only partitioned on PostgreSQL, not on {connection.vendor}")
+            return
+        with transaction.atomic(using=database):
+            for name in partitions.ensure(connection, ahead):
+                self.stdout.write(f"Created {name}")
+            for name in partitions.detach(connection, detach_before) if detach_before else []:
+                self.stdout.write(f"Detached {name}, archive and drop it when it is no longer needed")
@@ -0,0 +1,69 @@
+import os
+import time
+import uuid
+
+from django.db import models
+from django.utils import timezone
+
+READ = 'read'
+DOWNLOAD = 'download'
+
+OPTIONS_ACTION = (
+    (READ, 'Read'),
+    (DOWNLOAD, 'Download'),
+)
+
+
+def event_id():
+    """UUID starting with the millisecond timestamp (the version 7 layout), so that new ids append to the index"""
+    value = (time.time_ns() // 1_000_000) << 80 | int.from_bytes(os.urandom(10), 'big')
+    # version 7, variant 10
+    value = value & ~(0xF << 76) | 7 << 76
+    value = value & ~(0x3 << 62) | 0x2 << 62
+    return uuid.UUID(int=value)
+
+
+class AppendOnlyQuerySet(models.QuerySet):
+
+    def update(self, **kwargs):
+        raise ValueError("Access events are append-only.")
+
+    def delete(self):
+        raise ValueError("Access events are append-only.")
+
+
+class AccessEvent(models.Model):
+    """
+       A read of a patient or medical record, written behind by Audit.log
+       Append-only: rows are never updated or deleted, old months are detached as whole partitions
+       (see Audit.partitions). Users and records are referred to by id only, events outlive them
+    """
+    id = models.UUIDField(primary_key=True, default=event_id, editable=False)
+    occurred_at = models.DateTimeField(default=timezone.now, editable=False)
+    actor_id = models.UUIDField(null=True, editable=False)
+    action = models.CharField(max_length=10, choices=OPTIONS_ACTION, default=READ, editable=False)
+    # label of the model read, e.g. Patient.Record
+    object_type = models.CharField(max_length=50, editable=False)
+    object_id = models.UUIDField(editable=False)
+    patient_id = models.UUIDField(editable=False)
+    # URL name of the endpoint
+    endpoint = models.CharField(max_length=100, blank=True, editable=False)
+    remote_addr = models.GenericIPAddressField(null=True, editable=False)
+
+    objects = AppendOnlyQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['patient_id', '-occurred_at']),
+            models.Index(fields=['actor_id', '-occurred_at']),
+            models.Index(fields=['object_id', '-occurred_at']),
+            models.Index(fields=['-occurred_at']),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Access events are append-only.")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError("Access events are append-only.")
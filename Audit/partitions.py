@@ -0,0 +1,142 @@
+"""
+Monthly partitions of the access log (PostgreSQL)
+
+The access log only grows, and it is queried by time. On PostgreSQL the
+table is range partitioned by month of `occurred_at`: a query for a period
+only scans its months, and old months are detached (kept as plain tables to
+archive) instead of deleted row by row. `ensure()` runs after every migrate
+and from `manage.py partition_audit_log`, which cron runs monthly:
+- the table created by migrate, as long as it is still empty, is recreated
+  as a partitioned table, with the primary key (id, occurred_at) PostgreSQL
+  requires;
+- the partitions of this month and the next AUDIT['PARTITIONS_AHEAD'] ones are
+  created, plus a default partition catching events beyond them; when the
+  default partition already holds events of a month to create (e.g. cron
+  did not run), PostgreSQL would refuse the new partition, so the default
+  partition is detached first and its events inserted again afterwards;
+- a trigger rejects any UPDATE or DELETE.
+Other databases keep the plain table.
+"""
+import re
+from datetime import date
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+from .models import AccessEvent
+
+PARTITION_NAME = re.compile(r'_p(\d{4})_(\d{2})$')
+
+
+def months_ahead():
+    return getattr(settings, 'AUDIT', {}).get('PARTITIONS_AHEAD', 3)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table, month):
+    return f'{table}_p{month.year:04d}_{month.month:02d}'
+
+
+def is_partitioned(cursor, table):
+    cursor.execute('SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass',
+                   [cursor.db.ops.quote_name(table)])
+    return cursor.fetchone() is not None
+
+
+def partitions(cursor, table):
+    """{month: name} of the monthly partitions of the table"""
+    cursor.execute('SELECT child.relname FROM pg_inherits JOIN pg_class child ON child.oid = inhrelid '
+                   'WHERE inhparent = %s::regclass', [cursor.db.ops.quote_name(table)])
+    months = {}
+    for name, in cursor.fetchall():
+        match = PARTITION_NAME.search(name)
+        if match:
+            months[date(int(match[1]), int(match[2]), 1)] = name
+    return months
+
+
+def holds_events(cursor, table, months):
+    """Whether the table holds events of any of the months"""
+    if not months:
+        return False
+    quote = cursor.db.ops.quote_name
+    ranges = ' OR '.join(f'({quote("occurred_at")} >= %s AND {quote("occurred_at")} < %s)' for _ in months)
+    cursor.execute(f'SELECT EXISTS (SELECT 1 FROM {quote(table)} WHERE {ranges})',
+                   [bound for month in months for bound in (month, add_months(month, 1))])
+    return cursor.fetchone()[0]
+
+
+def convert(connection, cursor, table):
+    """Recreate the empty table created by migrate as a partitioned table"""
+    quote = connection.ops.quote_name
+    cursor.execute(f'SELECT EXISTS (SELECT 1 FROM {quote(table)})')
+    if cursor.fetchone()[0]:
+        raise ImproperlyConfigured(f"{table} already holds events and is not partitioned; "
+                                   f"partition it by hand (see Audit.partitions).")
+    unpartitioned = f'{table}_unpartitioned'
+    cursor.execute(f'ALTER TABLE {quote(table)} RENAME TO {quote(unpartitioned)}')
+    cursor.execute(f'CREATE TABLE {quote(table)} (LIKE {quote(unpartitioned)} INCLUDING DEFAULTS '
+                   f'INCLUDING CONSTRAINTS) PARTITION BY RANGE ({quote("occurred_at")})')
+    cursor.execute(f'DROP TABLE {quote(unpartitioned)}')
+    cursor.execute(f'ALTER TABLE {quote(table)} ADD PRIMARY KEY ({quote("id")}, {quote("occurred_at")})')
+    with connection.schema_editor(atomic=False) as editor:
+        for index in AccessEvent._meta.indexes:
+            editor.add_index(AccessEvent, index)
+
+
+def ensure(connection, ahead=None, today=None):
+    """Partition the table, if needed, and create the partitions up to `ahead` months from now"""
+    if connection.vendor != 'postgresql':
+        return []
+    table = AccessEvent._meta.db_table
+    quote = connection.ops.quote_name
+    ahead = months_ahead() if ahead is None else ahead
+    first = (today or date.today()).replace(day=1)
+    created = []
+    with connection.cursor() as cursor:
+        if not is_partitioned(cursor, table):
+            convert(connection, cursor, table)
+        existing = partitions(cursor, table)
+        missing = [month for month in (add_months(first, offset) for offset in range(ahead + 1))
+                   if month not in existing]
+        default, moved = f'{table}_default', f'{table}_default_moved'
+        cursor.execute('SELECT to_regclass(%s) IS NOT NULL', [quote(default)])
+        move = cursor.fetchone()[0] and holds_events(cursor, default, missing)
+        if move:
+            cursor.execute(f'ALTER TABLE {quote(table)} DETACH PARTITION {quote(default)}')
+            cursor.execute(f'ALTER TABLE {quote(default)} RENAME TO {quote(moved)}')
+        for month in missing:
+            name = partition_name(table, month)
+            # DDL takes no parameters; the bounds are dates
+            cursor.execute(f'CREATE TABLE {quote(name)} PARTITION OF {quote(table)} '
+                           f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')")
+            created.append(name)
+        cursor.execute(f'CREATE TABLE IF NOT EXISTS {quote(default)} PARTITION OF {quote(table)} DEFAULT')
+        if move:
+            # inserting is allowed by the trigger, and routes every event to its partition
+            cursor.execute(f'INSERT INTO {quote(table)} SELECT * FROM {quote(moved)}')
+            cursor.execute(f'DROP TABLE {quote(moved)}')
+        cursor.execute('CREATE OR REPLACE FUNCTION audit_append_only() RETURNS trigger AS $$ '
+                       'BEGIN RAISE EXCEPTION \'the access log is append-only\'; END $$ LANGUAGE plpgsql')
+        cursor.execute(f'CREATE OR REPLACE TRIGGER audit_append_only BEFORE UPDATE OR DELETE ON {quote(table)} '
+                       f'FOR EACH ROW EXECUTE FUNCTION audit_append_only()')
+    return created
+
+
+def detach(connection, before):
+    """Detach the monthly partitions before the month `before`; returns their names, tables left to archive"""
+    if connection.vendor != 'postgresql':
+        return []
+    table = AccessEvent._meta.db_table
+    quote = connection.ops.quote_name
+    detached = []
+    with connection.cursor() as cursor:
+        for month, name in sorted(partitions(cursor, table).items()):
+            if month < before.replace(day=1):
+                cursor.execute(f'ALTER TABLE {quote(table)} DETACH PARTITION {quote(name)}')
+                detached.append(name)
+    return detached
@@ -0,0 +1,22 @@
+from rest_framework import serializers
+
+from Polyclinic.profiling import ProfiledListSerializer, ProfiledSerializerMixin
+
+from .models import AccessEvent
+
+
+class AccessEventSerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
+    class Meta:
+        list_serializer_class = ProfiledListSerializer
+        model = AccessEvent
+        fields = [
+            'id',
+            'occurred_at',
+            'actor_id',
+            'action',
+            'object_type',
+            'object_id',
+            'patient_id',
+            'endpoint',
+            'remote_addr',
+        ]
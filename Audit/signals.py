@@ -0,0 +1,34 @@
+import logging
+
+from django.core.signals import request_finished
+from django.db import connections, transaction
+from django.db.models.signals import post_migrate
+from django.dispatch import receiver
+
+from . import log, partitions
+from .models import AccessEvent
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(request_finished)
+def write_due_events(sender, **kwargs):
+    # sent once the response went out; servers write from their background thread instead
+    if log.buffer.background or not log.buffer.events:
+        return
+    try:
+        log.buffer.flush()
+    except Exception:
+        logger.exception("Writing the audit log failed, retrying after the next request")
+
+
+@receiver(post_migrate)
+def partition_access_log(sender, app_config, using, **kwargs):
+    connection = connections[using]
+    if app_config.name != 'Audit' or connection.vendor != 'postgresql':
+        return
+    # e.g. after migrating Audit back to zero
+    if AccessEvent._meta.db_table not in connection.introspection.table_names():
+        return
+    with transaction.atomic(using=using):
+        partitions.ensure(connection)
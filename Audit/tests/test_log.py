@@ -0,0 +1,225 @@
+import threading
+import warnings
+from datetime import datetime, timedelta, timezone
+from unittest import mock, skipUnless
+
+from django.apps import apps
+from django.contrib.auth.models import Permission
+from django.db import connection
+from django.test import AsyncClient, TestCase, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from Audit import log, partitions, signals
+from Audit.log import AuditBuffer
+from Audit.models import AccessEvent, event_id
+from Doctor.models import Doctor
+from Patient.models import CustomUser, Patient, Record
+
+
+def create_user(number, **kwargs):
+    return CustomUser.objects.create(username=f"user{number}", first_name="John", last_name="Doe",
+                                     phone_number=f"123456789{number}", email=f"user{number}@example.com",
+                                     gender="Male", birth_date="1990-01-01", is_active=True, **kwargs)
+
+
+class AuditTestCase(TestCase):
+
+    def setUp(self):
+        """A patient with three records, their doctor and a compliance officer"""
+        log.buffer.clear()
+        self.addCleanup(log.buffer.clear)
+        # writes at the end of requests log their failures, which must fail the tests
+        self.enterContext(self.assertNoLogs('Audit', 'ERROR'))
+        self.doctor = Doctor.objects.create(user=create_user(0), specialty="Cardiology", phone_general="1",
+                                            cabinet="1")
+        self.patient = Patient.objects.create(user=create_user(1), region="Region", neighborhood="Neighborhood",
+                                              city="City", allergy="None", blood_type="O+")
+        start = datetime(2030, 1, 7, 8, tzinfo=timezone.utc)
+        self.records = [Record.objects.create(description=f"Visit {days}", doctor_autohor=self.doctor,
+                                              patient=self.patient, created_at=start + timedelta(days=days))
+                        for days in range(3)]
+        self.officer = create_user(2)
+        self.officer.user_permissions.add(Permission.objects.get(codename='view_accessevent'))
+        self.client = APIClient()
+
+
+class RecordAccessTest(AuditTestCase):
+
+    def test_profile_read_is_logged_after_the_response(self):
+        self.client.force_authenticate(self.patient.user)
+        with self.assertNumQueries(2):
+            # the patient, then the event once the response is sent
+            self.assertEqual(self.client.get('/api/v1/patient/me/').status_code, 200)
+        event = AccessEvent.objects.get()
+        self.assertEqual(event.actor_id, self.patient.user_id)
+        self.assertEqual((event.object_type, event.object_id, event.patient_id),
+                         ('Patient.Patient', self.patient.pk, self.patient.pk))
+        self.assertEqual((event.action, event.endpoint, event.remote_addr), ('read', 'patient-profile', '127.0.0.1'))
+
+    def test_every_record_of_the_page_is_logged_in_one_write(self):
+        self.client.force_authenticate(self.doctor.user)
+        with mock.patch.object(log, 'write', wraps=log.write) as write:
+            self.client.get(f'/api/v1/patient/{self.patient.pk}/records/?page_size=2')
+        self.assertEqual(write.call_count, 1)
+        events = AccessEvent.objects.order_by('occurred_at', 'id')
+        self.assertEqual({event.object_id for event in events}, {self.records[2].pk, self.records[1].pk})
+        self.assertEqual({(event.object_type, event.patient_id, event.actor_id) for event in events},
+                         {('Patient.Record', self.patient.pk, self.doctor.user_id)})
+
+    async def test_async_views_are_logged(self):
+        token = await Token.objects.acreate(user=self.patient.user)
+        response = await AsyncClient().get(f'/api/v1/async/patient/{self.patient.pk}/records/',
+                                           headers={'Authorization': f'Token {token.key}'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(log.buffer.events, [])
+        self.assertEqual(await AccessEvent.objects.filter(endpoint='async-patient-records').acount(), 3)
+
+
+class AuditBufferTest(AuditTestCase):
+
+    def events(self, count):
+        request = mock.Mock(user=self.doctor.user, resolver_match=None, META={'REMOTE_ADDR': '10.0.0.1'})
+        return log.events(request, self.records[:count])
+
+    def test_due_on_size_or_age(self):
+        buffer = AuditBuffer()
+        with override_settings(AUDIT={'BATCH_SIZE': 3, 'FLUSH_INTERVAL': 60}):
+            buffer.add(self.events(2))
+            self.assertFalse(buffer.due())
+            buffer.add(self.events(1))
+            self.assertTrue(buffer.due())
+        buffer.clear()
+        with override_settings(AUDIT={'FLUSH_INTERVAL': 0}):
+            self.assertFalse(buffer.due())
+            buffer.add(self.events(1))
+            self.assertTrue(buffer.due())
+
+    def test_failed_write_keeps_the_events_in_order(self):
+        buffer = AuditBuffer()
+        first = self.events(2)
+        buffer.add(first)
+        with mock.patch.object(log, 'write', side_effect=ConnectionError):
+            with self.assertRaises(ConnectionError):
+                buffer.flush()
+        second = self.events(1)
+        buffer.add(second)
+        self.assertEqual(buffer.events, first + second)
+        self.assertEqual(buffer.flush(), 3)
+        self.assertEqual(AccessEvent.objects.count(), 3)
+        self.assertEqual(buffer.events, [])
+
+    @override_settings(AUDIT={'MAX_PENDING': 4})
+    def test_reads_write_the_buffer_past_max_pending(self):
+        request = mock.Mock(user=self.doctor.user, resolver_match=None, META={})
+        log.record(request, self.records)
+        self.assertEqual(AccessEvent.objects.count(), 0)
+        log.record(request, self.records[:1])
+        self.assertEqual(AccessEvent.objects.count(), 4)
+
+    @override_settings(AUDIT={'BATCH_SIZE': 2, 'FLUSH_INTERVAL': 60})
+    def test_background_thread_writes_full_batches(self):
+        buffer = AuditBuffer()
+        buffer.background = True
+        written = threading.Event()
+        with mock.patch.object(log, 'write', side_effect=lambda batch, using: written.set()) as write:
+            buffer.add(self.events(1))
+            self.assertFalse(written.wait(0.2))
+            buffer.add(self.events(1))
+            self.assertTrue(written.wait(5))
+        self.assertEqual(len(write.call_args[0][0]), 2)
+
+
+class AccessEventTest(TestCase):
+
+    def test_ids_follow_time(self):
+        ids = [event_id() for _ in range(5)]
+        self.assertEqual(ids[0].version, 7)
+        self.assertEqual(len(set(ids)), 5)
+        self.assertLessEqual(ids[0].int >> 80, ids[-1].int >> 80)
+
+    def test_append_only(self):
+        event = AccessEvent.objects.create(object_type='Patient.Patient', object_id=event_id(), patient_id=event_id())
+        with self.assertRaises(ValueError):
+            event.save()
+        with self.assertRaises(ValueError):
+            event.delete()
+        with self.assertRaises(ValueError):
+            AccessEvent.objects.update(endpoint='x')
+        with self.assertRaises(ValueError):
+            AccessEvent.objects.all().delete()
+
+    def test_partitions(self):
+        self.assertEqual(partitions.add_months(datetime(2030, 11, 1).date(), 3), datetime(2031, 2, 1).date())
+        self.assertEqual(partitions.partition_name('Audit_accessevent', datetime(2030, 2, 1).date()),
+                         'Audit_accessevent_p2030_02')
+        self.assertRegex('Audit_accessevent_p2030_02', partitions.PARTITION_NAME)
+        # only PostgreSQL is partitioned
+        self.assertEqual(partitions.ensure(connection), [])
+
+    def test_migrate_without_the_table(self):
+        with mock.patch.object(partitions, 'ensure') as ensure, \
+                mock.patch.object(connection, 'vendor', 'postgresql'), \
+                mock.patch.object(connection.introspection, 'table_names', return_value=[]):
+            signals.partition_access_log(None, apps.get_app_config('Audit'), connection.alias)
+        ensure.assert_not_called()
+
+
+@skipUnless(connection.vendor == 'postgresql', "only PostgreSQL partitions the access log")
+class PartitionTest(TestCase):
+
+    def test_events_of_the_default_partition_are_moved(self):
+        month = partitions.add_months(datetime.now().date().replace(day=1), 24)
+        AccessEvent.objects.create(object_type='Patient.Patient', object_id=event_id(), patient_id=event_id(),
+                                   occurred_at=datetime(month.year, month.month, 15, tzinfo=timezone.utc))
+        created = partitions.ensure(connection, ahead=0, today=month)
+        self.assertEqual(created, [partitions.partition_name(AccessEvent._meta.db_table, month)])
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT COUNT(*) FROM {connection.ops.quote_name(created[0])}')
+            self.assertEqual(cursor.fetchone()[0], 1)
+        self.assertEqual(AccessEvent.objects.count(), 1)
+
+
+class AccessEventListViewTest(AuditTestCase):
+
+    def read_records(self, user):
+        self.client.force_authenticate(user)
+        self.client.get(f'/api/v1/patient/{self.patient.pk}/records/')
+
+    def test_events_newest_first_by_cursor(self):
+        self.read_records(self.doctor.user)
+        self.read_records(self.patient.user)
+        self.client.force_authenticate(self.officer)
+        url, pages = '/api/v1/audit/events/?page_size=4', []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            pages.append(response.data['results'])
+            url = response.data['next']
+        self.assertEqual([len(page) for page in pages], [4, 2])
+        events = [event for page in pages for event in page]
+        self.assertEqual([event['actor_id'] for event in events[:3]], [str(self.patient.user_id)] * 3)
+        self.assertEqual(len({event['id'] for event in events}), 6)
+
+    def test_filters(self):
+        self.read_records(self.doctor.user)
+        self.read_records(self.patient.user)
+        self.client.force_authenticate(self.officer)
+        response = self.client.get('/api/v1/audit/events/', {'actor': self.doctor.user_id,
+                                                             'object': self.records[0].pk})
+        self.assertEqual(len(response.data['results']), 1)
+        response = self.client.get('/api/v1/audit/events/', {'patient': self.patient.pk, 'since': '2100-01-01'})
+        self.assertEqual(response.data['results'], [])
+        with warnings.catch_warnings():
+            # a naive datetime would warn with USE_TZ
+            warnings.simplefilter('error')
+            response = self.client.get('/api/v1/audit/events/', {'since': '2000-01-01T00:00', 'until': '2100-01-01'})
+        self.assertEqual(len(response.data['results']), 6)
+        response = self.client.get('/api/v1/audit/events/', {'actor': 'nope', 'action': 'write',
+                                                             'since': 'yesterday', 'until': '2100-13-01'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.data), {'actor', 'action', 'since', 'until'})
+
+    def test_compliance_officers_only(self):
+        self.client.force_authenticate(self.doctor.user)
+        self.assertEqual(self.client.get('/api/v1/audit/events/').status_code, 403)
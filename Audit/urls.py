@@ -0,0 +1,7 @@
+from django.urls import path
+
+from .views import AccessEventListView
+
+urlpatterns = [
+    path('events/', AccessEventListView.as_view(), name='audit-events'),
+]
@@ -0,0 +1,67 @@
+import uuid
+
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework import generics
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import BasePermission, IsAuthenticated
+
+from Patient.pagination import TimelinePagination
+
+from .models import OPTIONS_ACTION, AccessEvent
+from .serializers import AccessEventSerializer
+
+
+class IsComplianceOfficer(BasePermission):
+    """Users allowed to view access events (`Audit.view_accessevent`, e.g. through a group), and superusers"""
+
+    def has_permission(self, request, view):
+        return request.user.has_perm('Audit.view_accessevent')
+
+
+class AccessEventPagination(TimelinePagination):
+    ordering_field = 'occurred_at'
+    page_size = 100
+    max_page_size = 1000
+
+
+class AccessEventListView(generics.ListAPIView):
+    """
+       Reads of patients and medical records, newest first, paginated by cursor
+       Query parameters (combined with AND): patient, actor, object (ids), action, since, until (ISO 8601);
+       a period only scans the monthly partitions it covers
+    """
+    serializer_class = AccessEventSerializer
+    permission_classes = [IsAuthenticated, IsComplianceOfficer]
+    pagination_class = AccessEventPagination
+
+    id_filters = {'patient': 'patient_id', 'actor': 'actor_id', 'object': 'object_id'}
+    time_filters = {'since': 'occurred_at__gte', 'until': 'occurred_at__lt'}
+
+    def get_queryset(self):
+        params = self.request.query_params
+        filters, errors = {}, {}
+        for name, lookup in self.id_filters.items():
+            if params.get(name):
+                try:
+                    filters[lookup] = uuid.UUID(params[name])
+                except ValueError:
+                    errors[name] = ["Must be a valid UUID."]
+        for name, lookup in self.time_filters.items():
+            if params.get(name):
+                try:
+                    value = parse_datetime(params[name])
+                except ValueError:
+                    value = None
+                if value is None:
+                    errors[name] = ["Must be an ISO 8601 date or datetime."]
+                    continue
+                # without an offset, in the current time zone
+                filters[lookup] = timezone.make_aware(value) if timezone.is_naive(value) else value
+        if params.get('action'):
+            if params['action'] not in dict(OPTIONS_ACTION):
+                errors['action'] = [f"One of: {', '.join(dict(OPTIONS_ACTION))}."]
+            filters['action'] = params['action']
+        if errors:
+            raise ValidationError(errors)
+        return AccessEvent.objects.filter(**filters)
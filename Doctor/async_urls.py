@@ -0,0 +1,7 @@
+from django.urls import path
+
+from .async_views import availability
+
+urlpatterns = [
+    path('availability/', availability, name='async-doctor-availability'),
+]
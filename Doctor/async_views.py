@@ -0,0 +1,22 @@
+from asgiref.sync import sync_to_async
+
+from Patient.async_views import async_api_view, json_response
+
+from .availability import availability_index
+from .serializers import AvailabilityQuerySerializer, AvailableSlotSerializer
+
+
+@async_api_view(require_authentication=False)
+async def availability(request):
+    """First free appointment slots (see AvailabilityView)"""
+    params = request.GET
+    query = AvailabilityQuerySerializer(data={
+        key: params[param]
+        for key, param in (('specialty', 'specialty'), ('start', 'from'), ('end', 'to'), ('limit', 'limit'))
+        if param in params
+    })
+    query.is_valid(raise_exception=True)
+    # the index is in memory, but loads and syncs itself through the ORM and the cache
+    slots = await sync_to_async(availability_index.free_slots)(**query.validated_data)
+    data = [{'doctor': doctor, 'start': start, 'end': end} for doctor, start, end in slots]
+    return json_response({'results': AvailableSlotSerializer(data, many=True).data})
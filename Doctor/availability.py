@@ -0,0 +1,296 @@
+"""
+Slot availability engine
+
+Opening hours are a weekly template, so every doctor's bookable slots are
+precomputed once as sorted offsets (minutes since Monday 00:00). For every
+specialty those offsets are merged into one sorted array, which turns
+"first N free slots of all cardiologists this week" into a bisect plus a short
+forward scan instead of expanding the schedule of every doctor per request.
+
+Workers publish their changes in a log kept in the shared cache: the id of a
+doctor whose schedule changed, which every worker reloads, or a
+`BookingChange`, a slot taken or released, which only updates the booked
+slots.
+"""
+import logging
+import threading
+from bisect import bisect_left
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+
+VERSION_KEY = 'availability-index:version'
+CHANGE_KEY = 'availability-index:change:%s'
+CHANGE_TIMEOUT = 60 * 60
+# doctors changed at once past which reloading the whole index is cheaper than refreshing each
+RELOAD_AFTER = 50
+
+
+class BookingChange(namedtuple('BookingChange', 'doctor_id start taken')):
+    """The slot of a doctor starting at `start` was taken (`taken` true) or released"""
+    __slots__ = ()
+
+
+def slot_minutes():
+    return getattr(settings, 'AVAILABILITY_SLOT_MINUTES', 30)
+
+
+_cache_checked = False
+
+
+def warn_per_process_cache():
+    """The changes reach the other workers only through a cache they share, e.g. Redis (REDIS_URL)"""
+    global _cache_checked
+
+    if _cache_checked:
+        return
+    _cache_checked = True
+    if isinstance(caches[DEFAULT_CACHE_ALIAS], LocMemCache) and not settings.DEBUG:
+        logger.warning('The default cache is per process: with several workers the availability index and the '
+                       'doctor directory of the other workers miss the changes; set REDIS_URL')
+
+
+def expand_opening_hours(rows, step):
+    """Expand (weekday, open_hour, close_hour) rows into sorted weekly slot offsets"""
+    offsets = set()
+    for weekday, open_hour, close_hour in rows:
+        day = (weekday - 1) * MINUTES_PER_DAY
+        start = day + open_hour.hour * 60 + open_hour.minute
+        end = day + close_hour.hour * 60 + close_hour.minute
+        offsets.update(range(start, end - step + 1, step))
+    return sorted(offsets)
+
+
+def week_start(moment):
+    """Monday 00:00 of the week containing `moment`, in the current time zone"""
+    local = timezone.localtime(moment)
+    monday = local.date() - timedelta(days=local.weekday())
+    return timezone.make_aware(datetime.combine(monday, datetime.min.time()))
+
+
+class _MergedSlots:
+    """Weekly slots of a group of doctors, sorted by (offset, doctor)"""
+    __slots__ = ('offsets', 'doctors')
+
+    def __init__(self, slots_by_doctor, doctor_ids):
+        entries = sorted(
+            (offset, doctor_id)
+            for doctor_id in doctor_ids
+            for offset in slots_by_doctor.get(doctor_id, ())
+        )
+        self.offsets = [offset for offset, _ in entries]
+        self.doctors = [doctor_id for _, doctor_id in entries]
+
+
+class AvailabilityIndex:
+    """
+       In-process index of bookable slots
+       Kept in sync through model signals; other workers pick the changes up
+       from the shared cache, one doctor at a time
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._version = 0
+        self._step = None
+        self._slots = {}
+        self._specialty = {}
+        self._booked = {}
+        self._merged = {}
+
+    def _load(self):
+        from .models import Doctor, OpeningHours
+
+        warn_per_process_cache()
+        self._step = slot_minutes()
+        self._version = cache.get(VERSION_KEY, 0)
+        self._specialty = dict(Doctor.objects.values_list('id', 'specialty'))
+        rows = {}
+        for doctor_id, *row in OpeningHours.objects.values_list('doctor_id', 'weekday', 'open_hour', 'close_hour'):
+            rows.setdefault(doctor_id, []).append(row)
+        self._slots = {doctor_id: expand_opening_hours(rows.get(doctor_id, ()), self._step)
+                       for doctor_id in self._specialty}
+        self._booked = {}
+        for doctor_id, start in self._booked_slots():
+            self._booked.setdefault(doctor_id, set()).add(start)
+        self._merged = {}
+        self._loaded = True
+
+    @staticmethod
+    def _booked_slots(doctor_id=None):
+        """(doctor_id, start) of the upcoming slots taken by appointments"""
+        if not apps.is_installed('Appointment'):
+            return []
+        from Appointment.models import Appointment
+
+        appointments = Appointment.objects.active().filter(start_at__gte=timezone.now())
+        if doctor_id is not None:
+            appointments = appointments.filter(doctor_id=doctor_id)
+        return appointments.values_list('doctor_id', 'start_at')
+
+    def _sync(self):
+        """Load the index on first use and replay changes published by other workers"""
+        if not self._loaded:
+            self._load()
+            return
+        version = cache.get(VERSION_KEY, 0)
+        if version == self._version:
+            return
+        keys = [CHANGE_KEY % number for number in range(self._version + 1, version + 1)]
+        changes = cache.get_many(keys)
+        if version < self._version or len(changes) != len(keys):
+            # the change log expired or the cache was flushed
+            self._load()
+            return
+        changed = {change for change in changes.values() if not isinstance(change, BookingChange)}
+        if len(changed) > RELOAD_AFTER:
+            self._load()
+            return
+        # refreshed doctors read their bookings from the database, which already holds these changes
+        entries = [changes[key] for key in keys]
+        self._apply_booking_changes(entry for entry in entries
+                                    if isinstance(entry, BookingChange) and entry.doctor_id not in changed)
+        for doctor_id in changed:
+            self._refresh(doctor_id)
+        self._version = version
+
+    def _refresh(self, doctor_id):
+        from .models import Doctor, OpeningHours
+
+        old_specialty = self._specialty.pop(doctor_id, None)
+        self._slots.pop(doctor_id, None)
+        specialty = Doctor.objects.filter(pk=doctor_id).values_list('specialty', flat=True).first()
+        if specialty is not None:
+            self._specialty[doctor_id] = specialty
+            rows = OpeningHours.objects.filter(doctor_id=doctor_id).values_list('weekday', 'open_hour', 'close_hour')
+            self._slots[doctor_id] = expand_opening_hours(rows, self._step)
+            self._booked[doctor_id] = {start for _, start in self._booked_slots(doctor_id)}
+        else:
+            self._booked.pop(doctor_id, None)
+        for key in {old_specialty, specialty, None}:
+            self._merged.pop(key, None)
+
+    def _apply_booking_changes(self, changes):
+        for change in changes:
+            if change.doctor_id not in self._specialty:
+                continue
+            if change.taken:
+                self._booked.setdefault(change.doctor_id, set()).add(change.start)
+            else:
+                self._booked.get(change.doctor_id, set()).discard(change.start)
+
+    def _publish(self, changes):
+        """Append changes to the shared log; this worker skips them when replaying, it applies them itself"""
+        try:
+            version = cache.incr(VERSION_KEY, len(changes))
+        except ValueError:
+            cache.add(VERSION_KEY, 0, timeout=None)
+            version = cache.incr(VERSION_KEY, len(changes))
+        first = version - len(changes) + 1
+        cache.set_many({CHANGE_KEY % (first + number): change for number, change in enumerate(changes)},
+                       CHANGE_TIMEOUT)
+        if self._loaded and first == self._version + 1:
+            self._version = version
+
+    def invalidate(self, doctor_id):
+        """Reload the slots and bookings of a single doctor and let the other workers know"""
+        self.invalidate_many([doctor_id])
+
+    def invalidate_many(self, doctor_ids):
+        """invalidate() of several doctors, the whole index being reloaded when they are many"""
+        doctor_ids = list(doctor_ids)
+        if not doctor_ids:
+            return
+        with self._lock:
+            self._publish(doctor_ids)
+            if not self._loaded:
+                return
+            if len(doctor_ids) > RELOAD_AFTER:
+                self._load()
+                return
+            for doctor_id in doctor_ids:
+                self._refresh(doctor_id)
+
+    def booking_changed(self, changes):
+        """
+           Record slots taken or released (`BookingChange`s) and let the other workers know
+           Unlike invalidate(), neither this worker nor the others query the database
+        """
+        changes = list(changes)
+        if not changes:
+            return
+        with self._lock:
+            self._publish(changes)
+            if self._loaded:
+                self._apply_booking_changes(changes)
+
+    def reset(self):
+        with self._lock:
+            self._loaded = False
+
+    def _merged_slots(self, specialty):
+        merged = self._merged.get(specialty)
+        if merged is None and specialty is not None and specialty not in self._specialty.values():
+            # not kept: the specialty comes from a query parameter, which could otherwise grow the cache forever
+            return _MergedSlots(self._slots, [])
+        if merged is None:
+            doctor_ids = [doctor_id for doctor_id, value in self._specialty.items()
+                          if specialty is None or value == specialty]
+            merged = self._merged[specialty] = _MergedSlots(self._slots, doctor_ids)
+        return merged
+
+    def is_bookable(self, doctor_id, start):
+        """Whether `start` is the beginning of one of the doctor's weekly slots"""
+        with self._lock:
+            self._sync()
+            slots = self._slots.get(doctor_id)
+            if not slots:
+                return False
+            offset, remainder = divmod((start - week_start(start)).total_seconds(), 60)
+            if remainder:
+                return False
+            index = bisect_left(slots, int(offset))
+            return index < len(slots) and slots[index] == offset
+
+    def free_slots(self, start, end, specialty=None, limit=20):
+        """
+           First `limit` free slots beginning in [start, end) and not in the past, ordered by time
+           Returns a list of (doctor_id, slot_start, slot_end)
+        """
+        start = max(start, timezone.now())
+        with self._lock:
+            self._sync()
+            merged = self._merged_slots(specialty)
+            offsets, doctors, booked, step = merged.offsets, merged.doctors, self._booked, self._step
+            result = []
+            if not offsets:
+                return result
+            duration = timedelta(minutes=step)
+            base = week_start(start)
+            index = bisect_left(offsets, (start - base).total_seconds() / 60)
+            while len(result) < limit:
+                if index == len(offsets):
+                    base += timedelta(minutes=MINUTES_PER_WEEK)
+                    index = 0
+                slot_start = base + timedelta(minutes=offsets[index])
+                if slot_start >= end:
+                    break
+                doctor_id = doctors[index]
+                if slot_start not in booked.get(doctor_id, ()):
+                    result.append((doctor_id, slot_start, slot_start + duration))
+                index += 1
+            return result
+
+
+availability_index = AvailabilityIndex()
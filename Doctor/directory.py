@@ -0,0 +1,88 @@
+"""
+Doctor directory snapshot
+
+Listing doctors would join every doctor to its user and decrypt the names per
+row. The directory instead keeps one serialized entry per doctor in the
+shared cache, rebuilt for that doctor only when it, its user or its opening
+hours change, and caches the filtered pages on top. Every change gets a new
+random version, which keys the pages and is the ETag of the responses.
+"""
+import hashlib
+import uuid
+
+from django.core.cache import cache
+
+VERSION_KEY = 'doctor-directory:version'
+ENTRY_KEY = 'doctor-directory:doctor:%s'
+PAGE_KEY = 'doctor-directory:page:%s'
+TIMEOUT = 24 * 60 * 60
+
+
+def version():
+    current = cache.get(VERSION_KEY)
+    if current is None:
+        # a random version never repeats one of before a cache flush
+        cache.add(VERSION_KEY, uuid.uuid4().hex, timeout=None)
+        current = cache.get(VERSION_KEY)
+    return current
+
+
+def etag(specialty=None, cabinet=None):
+    """ETag of a page, which changes whenever any doctor of the directory does"""
+    return hashlib.md5(f'{version()}|{specialty}|{cabinet}'.encode()).hexdigest()
+
+
+def build_entries(doctor_ids):
+    from .models import Doctor
+    from .serializers import DoctorDirectorySerializer
+
+    doctors = (Doctor.objects.filter(pk__in=doctor_ids)
+               .select_related('user').prefetch_related('openinghours_set')
+               .only('id', 'specialty', 'cabinet', 'phone_general', 'user__first_name', 'user__last_name'))
+    return {doctor.pk: dict(DoctorDirectorySerializer(doctor).data) for doctor in doctors}
+
+
+def entries(doctor_ids):
+    """Entries of the given doctors, building only those missing from the cache"""
+    keys = {ENTRY_KEY % doctor_id: doctor_id for doctor_id in doctor_ids}
+    cached = cache.get_many(keys)
+    result = {keys[key]: entry for key, entry in cached.items()}
+    missing = [doctor_id for key, doctor_id in keys.items() if key not in cached]
+    if missing:
+        built = build_entries(missing)
+        for doctor_id, entry in built.items():
+            # add(): a refresh() that ran since the rows were read stored a newer entry, which must stay
+            cache.add(ENTRY_KEY % doctor_id, entry, TIMEOUT)
+        result.update(built)
+    return result
+
+
+def page(specialty=None, cabinet=None):
+    """Doctors of a specialty and/or cabinet, ordered by name"""
+    from .models import Doctor
+
+    key = PAGE_KEY % etag(specialty, cabinet)
+    data = cache.get(key)
+    if data is None:
+        doctors = Doctor.objects.all()
+        if specialty:
+            doctors = doctors.filter(specialty=specialty)
+        if cabinet:
+            doctors = doctors.filter(cabinet=cabinet)
+        data = sorted(entries(doctors.values_list('id', flat=True)).values(),
+                      key=lambda entry: (entry['last_name'], entry['first_name'], entry['id']))
+        cache.set(key, data, TIMEOUT)
+    return data
+
+
+def refresh(doctor_id):
+    """Rebuild the entry of one doctor (dropping it if the doctor was deleted) and start a new version"""
+    refresh_many([doctor_id])
+
+
+def refresh_many(doctor_ids):
+    """refresh() of several doctors, in one query and one new version"""
+    built = build_entries(doctor_ids)
+    cache.set_many({ENTRY_KEY % doctor_id: entry for doctor_id, entry in built.items()}, TIMEOUT)
+    cache.delete_many([ENTRY_KEY % doctor_id for doctor_id in doctor_ids if doctor_id not in built])
+    cache.set(VERSION_KEY, uuid.uuid4().hex, timeout=None)
@@ -39,7 +39,8 @@ class OpeningHours(models.Model):
 
     class Meta:
         ordering = ('weekday', 'open_hour')
-        unique_together = ('weekday', 'open_hour', 'close_hour')
+        # the key of the schedule upsert, see Doctor.schedule
+        unique_together = ('doctor', 'weekday', 'open_hour')
 
     def __unicode__(self):
         return u'%s: %s - %s' % (self.get_weekday_display(),
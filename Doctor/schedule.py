@@ -0,0 +1,85 @@
+"""
+Weekly schedule publishing
+
+A published schedule replaces the whole weekly template of its doctors. It
+is applied as a diff in one transaction: the current opening hours of all
+the doctors are read in one query, the rows whose (doctor, weekday,
+open_hour) is gone are deleted in one statement, and only the new or changed
+rows are written, with a single INSERT ... ON CONFLICT (doctor, weekday,
+open_hour) DO UPDATE. The rows bypass save(), and while publishing the
+signals of deleted rows are ignored (`publishing`), so the availability
+index and the directory are refreshed once for all the changed doctors after
+the commit, not once per row.
+"""
+import contextvars
+
+from django.db import transaction
+
+from . import directory
+from .availability import availability_index
+from .models import OpeningHours
+
+# set while publish() writes, the OpeningHours signals leave the refresh to it
+publishing = contextvars.ContextVar('publishing_schedule', default=False)
+
+
+def overlaps(intervals):
+    """
+       (earlier, later) pairs of the overlapping (weekday, open_hour, close_hour) intervals
+       Found in one pass over the sorted intervals
+    """
+    pairs = []
+    latest = None
+    for interval in sorted(intervals):
+        if latest is not None and latest[0] == interval[0] and interval[1] < latest[2]:
+            pairs.append((latest, interval))
+        # the interval closing last of the day so far is the one the next ones can overlap
+        if latest is None or latest[0] != interval[0] or interval[2] > latest[2]:
+            latest = interval
+    return pairs
+
+
+def refresh(doctor_ids):
+    availability_index.invalidate_many(doctor_ids)
+    directory.refresh_many(doctor_ids)
+
+
+def publish(schedules):
+    """
+       Replace the opening hours of the doctors of `schedules`, {doctor_id: [(weekday, open_hour, close_hour)]}
+       Returns the numbers of (written, deleted) rows
+    """
+    token = publishing.set(True)
+    try:
+        return _publish(schedules)
+    finally:
+        publishing.reset(token)
+
+
+def _publish(schedules):
+    with transaction.atomic():
+        current = {}
+        rows = OpeningHours.objects.filter(doctor_id__in=schedules).values_list(
+            'pk', 'doctor_id', 'weekday', 'open_hour', 'close_hour')
+        for pk, doctor_id, weekday, open_hour, close_hour in rows:
+            current[doctor_id, weekday, open_hour] = pk, close_hour
+        wanted = {(doctor_id, weekday, open_hour): close_hour
+                  for doctor_id, intervals in schedules.items()
+                  for weekday, open_hour, close_hour in intervals}
+
+        stale = {key: pk for key, (pk, _) in current.items() if key not in wanted}
+        changed = [
+            OpeningHours(doctor_id=doctor_id, weekday=weekday, open_hour=open_hour, close_hour=close_hour)
+            for (doctor_id, weekday, open_hour), close_hour in wanted.items()
+            if current.get((doctor_id, weekday, open_hour), (None, None))[1] != close_hour
+        ]
+        if stale:
+            OpeningHours.objects.filter(pk__in=stale.values()).delete()
+        if changed:
+            OpeningHours.objects.bulk_create(changed, update_conflicts=True,
+                                             unique_fields=['doctor', 'weekday', 'open_hour'],
+                                             update_fields=['close_hour'])
+        doctor_ids = {key[0] for key in stale} | {row.doctor_id for row in changed}
+        if doctor_ids:
+            transaction.on_commit(lambda: refresh(doctor_ids))
+    return len(changed), len(stale)
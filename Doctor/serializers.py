@@ -0,0 +1,103 @@
+from datetime import timedelta
+
+from django.utils import timezone
+from rest_framework import serializers
+
+from Polyclinic.profiling import ProfiledListSerializer, ProfiledSerializerMixin
+
+from .models import WEEKDAYS, Doctor, OpeningHours
+from .schedule import overlaps
+
+
+class AvailabilityQuerySerializer(serializers.Serializer):
+    """Query parameters of the availability endpoint"""
+    specialty = serializers.CharField(required=False)
+    start = serializers.DateTimeField(required=False)
+    end = serializers.DateTimeField(required=False)
+    limit = serializers.IntegerField(required=False, min_value=1, max_value=500, default=20)
+
+    def validate(self, attrs):
+        attrs.setdefault('start', timezone.now())
+        attrs.setdefault('end', attrs['start'] + timedelta(days=7))
+        if attrs['end'] <= attrs['start']:
+            raise serializers.ValidationError({'to': 'Must be later than `from`.'})
+        return attrs
+
+
+class AvailableSlotSerializer(ProfiledSerializerMixin, serializers.Serializer):
+    doctor = serializers.UUIDField()
+    start = serializers.DateTimeField()
+    end = serializers.DateTimeField()
+
+    class Meta:
+        list_serializer_class = ProfiledListSerializer
+
+
+class OpeningHoursSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = OpeningHours
+        fields = ['weekday', 'open_hour', 'close_hour']
+
+
+class DoctorDirectorySerializer(serializers.ModelSerializer):
+    """Entry of the doctor directory"""
+    first_name = serializers.CharField(source='user.first_name')
+    last_name = serializers.CharField(source='user.last_name')
+    opening_hours = OpeningHoursSerializer(source='openinghours_set', many=True)
+
+    class Meta:
+        model = Doctor
+        fields = ['id', 'first_name', 'last_name', 'specialty', 'cabinet', 'phone_general', 'opening_hours']
+
+
+class OpeningIntervalSerializer(serializers.Serializer):
+    weekday = serializers.ChoiceField(choices=WEEKDAYS)
+    open_hour = serializers.TimeField()
+    close_hour = serializers.TimeField()
+
+    def validate(self, attrs):
+        if attrs['close_hour'] <= attrs['open_hour']:
+            raise serializers.ValidationError({'close_hour': 'Must be later than `open_hour`.'})
+        return attrs
+
+
+class ScheduleListSerializer(serializers.ListSerializer):
+    """Checks the doctors of all schedules in one query, and the overlaps of each in one pass"""
+
+    def to_internal_value(self, data):
+        # errors are reported per item, like those of the child serializer
+        attrs = super().to_internal_value(data)
+        doctor_ids = set(Doctor.objects.filter(pk__in={item['doctor'] for item in attrs})
+                         .values_list('pk', flat=True))
+        seen = set()
+        errors = []
+        for item in attrs:
+            error = {}
+            if item['doctor'] not in doctor_ids:
+                error['doctor'] = ["Doctor not found."]
+            elif item['doctor'] in seen:
+                error['doctor'] = ["Listed more than once."]
+            seen.add(item['doctor'])
+            intervals = [(interval['weekday'], interval['open_hour'], interval['close_hour'])
+                         for interval in item['opening_hours']]
+            pairs = overlaps(intervals)
+            if pairs:
+                error['opening_hours'] = [
+                    f"{dict(WEEKDAYS)[earlier[0]]}: {earlier[1]:%H:%M}-{earlier[2]:%H:%M} overlaps "
+                    f"{later[1]:%H:%M}-{later[2]:%H:%M}."
+                    for earlier, later in pairs
+                ]
+            errors.append(error)
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return attrs
+
+
+class ScheduleSerializer(serializers.Serializer):
+    """The full weekly opening hours of a doctor, see SchedulePublishView"""
+    doctor = serializers.UUIDField()
+    # up to one interval per slot of the shortest length, every day
+    opening_hours = OpeningIntervalSerializer(many=True, max_length=7 * 24 * 12)
+
+    class Meta:
+        list_serializer_class = ScheduleListSerializer
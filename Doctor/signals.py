@@ -0,0 +1,48 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from Patient.models import CustomUser
+
+from . import directory, schedule
+from .availability import availability_index
+from .models import Doctor, OpeningHours
+
+
+def refresh_doctor(doctor_id):
+    """
+       Reload the doctor's slots and directory entry once the change is committed
+       Other workers replaying the change earlier would re-read the old rows, a rollback would leave the index wrong
+    """
+    def refresh():
+        availability_index.invalidate(doctor_id)
+        directory.refresh(doctor_id)
+    transaction.on_commit(refresh)
+
+
+@receiver([post_save, post_delete], sender=OpeningHours)
+def opening_hours_changed(sender, instance, **kwargs):
+    """Only the slots of the affected doctor are recomputed"""
+    if schedule.publishing.get():
+        # publish() refreshes all its doctors at once
+        return
+    refresh_doctor(instance.doctor_id)
+
+
+@receiver([post_save, post_delete], sender=Doctor)
+def doctor_changed(sender, instance, **kwargs):
+    refresh_doctor(instance.pk)
+
+
+@receiver(post_save, sender=CustomUser)
+def user_changed(sender, instance, update_fields=None, **kwargs):
+    """The directory shows the names of the doctor's user"""
+    if update_fields is not None and not {'first_name', 'last_name'} & set(update_fields):
+        return
+
+    def refresh():
+        # looked up after the commit, which keeps the query out of every save of a user
+        doctor_ids = list(Doctor.objects.filter(user_id=instance.pk).values_list('pk', flat=True))
+        if doctor_ids:
+            directory.refresh_many(doctor_ids)
+    transaction.on_commit(refresh)
@@ -0,0 +1,126 @@
+from datetime import datetime, time, timedelta
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from Doctor import availability
+from Doctor.availability import availability_index, expand_opening_hours
+from Doctor.models import Doctor, OpeningHours
+from Patient.models import CustomUser
+
+
+def monday(hour=0, minute=0):
+    """Monday of a fixed week, so tests do not depend on the current date"""
+    return timezone.make_aware(datetime(2030, 1, 7, hour, minute))
+
+
+class AvailabilityIndexTest(TestCase):
+
+    def setUp(self):
+        """Two cardiologists and a neurologist"""
+        cache.clear()
+        availability_index.reset()
+        self.cardiologists = [self.create_doctor(str(number), "Cardiology") for number in range(2)]
+        self.neurologist = self.create_doctor("9", "Neurology")
+        OpeningHours.objects.create(weekday=1, open_hour=time(9, 0), close_hour=time(10, 0),
+                                    doctor=self.cardiologists[0])
+        OpeningHours.objects.create(weekday=1, open_hour=time(9, 30), close_hour=time(11, 0),
+                                    doctor=self.cardiologists[1])
+        OpeningHours.objects.create(weekday=1, open_hour=time(8, 0), close_hour=time(9, 0),
+                                    doctor=self.neurologist)
+
+    def create_doctor(self, suffix, specialty):
+        user = CustomUser.objects.create(
+            username=f"doctor{suffix}",
+            first_name="Test",
+            last_name="Doctor",
+            phone_number=f"123456789{suffix}",
+            email=f"doctor{suffix}@example.com",
+            gender="Male",
+            birth_date="1980-01-01",
+        )
+        return Doctor.objects.create(user=user, specialty=specialty, phone_general="987654321", cabinet="101")
+
+    def test_expand_opening_hours(self):
+        """Opening hours are cut into slots that fit entirely"""
+        offsets = expand_opening_hours([(2, time(9, 0), time(10, 15))], 30)
+        self.assertEqual(offsets, [24 * 60 + 9 * 60, 24 * 60 + 9 * 60 + 30])
+
+    def test_free_slots_of_specialty(self):
+        """Slots of all doctors of a specialty are merged in time order"""
+        slots = availability_index.free_slots(monday(), monday() + timedelta(days=1), "Cardiology", limit=4)
+        first, second = self.cardiologists[0].pk, self.cardiologists[1].pk
+        self.assertEqual([start for _, start, _ in slots], [monday(9), monday(9, 30), monday(9, 30), monday(10)])
+        self.assertEqual([slots[0][0], slots[3][0]], [first, second])
+        self.assertEqual({slots[1][0], slots[2][0]}, {first, second})
+        self.assertEqual(slots[0][2], monday(9, 30))
+
+    def test_free_slots_wrap_to_next_week(self):
+        """Searching past the last slot of a week continues on the next one"""
+        start = monday() + timedelta(days=1)
+        slots = availability_index.free_slots(start, start + timedelta(days=7), "Neurology", limit=5)
+        self.assertEqual([slot[1] for slot in slots], [monday(8) + timedelta(days=7), monday(8, 30) + timedelta(days=7)])
+
+    def test_past_slots_are_skipped(self):
+        with mock.patch('django.utils.timezone.now', return_value=monday(9, 45)):
+            slots = availability_index.free_slots(monday(), monday(12), "Cardiology")
+        self.assertEqual([start for _, start, _ in slots], [monday(10), monday(10, 30)])
+
+    def test_unknown_specialty_is_not_cached(self):
+        self.assertEqual(availability_index.free_slots(monday(), monday(12), "Astrology"), [])
+        self.assertNotIn("Astrology", availability_index._merged)
+
+    def test_opening_hours_change_invalidates_doctor(self):
+        """Saving a single OpeningHours row updates the index of its doctor"""
+        availability_index.free_slots(monday(), monday(12))
+        with self.captureOnCommitCallbacks(execute=True):
+            OpeningHours.objects.create(weekday=1, open_hour=time(7, 0), close_hour=time(7, 30),
+                                        doctor=self.cardiologists[1])
+        slots = availability_index.free_slots(monday(), monday(12), "Cardiology", limit=1)
+        self.assertEqual(slots[0][:2], (self.cardiologists[1].pk, monday(7)))
+
+    def test_specialty_change_invalidates_doctor(self):
+        availability_index.free_slots(monday(), monday(12))
+        self.neurologist.specialty = "Cardiology"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.neurologist.save()
+        slots = availability_index.free_slots(monday(), monday(12), "Cardiology", limit=1)
+        self.assertEqual(slots[0][:2], (self.neurologist.pk, monday(8)))
+        self.assertEqual(availability_index.free_slots(monday(), monday(12), "Neurology"), [])
+
+    def test_is_bookable(self):
+        self.assertTrue(availability_index.is_bookable(self.neurologist.pk, monday(8, 30)))
+        self.assertFalse(availability_index.is_bookable(self.neurologist.pk, monday(8, 15)))
+        self.assertFalse(availability_index.is_bookable(self.neurologist.pk, monday(9)))
+
+    def test_availability_endpoint(self):
+        response = APIClient().get('/api/v1/doctor/availability/', {
+            'specialty': 'Neurology',
+            'from': monday().isoformat(),
+            'to': monday(12).isoformat(),
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertEqual(response.data['results'][0]['doctor'], str(self.neurologist.pk))
+
+    def test_availability_endpoint_rejects_empty_range(self):
+        response = APIClient().get('/api/v1/doctor/availability/', {
+            'from': monday(12).isoformat(),
+            'to': monday().isoformat(),
+        })
+        self.assertEqual(response.status_code, 400)
+
+
+class PerProcessCacheTest(SimpleTestCase):
+
+    @override_settings(DEBUG=False)
+    def test_warns_once(self):
+        self.addCleanup(setattr, availability, '_cache_checked', availability._cache_checked)
+        availability._cache_checked = False
+        with self.assertLogs('Doctor.availability', 'WARNING'):
+            availability.warn_per_process_cache()
+        with self.assertNoLogs('Doctor.availability'):
+            availability.warn_per_process_cache()
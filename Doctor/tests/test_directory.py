@@ -0,0 +1,91 @@
+from datetime import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from Doctor import directory
+from Doctor.models import Doctor, OpeningHours
+from Patient.models import CustomUser
+
+
+class DoctorDirectoryTest(TestCase):
+
+    def setUp(self):
+        """Two cardiologists and a neurologist"""
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cardiologist = self.create_doctor("0", "Smith", "Cardiology", "101")
+            self.create_doctor("1", "Adams", "Cardiology", "102")
+            self.neurologist = self.create_doctor("2", "Brown", "Neurology", "101")
+            OpeningHours.objects.create(weekday=1, open_hour=time(9, 0), close_hour=time(12, 0),
+                                        doctor=self.cardiologist)
+        self.client = APIClient()
+
+    def create_doctor(self, suffix, last_name, specialty, cabinet):
+        user = CustomUser.objects.create(username=f"doctor{suffix}", first_name="Test", last_name=last_name,
+                                         phone_number=f"123456789{suffix}", email=f"doctor{suffix}@example.com",
+                                         gender="Male", birth_date="1980-01-01")
+        return Doctor.objects.create(user=user, specialty=specialty, phone_general="987654321", cabinet=cabinet)
+
+    def names(self, **params):
+        response = self.client.get('/api/v1/doctor/', params)
+        self.assertEqual(response.status_code, 200)
+        return [doctor['last_name'] for doctor in response.data['results']]
+
+    def test_list_is_ordered_by_name(self):
+        response = self.client.get('/api/v1/doctor/')
+        self.assertEqual([doctor['last_name'] for doctor in response.data['results']], ["Adams", "Brown", "Smith"])
+        smith = response.data['results'][2]
+        self.assertEqual(smith['opening_hours'], [{'weekday': 1, 'open_hour': '09:00:00', 'close_hour': '12:00:00'}])
+
+    def test_filters(self):
+        self.assertEqual(self.names(specialty="Cardiology"), ["Adams", "Smith"])
+        self.assertEqual(self.names(cabinet="101"), ["Brown", "Smith"])
+        self.assertEqual(self.names(specialty="Cardiology", cabinet="101"), ["Smith"])
+
+    def test_cached_page_runs_no_query(self):
+        self.names()
+        with self.assertNumQueries(0):
+            self.names()
+
+    def test_not_modified(self):
+        etag = self.client.get('/api/v1/doctor/')['ETag']
+        response = self.client.get('/api/v1/doctor/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertNotEqual(self.client.get('/api/v1/doctor/', {'specialty': "Neurology"})['ETag'], etag)
+
+    def test_changes_are_picked_up(self):
+        etag = self.client.get('/api/v1/doctor/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            user = self.neurologist.user
+            user.last_name = "Young"
+            user.save()
+            OpeningHours.objects.filter(doctor=self.cardiologist).delete()
+        response = self.client.get('/api/v1/doctor/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([doctor['last_name'] for doctor in response.data['results']], ["Adams", "Smith", "Young"])
+        self.assertEqual(response.data['results'][1]['opening_hours'], [])
+
+    def test_deleted_doctor_is_dropped(self):
+        self.names()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.neurologist.delete()
+        self.assertEqual(self.names(), ["Adams", "Smith"])
+
+    def test_missing_entry_does_not_overwrite_a_concurrent_refresh(self):
+        key = directory.ENTRY_KEY % self.neurologist.pk
+        cache.delete(key)
+        build_entries = directory.build_entries
+
+        def build_before_an_edit(doctor_ids):
+            built = build_entries(doctor_ids)
+            CustomUser.objects.filter(pk=self.neurologist.user_id).update(last_name="Young")
+            with mock.patch.object(directory, 'build_entries', build_entries):
+                directory.refresh(self.neurologist.pk)
+            return built
+
+        with mock.patch.object(directory, 'build_entries', side_effect=build_before_an_edit):
+            self.assertEqual(directory.entries([self.neurologist.pk])[self.neurologist.pk]['last_name'], "Brown")
+        self.assertEqual(cache.get(key)['last_name'], "Young")
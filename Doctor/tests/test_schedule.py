@@ -0,0 +1,126 @@
+import uuid
+from datetime import datetime, time
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from Doctor.availability import availability_index
+from Doctor.models import Doctor, OpeningHours
+from Doctor.schedule import overlaps, publish
+from Patient.models import CustomUser
+
+
+def create_doctor(suffix, **extra):
+    user = CustomUser.objects.create(username=f"doctor{suffix}", first_name="Test", last_name="Doctor",
+                                     phone_number=f"123456789{suffix}", email=f"doctor{suffix}@example.com",
+                                     gender="Male", birth_date="1980-01-01", is_active=True, **extra)
+    return Doctor.objects.create(user=user, specialty="Cardiology", phone_general="987654321", cabinet="101")
+
+
+def hours(doctor):
+    return list(OpeningHours.objects.filter(doctor=doctor).values_list('weekday', 'open_hour', 'close_hour'))
+
+
+class OverlapsTest(TestCase):
+
+    def test_overlaps(self):
+        self.assertEqual(overlaps([(1, time(9), time(12)), (1, time(12), time(13)), (2, time(11), time(12))]), [])
+        self.assertEqual(overlaps([(1, time(11), time(13)), (1, time(9), time(12))]),
+                         [((1, time(9), time(12)), (1, time(11), time(13)))])
+        # both later intervals fall within the first
+        self.assertEqual(len(overlaps([(1, time(8), time(18)), (1, time(9), time(10)), (1, time(11), time(12))])), 2)
+
+
+class PublishTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        availability_index.reset()
+        self.doctor = create_doctor("0")
+        OpeningHours.objects.create(weekday=1, open_hour=time(9), close_hour=time(12), doctor=self.doctor)
+        OpeningHours.objects.create(weekday=2, open_hour=time(9), close_hour=time(12), doctor=self.doctor)
+
+    def test_applies_the_difference(self):
+        schedule = {self.doctor.pk: [(1, time(9), time(13)), (3, time(10), time(11))]}
+        # the current rows, the stale ones collected and deleted, the new and changed ones upserted, in a savepoint
+        with self.captureOnCommitCallbacks(execute=True), self.assertNumQueries(6):
+            self.assertEqual(publish(schedule), (2, 1))
+        self.assertEqual(hours(self.doctor), [(1, time(9), time(13)), (3, time(10), time(11))])
+        with self.assertNumQueries(3):
+            self.assertEqual(publish(schedule), (0, 0))
+
+    def test_doctors_share_hours(self):
+        other = create_doctor("1")
+        with self.captureOnCommitCallbacks(execute=True):
+            publish({other.pk: [(1, time(9), time(12))]})
+        self.assertEqual(hours(other), [(1, time(9), time(12))])
+
+    def test_doctors_refreshed_once(self):
+        """The signals of the deleted rows leave the refresh to publish()"""
+        other = create_doctor("1")
+        with mock.patch('Doctor.schedule.refresh') as refresh, mock.patch('Doctor.signals.refresh_doctor') as signal:
+            with self.captureOnCommitCallbacks(execute=True):
+                publish({self.doctor.pk: [(1, time(9), time(13))], other.pk: [(1, time(9), time(12))]})
+        refresh.assert_called_once_with({self.doctor.pk, other.pk})
+        signal.assert_not_called()
+
+    def test_index_follows_after_commit(self):
+        tuesday = timezone.make_aware(datetime(2030, 1, 8, 9))
+        self.assertTrue(availability_index.is_bookable(self.doctor.pk, tuesday))
+        with self.captureOnCommitCallbacks(execute=True):
+            publish({self.doctor.pk: [(1, time(9), time(12))]})
+        self.assertFalse(availability_index.is_bookable(self.doctor.pk, tuesday))
+
+
+class SchedulePublishViewTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.doctors = [create_doctor(str(number)) for number in range(2)]
+        self.client = APIClient()
+        self.url = '/api/v1/doctor/schedules/'
+        self.staff = CustomUser.objects.create(username="staff", first_name="Staff", last_name="Member",
+                                               phone_number="5555555555", email="staff@example.com",
+                                               gender="Male", birth_date="1980-01-01", is_staff=True)
+
+    def schedule(self, doctor, *intervals):
+        return {'doctor': str(doctor.pk), 'opening_hours': [
+            {'weekday': weekday, 'open_hour': open_hour, 'close_hour': close_hour}
+            for weekday, open_hour, close_hour in intervals
+        ]}
+
+    def test_staff_publish_a_department(self):
+        self.client.force_authenticate(self.staff)
+        data = [self.schedule(doctor, (1, "09:00", "12:00"), (1, "13:00", "17:00")) for doctor in self.doctors]
+        response = self.client.put(self.url, data, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'doctors': 2, 'written': 4, 'deleted': 0})
+        self.assertEqual(OpeningHours.objects.count(), 4)
+
+    def test_invalid_schedules_are_rejected(self):
+        self.client.force_authenticate(self.staff)
+        data = [
+            self.schedule(self.doctors[0], (1, "09:00", "12:00"), (1, "11:00", "13:00")),
+            {'doctor': str(uuid.uuid4()), 'opening_hours': []},
+            self.schedule(self.doctors[1], (2, "09:00", "12:00")),
+        ]
+        response = self.client.put(self.url, data, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data[0]['opening_hours'], ["Monday: 09:00-12:00 overlaps 11:00-13:00."])
+        self.assertEqual(response.data[1]['doctor'], ["Doctor not found."])
+        self.assertEqual(response.data[2], {})
+
+        response = self.client.put(self.url, [self.schedule(self.doctors[1], (2, "12:00", "09:00"))], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('close_hour', response.data[0]['opening_hours'][0])
+        self.assertFalse(OpeningHours.objects.exists())
+
+    def test_doctors_publish_their_own_schedule_only(self):
+        self.client.force_authenticate(CustomUser.objects.get(pk=self.doctors[0].user_id))
+        own = self.schedule(self.doctors[0], (1, "09:00", "12:00"))
+        self.assertEqual(self.client.put(self.url, [own], format='json').status_code, 200)
+        other = self.schedule(self.doctors[1], (1, "09:00", "12:00"))
+        self.assertEqual(self.client.put(self.url, [own, other], format='json').status_code, 403)
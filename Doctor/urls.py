@@ -1,3 +1,9 @@
-urlpatterns = [
+from django.urls import path
+
+from .views import AvailabilityView, DoctorDirectoryView, SchedulePublishView
 
-]
\ No newline at end of file
+urlpatterns = [
+    path('', DoctorDirectoryView.as_view(), name='doctor-list'),
+    path('availability/', AvailabilityView.as_view(), name='doctor-availability'),
+    path('schedules/', SchedulePublishView.as_view(), name='doctor-schedules'),
+]
@@ -1,3 +1,80 @@
-from django.shortcuts import render
+from rest_framework import generics
+from rest_framework.exceptions import PermissionDenied
+from rest_framework.permissions import BasePermission, IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
-# Create your views here.
+from . import directory, schedule
+from .availability import availability_index
+from .serializers import AvailabilityQuerySerializer, AvailableSlotSerializer, ScheduleSerializer
+
+
+class AvailabilityView(APIView):
+    """
+       First free appointment slots, optionally of a single specialty
+       Query parameters: specialty, from, to (ISO 8601, default: the next 7 days), limit
+    """
+
+    def get(self, request):
+        params = request.query_params
+        query = AvailabilityQuerySerializer(data={
+            key: params[param]
+            for key, param in (('specialty', 'specialty'), ('start', 'from'), ('end', 'to'), ('limit', 'limit'))
+            if param in params
+        })
+        query.is_valid(raise_exception=True)
+        slots = availability_index.free_slots(**query.validated_data)
+        data = [{'doctor': doctor, 'start': start, 'end': end} for doctor, start, end in slots]
+        return Response({'results': AvailableSlotSerializer(data, many=True).data})
+
+
+class DoctorDirectoryView(APIView):
+    """
+       All doctors with their opening hours, served from the directory snapshot
+       Query parameters: specialty, cabinet
+       Responses carry an ETag; a request with a matching If-None-Match gets a 304
+    """
+
+    def get(self, request):
+        specialty, cabinet = request.query_params.get('specialty'), request.query_params.get('cabinet')
+        etag = f'"{directory.etag(specialty, cabinet)}"'
+        if_none_match = request.headers.get('If-None-Match', '')
+        if etag in [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')] or if_none_match == '*':
+            response = Response(status=304)
+        else:
+            response = Response({'results': directory.page(specialty, cabinet)})
+        response['ETag'] = etag
+        response['Cache-Control'] = 'no-cache'
+        return response
+
+
+class CanPublishSchedules(BasePermission):
+
+    def has_permission(self, request, view):
+        return request.user.is_staff or hasattr(request.user, 'doctor')
+
+
+class SchedulePublishView(generics.GenericAPIView):
+    """
+       Publish the full weekly opening hours of doctors, replacing their current ones
+       Takes a list of {doctor, opening_hours: [{weekday, open_hour, close_hour}]}; staff may publish the
+       schedules of any doctors (e.g. a whole department) at once, a doctor only their own
+       Invalid items reject the whole list; see Doctor.schedule
+    """
+    serializer_class = ScheduleSerializer
+    permission_classes = [IsAuthenticated, CanPublishSchedules]
+    max_doctors = 1000
+
+    def put(self, request):
+        serializer = self.get_serializer(data=request.data, many=True, allow_empty=False,
+                                         max_length=self.max_doctors)
+        serializer.is_valid(raise_exception=True)
+        if not request.user.is_staff and any(item['doctor'] != request.user.doctor.pk
+                                             for item in serializer.validated_data):
+            raise PermissionDenied("A doctor can only publish their own schedule.")
+        written, deleted = schedule.publish({
+            item['doctor']: [(interval['weekday'], interval['open_hour'], interval['close_hour'])
+                             for interval in item['opening_hours']]
+            for item in serializer.validated_data
+        })
+        return Response({'doctors': len(serializer.validated_data), 'written': written, 'deleted': deleted})
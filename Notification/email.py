@@ -0,0 +1,48 @@
+"""
+djoser emails queued in the outbox instead of being sent during the request
+
+Set as DJOSER['EMAIL']; they are rendered in the request, as the templates
+need it, and sent by the send_notifications worker.
+"""
+from django.conf import settings
+from djoser import email
+
+from .outbox import enqueue_email
+
+
+class QueuedEmailMixin:
+
+    # same signature as djoser's BaseEmailMessage.send()
+    def send(self, to, fail_silently=False, **kwargs):
+        self.render()
+        self.to = to
+        self.cc = kwargs.pop('cc', [])
+        self.bcc = kwargs.pop('bcc', [])
+        self.reply_to = kwargs.pop('reply_to', [])
+        self.from_email = kwargs.pop('from_email', settings.DEFAULT_FROM_EMAIL)
+        self.request = None
+        enqueue_email(self)
+
+
+class ActivationEmail(QueuedEmailMixin, email.ActivationEmail):
+    pass
+
+
+class ConfirmationEmail(QueuedEmailMixin, email.ConfirmationEmail):
+    pass
+
+
+class PasswordResetEmail(QueuedEmailMixin, email.PasswordResetEmail):
+    pass
+
+
+class PasswordChangedConfirmationEmail(QueuedEmailMixin, email.PasswordChangedConfirmationEmail):
+    pass
+
+
+class UsernameChangedConfirmationEmail(QueuedEmailMixin, email.UsernameChangedConfirmationEmail):
+    pass
+
+
+class UsernameResetEmail(QueuedEmailMixin, email.UsernameResetEmail):
+    pass
@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from Notification.outbox import send_pending
+
+
+class Command(BaseCommand):
+    help = "Send the queued emails and SMS of the outbox, retrying failed ones with backoff"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None, help="Defaults to OUTBOX['BATCH_SIZE']")
+        parser.add_argument('--interval', type=float, default=0,
+                            help="Keep running and poll every INTERVAL seconds once the outbox is empty")
+
+    def handle(self, *args, batch_size, interval, **options):
+        while True:
+            sent, failed = send_pending(batch_size)
+            if sent or failed:
+                self.stdout.write(f"Sent {sent} message(s), {failed} failed")
+                continue
+            if not interval:
+                break
+            time.sleep(interval)
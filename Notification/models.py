@@ -0,0 +1,44 @@
+from django.db import models
+from django.utils import timezone
+
+from Patient import encryption
+
+EMAIL = 'email'
+SMS = 'sms'
+
+OPTIONS_CHANNEL = (
+    (EMAIL, 'Email'),
+    (SMS, 'SMS'),
+)
+
+PENDING = 'pending'
+SENT = 'sent'
+FAILED = 'failed'
+
+OPTIONS_STATUS = (
+    (PENDING, 'Pending'),
+    (SENT, 'Sent'),
+    (FAILED, 'Failed'),
+)
+
+
+class OutboxMessage(models.Model):
+    """
+       Email or SMS waiting to be sent by the send_notifications worker
+       The payload (recipients, subject and bodies, which hold activation tokens) is encrypted and is
+       cleared once the message is sent
+    """
+    channel = models.CharField(max_length=5, choices=OPTIONS_CHANNEL)
+    payload = encryption.EncryptedTextField(blank=True)
+    status = models.CharField(max_length=7, choices=OPTIONS_STATUS, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # when the message may be (re)tried; a claimed message is leased until then
+    available_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'available_at']),
+        ]
@@ -0,0 +1,145 @@
+"""
+Outbox of emails and SMS
+
+Requests only insert the message into the outbox table; the
+`send_notifications` worker sends it, so SMTP or SMS provider latency and
+outages never reach the request. The worker claims a batch of due messages
+by leasing them (pushing `available_at` forward) in a short transaction,
+with SKIP LOCKED so that several workers share the work, and sends the
+batch over a single connection. A message that fails is retried with
+exponential backoff and jitter, until OUTBOX['MAX_ATTEMPTS']; one whose
+worker died is retried when its lease runs out. Delivery is at least once.
+"""
+import json
+import logging
+import random
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import sms
+from .models import EMAIL, FAILED, PENDING, SENT, SMS, OutboxMessage
+
+logger = logging.getLogger(__name__)
+
+
+def outbox_settings():
+    return {
+        'BATCH_SIZE': 100,
+        'MAX_ATTEMPTS': 8,
+        # seconds before the first retry, doubled for every further one
+        'RETRY_DELAY': 30,
+        'MAX_RETRY_DELAY': 3600,
+        # seconds a claimed message is left to its worker
+        'LEASE': 300,
+        **getattr(settings, 'OUTBOX', {}),
+    }
+
+
+def enqueue_email(message):
+    """Queue an EmailMultiAlternatives (or EmailMessage) instead of sending it"""
+    html = [content for content, mimetype in getattr(message, 'alternatives', []) if mimetype == 'text/html']
+    return OutboxMessage.objects.create(channel=EMAIL, payload=json.dumps({
+        'subject': message.subject,
+        'body': message.body,
+        'html': html[0] if html else None,
+        'content_subtype': message.content_subtype,
+        'from_email': message.from_email,
+        'to': list(message.to),
+        'cc': list(message.cc),
+        'bcc': list(message.bcc),
+        'reply_to': list(message.reply_to),
+    }))
+
+
+def enqueue_sms(to, body):
+    return OutboxMessage.objects.create(channel=SMS, payload=json.dumps({'to': to, 'body': body}))
+
+
+def claim(batch_size, lease):
+    """Lease the next due messages to this worker; returns them with their attempt counted"""
+    now = timezone.now()
+    with transaction.atomic():
+        messages = list(OutboxMessage.objects.select_for_update(skip_locked=True)
+                        .filter(status=PENDING, available_at__lte=now)
+                        .order_by('available_at')[:batch_size])
+        if messages:
+            OutboxMessage.objects.filter(pk__in=[message.pk for message in messages]).update(
+                attempts=F('attempts') + 1, available_at=now + timedelta(seconds=lease))
+    for message in messages:
+        message.attempts += 1
+    return messages
+
+
+def retry_delay(attempts, options):
+    """Seconds before the next attempt, after `attempts` failed ones"""
+    delay = min(options['RETRY_DELAY'] * 2 ** (attempts - 1), options['MAX_RETRY_DELAY'])
+    # spread the retries of a batch that failed together
+    return delay * random.uniform(0.5, 1)
+
+
+def build_email(payload, connection):
+    message = EmailMultiAlternatives(
+        subject=payload['subject'], body=payload['body'], from_email=payload['from_email'], to=payload['to'],
+        cc=payload['cc'], bcc=payload['bcc'], reply_to=payload['reply_to'], connection=connection)
+    message.content_subtype = payload['content_subtype']
+    if payload['html']:
+        message.attach_alternative(payload['html'], 'text/html')
+    return message
+
+
+def deliver(messages):
+    """Send claimed messages, one connection per channel; returns the (message, error) of those that failed"""
+    failures = []
+    emails = [message for message in messages if message.channel == EMAIL]
+    texts = [message for message in messages if message.channel == SMS]
+    if emails:
+        connection = get_connection()
+        try:
+            connection.open()
+        except Exception as exc:
+            failures += [(message, exc) for message in emails]
+        else:
+            try:
+                for message in emails:
+                    try:
+                        connection.send_messages([build_email(json.loads(message.payload), connection)])
+                    except Exception as exc:
+                        failures.append((message, exc))
+            finally:
+                connection.close()
+    if texts:
+        backend = sms.get_backend()
+        for message in texts:
+            payload = json.loads(message.payload)
+            try:
+                backend.send_messages([sms.SMSMessage(payload['to'], payload['body'])])
+            except Exception as exc:
+                failures.append((message, exc))
+    return failures
+
+
+def send_pending(batch_size=None):
+    """Send one batch of due messages; returns the numbers of (sent, failed) messages"""
+    options = outbox_settings()
+    messages = claim(batch_size or options['BATCH_SIZE'], options['LEASE'])
+    if not messages:
+        return 0, 0
+    failures = deliver(messages)
+    failed = {message.pk for message, _ in failures}
+    sent = [message.pk for message in messages if message.pk not in failed]
+    now = timezone.now()
+    if sent:
+        OutboxMessage.objects.filter(pk__in=sent).update(status=SENT, sent_at=now, payload='', last_error='')
+    for message, error in failures:
+        gave_up = message.attempts >= options['MAX_ATTEMPTS']
+        logger.warning("%s message %s failed (attempt %d%s): %r", message.channel, message.pk, message.attempts,
+                       ', giving up' if gave_up else '', error)
+        OutboxMessage.objects.filter(pk=message.pk).update(
+            status=FAILED if gave_up else PENDING, last_error=repr(error)[:1000],
+            available_at=now + timedelta(seconds=retry_delay(message.attempts, options)))
+    return len(sent), len(failures)
@@ -0,0 +1,46 @@
+"""
+SMS backends, selected by the SMS_BACKEND setting like Django's EMAIL_BACKEND
+
+A backend has `send_messages(messages)`, `messages` being SMSMessage objects,
+and raises when a message could not be handed over to the provider.
+"""
+import sys
+import threading
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+# messages sent with the LocMemBackend
+outbox = []
+
+
+class SMSMessage:
+    __slots__ = ('to', 'body')
+
+    def __init__(self, to, body):
+        self.to = to
+        self.body = body
+
+
+def get_backend():
+    return import_string(getattr(settings, 'SMS_BACKEND', 'Notification.sms.ConsoleBackend'))()
+
+
+class ConsoleBackend:
+    """Writes the messages to stdout, for development"""
+    _lock = threading.Lock()
+
+    def send_messages(self, messages):
+        with self._lock:
+            for message in messages:
+                sys.stdout.write(f'SMS to {message.to}:\n{message.body}\n{"-" * 79}\n')
+            sys.stdout.flush()
+        return len(messages)
+
+
+class LocMemBackend:
+    """Keeps the messages in `outbox`, for tests"""
+
+    def send_messages(self, messages):
+        outbox.extend(messages)
+        return len(messages)
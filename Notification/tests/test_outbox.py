@@ -0,0 +1,84 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core import mail
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from Notification import sms
+from Notification.models import FAILED, PENDING, SENT, OutboxMessage
+from Notification.outbox import claim, enqueue_sms, send_pending
+
+
+class FailingBackend(BaseEmailBackend):
+
+    def send_messages(self, email_messages):
+        raise ConnectionRefusedError("SMTP server unavailable")
+
+
+REGISTRATION = {
+    'username': "user0", 'email': "user0@example.com", 'first_name': "John", 'last_name': "Doe",
+    'phone_number': "1234567890", 'gender': "Male", 'birth_date': "1990-01-01",
+    'password': "Secret-password-1", 're_password': "Secret-password-1",
+}
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+                   SMS_BACKEND='Notification.sms.LocMemBackend')
+class OutboxTest(TestCase):
+
+    def setUp(self):
+        sms.outbox.clear()
+
+    def register(self):
+        response = APIClient().post('/api/v1/patient/auth/users/', REGISTRATION, format='json')
+        self.assertEqual(response.status_code, 201)
+
+    def test_registration_queues_the_activation_email(self):
+        self.register()
+        self.assertEqual(mail.outbox, [])
+        queued = OutboxMessage.objects.get()
+        self.assertEqual(queued.status, PENDING)
+
+        self.assertEqual(send_pending(), (1, 0))
+        self.assertEqual(mail.outbox[0].to, ["user0@example.com"])
+        self.assertIn("/activate/", mail.outbox[0].body)
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts, queued.payload), (SENT, 1, ''))
+        self.assertEqual(send_pending(), (0, 0))
+
+    @override_settings(EMAIL_BACKEND='Notification.tests.test_outbox.FailingBackend',
+                       OUTBOX={'MAX_ATTEMPTS': 2})
+    def test_failures_are_retried_with_backoff(self):
+        self.register()
+        with self.assertLogs('Notification.outbox', 'WARNING'):
+            self.assertEqual(send_pending(), (0, 1))
+        queued = OutboxMessage.objects.get()
+        self.assertEqual((queued.status, queued.attempts), (PENDING, 1))
+        self.assertIn("SMTP server unavailable", queued.last_error)
+        self.assertGreater(queued.available_at, timezone.now() + timedelta(seconds=10))
+        # not due yet
+        self.assertEqual(send_pending(), (0, 0))
+
+        OutboxMessage.objects.update(available_at=timezone.now())
+        with self.assertLogs('Notification.outbox', 'WARNING') as logs:
+            self.assertEqual(send_pending(), (0, 1))
+        self.assertIn("giving up", logs.output[0])
+        self.assertEqual(OutboxMessage.objects.get().status, FAILED)
+
+    def test_claimed_messages_are_leased(self):
+        enqueue_sms("1234567890", "Your code is 1234")
+        # by a worker that has not sent them yet
+        self.assertEqual(len(claim(10, lease=300)), 1)
+        self.assertEqual(send_pending(), (0, 0))
+
+    def test_worker_sends_sms(self):
+        enqueue_sms("1234567890", "Your code is 1234")
+        out = StringIO()
+        call_command('send_notifications', stdout=out)
+        self.assertIn("Sent 1 message(s), 0 failed", out.getvalue())
+        self.assertEqual([(message.to, message.body) for message in sms.outbox],
+                         [("1234567890", "Your code is 1234")])
@@ -0,0 +1,122 @@
+"""
+Counters of the categories of encrypted fields
+
+Statistics over encrypted columns, such as the distribution of blood types,
+cannot be computed in SQL, and decrypting the whole table for each of them
+does not scale. The models list their categorical fields in `counted_fields`;
+every save and delete adjusts `CategoryCounter` in the transaction of the
+row, so a distribution is read with one indexed query. Each count is spread
+over AGGREGATE_SHARDS rows, one picked at random per write, so concurrent
+registrations rarely wait for the lock of the same row; only the sum of the
+shards is meaningful.
+
+The categories are stored in plain text, so only fields whose values do not
+identify anybody belong in `counted_fields`. bulk_create() and update() skip
+the counters (import_patients adds its batches itself); `manage.py
+rebuild_aggregates` recounts the tables and corrects them.
+"""
+import random
+from collections import Counter
+
+from django.apps import apps
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+
+from .encryption import EncryptedValue
+
+
+def shards():
+    return getattr(settings, 'AGGREGATE_SHARDS', 8)
+
+
+def counted_models():
+    return [model for model in apps.get_app_config('Patient').get_models() if getattr(model, 'counted_fields', ())]
+
+
+def dimensions():
+    """{dimension: (model, field name)} of every counted field; a dimension is named after its field"""
+    return {name: (model, name) for model in counted_models() for name in model.counted_fields}
+
+
+def category(value):
+    """The category a value is counted in, None for empty values, which are not counted"""
+    return None if value is None or value == '' else str(value)
+
+
+def touched(instance, update_fields=None):
+    """
+       The counted fields a save of the instance may change
+       Fields never accessed since they were loaded still hold their ciphertext and are unchanged
+    """
+    return [name for name in instance.counted_fields
+            if (update_fields is None or name in update_fields) and name in instance.__dict__
+            and not isinstance(instance.__dict__[name], EncryptedValue)]
+
+
+def changes(instance, names, using='default'):
+    """
+       {(dimension, category): +1 / -1} of saving the `touched()` fields of the instance, computed before the save
+       The stored values are read with the row locked until the end of the transaction, so that two concurrent
+       changes of one row are not both counted from the same value
+    """
+    old = {}
+    if names and not instance._state.adding:
+        stored = (type(instance)._base_manager.using(using).select_for_update().filter(pk=instance.pk)
+                  .values_list(*names).first())
+        old = dict(zip(names, stored or ()))
+    deltas = Counter()
+    for name in names:
+        before, after = category(old.get(name)), category(instance.__dict__[name])
+        if before != after:
+            if before is not None:
+                deltas[name, before] -= 1
+            if after is not None:
+                deltas[name, after] += 1
+    return deltas
+
+
+def removed(instance):
+    """{(dimension, category): -1} of deleting the instance, from its values (a query when they were deferred)"""
+    deltas = Counter()
+    for name in instance.counted_fields:
+        value = category(getattr(instance, name))
+        if value is not None:
+            deltas[name, value] -= 1
+    return deltas
+
+
+def add(deltas, using='default'):
+    """
+       Add {(dimension, category): delta} to the counters, in the current transaction
+       The counters are updated in a fixed order, so that two transactions do not wait for each other
+    """
+    from .models import CategoryCounter
+
+    for (dimension, value), delta in sorted(deltas.items()):
+        if not delta:
+            continue
+        key = {'dimension': dimension, 'category': value, 'shard': random.randrange(shards())}
+        rows = CategoryCounter.objects.using(using).filter(**key)
+        if rows.update(count=F('count') + delta):
+            continue
+        try:
+            with transaction.atomic(using=using):
+                CategoryCounter.objects.using(using).create(**key, count=delta)
+        except IntegrityError:
+            # created meanwhile by another transaction
+            rows.update(count=F('count') + delta)
+
+
+def counts(dimension_names, using='default'):
+    """{(dimension, category): count} of the dimensions, the categories counted down to 0 omitted"""
+    from .models import CategoryCounter
+
+    rows = (CategoryCounter.objects.using(using).filter(dimension__in=dimension_names)
+            .values_list('dimension', 'category').annotate(total=Sum('count')).order_by())
+    return {(dimension, value): total for dimension, value, total in rows if total}
+
+
+def distribution(dimension, using='default'):
+    """{category: count} of one dimension, by category"""
+    return dict(sorted((value, total) for (_, value), total in counts([dimension], using).items()))
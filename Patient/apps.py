@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class PatientConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'Patient'
+
+    def ready(self):
+        from . import blind_index, signals  # noqa: F401
+
+        blind_index.check_key()
@@ -0,0 +1,8 @@
+from django.urls import path
+
+from .async_views import patient_profile, record_timeline
+
+urlpatterns = [
+    path('me/', patient_profile, name='async-patient-profile'),
+    path('<uuid:patient_id>/records/', record_timeline, name='async-patient-records'),
+]
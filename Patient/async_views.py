@@ -0,0 +1,78 @@
+"""
+Async views for ASGI deployments
+
+DRF views are synchronous, so under ASGI every request to them occupies a
+thread. These views cover the hot read endpoints natively: the database is
+reached through the async ORM and only the CPU bound decryption and
+serialization run in a thread (`sync_to_async`). They return the same
+payloads as their DRF counterparts.
+"""
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from rest_framework.exceptions import APIException, NotAuthenticated, NotFound, PermissionDenied
+from rest_framework.request import Request
+
+from Audit import log as audit
+from Doctor.models import Doctor
+from Polyclinic.renderers import ORJSONRenderer
+
+from .authentication import CachedTokenAuthentication, aauthenticate
+from .models import Patient, Record
+from .pagination import TimelinePagination
+from .serializers import PatientSerializer, RecordSerializer
+
+
+def json_response(data, status=200):
+    return HttpResponse(ORJSONRenderer().render(data), status=status, content_type=ORJSONRenderer.media_type)
+
+
+def async_api_view(require_authentication=True):
+    """Authenticates the request with its token and renders APIExceptions like DRF does"""
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            try:
+                request.user = await aauthenticate(request) if 'Authorization' in request.headers else None
+                if require_authentication and request.user is None:
+                    raise NotAuthenticated()
+                if request.method != 'GET':
+                    return json_response({'detail': f'Method "{request.method}" not allowed.'}, status=405)
+                return await view(request, *args, **kwargs)
+            except APIException as exc:
+                response = json_response(exc.detail if isinstance(exc.detail, (list, dict))
+                                         else {'detail': exc.detail}, status=exc.status_code)
+                if exc.status_code == 401:
+                    response['WWW-Authenticate'] = CachedTokenAuthentication.keyword
+                return response
+        return wrapper
+    return decorator
+
+
+@async_api_view()
+async def patient_profile(request):
+    """Patient profile of the current user"""
+    try:
+        patient = await Patient.objects.aget(user_id=request.user.pk)
+    except Patient.DoesNotExist:
+        raise NotFound("The user has no patient profile.")
+    await audit.arecord(request, [patient])
+    return json_response(await sync_to_async(lambda: PatientSerializer(patient).data)())
+
+
+@async_api_view()
+async def record_timeline(request, patient_id):
+    """Medical records of a patient, newest first, paginated by cursor (see RecordTimelineView)"""
+    user = request.user
+    if not (user.is_staff
+            or await Patient.objects.filter(pk=patient_id, user_id=user.pk).aexists()
+            or await Doctor.objects.filter(user_id=user.pk).aexists()):
+        raise PermissionDenied()
+
+    pagination = TimelinePagination()
+    queryset = pagination.page_queryset(Record.objects.filter(patient_id=patient_id), Request(request))
+    page = pagination.set_page([record async for record in queryset])
+    await audit.arecord(request, page)
+    data = await sync_to_async(lambda: RecordSerializer(page, many=True).data)()
+    return json_response({'next': pagination.get_next_link(), 'results': data})
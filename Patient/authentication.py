@@ -0,0 +1,182 @@
+"""
+Token authentication with a cache of token -> user snapshots
+
+`TokenAuthentication` joins the token to its user on every request. The
+cached variant keeps a snapshot of the few user columns needed to authorize
+a request, so a cache hit costs no query at all. Snapshots hold no encrypted
+(personal) columns; those are loaded from the database on first access.
+Snapshots are dropped when the token is deleted or the user is saved, from
+the cache of the process doing it: `LocMemTokenCache`, per process, has to
+keep them only a few seconds, `DjangoTokenCache` on a cache shared by the
+workers (e.g. Redis) can keep them longer.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import router
+from django.utils.module_loading import import_string
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+
+SNAPSHOT_FIELDS = ('id', 'username', 'is_active', 'is_staff', 'is_superuser')
+
+_token_cache = None
+_token_cache_lock = threading.Lock()
+
+
+class LocMemTokenCache:
+    """In-process LRU cache whose entries expire after `timeout` seconds, the delay of revocations in other workers"""
+
+    def __init__(self, timeout, max_size=10000):
+        self.timeout = timeout
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    async def aget(self, key):
+        return self.get(key)
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.timeout, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    async def aset(self, key, value):
+        self.set(key, value)
+
+    def delete_many(self, keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class DjangoTokenCache:
+    """Token cache stored in one of the `CACHES`, e.g. Redis shared by all workers"""
+
+    def __init__(self, timeout, alias='default'):
+        self.timeout = timeout
+        self.cache = caches[alias]
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    async def aget(self, key):
+        return await self.cache.aget(key)
+
+    def set(self, key, value):
+        self.cache.set(key, value, self.timeout)
+
+    async def aset(self, key, value):
+        await self.cache.aset(key, value, self.timeout)
+
+    def delete_many(self, keys):
+        self.cache.delete_many(keys)
+
+    def clear(self):
+        self.cache.clear()
+
+
+def get_token_cache():
+    global _token_cache
+
+    if _token_cache is None:
+        with _token_cache_lock:
+            if _token_cache is None:
+                config = getattr(settings, 'TOKEN_AUTH_CACHE', {})
+                backend = import_string(config.get('BACKEND', 'Patient.authentication.LocMemTokenCache'))
+                _token_cache = backend(config.get('TIMEOUT', 5), **config.get('OPTIONS', {}))
+    return _token_cache
+
+
+def snapshot_fields(user_model):
+    # Model.from_db() expects the values in the order of the model's fields
+    return [field.attname for field in user_model._meta.concrete_fields if field.attname in SNAPSHOT_FIELDS]
+
+
+def cache_key(token_key):
+    # the raw token never becomes a cache key
+    return 'auth-token:' + hashlib.sha256(token_key.encode()).hexdigest()
+
+
+def invalidate(token_keys):
+    get_token_cache().delete_many([cache_key(key) for key in token_keys])
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+
+    def authenticate_credentials(self, key):
+        token_cache = get_token_cache()
+        snapshot = token_cache.get(cache_key(key))
+        if snapshot is None:
+            user, token = super().authenticate_credentials(key)
+            token_cache.set(cache_key(key), [getattr(user, field) for field in snapshot_fields(type(user))])
+            return user, token
+
+        model = self.get_model()
+        user_model = model._meta.get_field('user').related_model
+        user = user_model.from_db(router.db_for_read(user_model), snapshot_fields(user_model), snapshot)
+        if not user.is_active:
+            raise AuthenticationFailed('User inactive or deleted.')
+        token = model(key=key, user=user)
+        token._state.adding = False
+        return user, token
+
+
+async def aauthenticate(request):
+    """
+       Token authentication of an async view, sharing the snapshots of CachedTokenAuthentication
+       Returns the user, or None when the request carries no token; raises AuthenticationFailed
+    """
+    header = request.headers.get('Authorization', '').split()
+    if not header or header[0].lower() != CachedTokenAuthentication.keyword.lower():
+        return None
+    if len(header) != 2:
+        raise AuthenticationFailed('Invalid token header.')
+    key = header[1]
+
+    from .models import CustomUser
+
+    token_cache = get_token_cache()
+    snapshot = await token_cache.aget(cache_key(key))
+    fields = snapshot_fields(CustomUser)
+    if snapshot is None:
+        # only unencrypted columns, so nothing is decrypted on the event loop
+        values = await CustomUser.objects.filter(auth_token__key=key).values_list(*fields).afirst()
+        if values is None:
+            raise AuthenticationFailed('Invalid token.')
+        snapshot = list(values)
+        await token_cache.aset(cache_key(key), snapshot)
+    user = CustomUser.from_db(router.db_for_read(CustomUser), fields, snapshot)
+    if not user.is_active:
+        raise AuthenticationFailed('User inactive or deleted.')
+    return user
+
+
+def user_saved(user, update_fields=None):
+    """Drop the snapshots of a saved user, unless none of the snapshot columns were written"""
+    if update_fields is not None and not set(update_fields) & set(SNAPSHOT_FIELDS):
+        return
+    invalidate(Token.objects.filter(user_id=user.pk).values_list('key', flat=True))
@@ -0,0 +1,131 @@
+"""
+Blind indexes for encrypted fields
+
+Encrypted columns cannot be searched in SQL, and the hash secured_fields appends
+to searchable values is only reachable through `LIKE '%$<hash>'`, which no
+index can serve. Searchable values therefore get a keyed hash (HMAC-SHA256)
+in a dedicated, indexed column, and last names additionally get prefix and
+phonetic hashes in `LastNameBlindIndex`, so "Doe*" is an index lookup too.
+"""
+import hashlib
+import hmac
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+from .encryption import EncryptedValue
+
+PREFIX = 'prefix'
+PHONETIC = 'phonetic'
+
+SOUNDEX_CODES = {
+    **dict.fromkeys('bfpv', '1'),
+    **dict.fromkeys('cgjkqsxz', '2'),
+    **dict.fromkeys('dt', '3'),
+    'l': '4',
+    **dict.fromkeys('mn', '5'),
+    'r': '6',
+}
+
+
+def _key():
+    key = getattr(settings, 'BLIND_INDEX_KEY', None)
+    if not key:
+        raise ImproperlyConfigured('`BLIND_INDEX_KEY` is required for searching encrypted fields')
+    return key.encode()
+
+
+def check_key():
+    """Called on startup, rather than failing on the first save of a user or patient"""
+    _key()
+
+
+def digest(value, kind='exact'):
+    """Keyed hash of a value; `kind` keeps the exact, prefix and phonetic hashes of one value apart"""
+    return hmac.new(_key(), f'{kind}:{value}'.encode(), hashlib.sha256).hexdigest()
+
+
+def normalize_name(value):
+    return ' '.join(str(value).split()).casefold()
+
+
+def exact(value):
+    """Hash of a value compared case and whitespace insensitively, like the prefixes"""
+    return None if value is None else digest(normalize_name(value))
+
+
+def min_prefix_length():
+    return getattr(settings, 'BLIND_INDEX_MIN_PREFIX', 2)
+
+
+def prefixes(value):
+    name = normalize_name(value)
+    return [name[:length] for length in range(min_prefix_length(), len(name) + 1)]
+
+
+def soundex(value):
+    """American Soundex code of the latin letters of a name, None if there are none"""
+    letters = [char for char in normalize_name(value) if 'a' <= char <= 'z']
+    if not letters:
+        return None
+    code, previous = letters[0].upper(), SOUNDEX_CODES.get(letters[0])
+    for char in letters[1:]:
+        digit = SOUNDEX_CODES.get(char)
+        if digit and digit != previous:
+            code += digit
+            if len(code) == 4:
+                break
+        if char not in 'hw':
+            previous = digit
+    return code.ljust(4, '0')
+
+
+def update_hashes(instance, update_fields=None, force=False):
+    """
+       Fill the `<field>_hash` columns of the model's `hashed_fields`
+       Fields still holding their loaded ciphertext are unchanged and skipped, unless `force` is set
+       Returns `update_fields` extended with the hash columns that have to be saved
+    """
+    names = instance.hashed_fields
+    if not force:
+        names = [name for name in names if not isinstance(instance.__dict__.get(name), EncryptedValue)]
+    if update_fields is not None:
+        update_fields = set(update_fields)
+        names = [name for name in names if name in update_fields]
+        update_fields.update(f'{name}_hash' for name in names)
+    for name in names:
+        setattr(instance, f'{name}_hash', exact(getattr(instance, name)))
+    return update_fields
+
+
+def last_name_rows(user):
+    """`LastNameBlindIndex` rows of a user, unsaved"""
+    from .models import LastNameBlindIndex
+
+    if not user.last_name:
+        return []
+    digests = {(PREFIX, digest(prefix, PREFIX)) for prefix in prefixes(user.last_name)}
+    code = soundex(user.last_name)
+    if code:
+        digests.add((PHONETIC, digest(code, PHONETIC)))
+    return [LastNameBlindIndex(user_id=user.pk, kind=kind, digest=value) for kind, value in digests]
+
+
+def index_last_name(user):
+    from .models import LastNameBlindIndex
+
+    LastNameBlindIndex.objects.filter(user_id=user.pk).delete()
+    LastNameBlindIndex.objects.bulk_create(last_name_rows(user))
+
+
+def prefix_lookup(value):
+    """Digest to look a "Doe*" search up with, None if the prefix is too short"""
+    name = normalize_name(value)
+    if len(name) < min_prefix_length():
+        return None
+    return digest(name, PREFIX)
+
+
+def phonetic_lookup(value):
+    code = soundex(value)
+    return code and digest(code, PHONETIC)
@@ -0,0 +1,169 @@
+"""
+Compiled read serialization
+
+For every object it renders, a DRF serializer builds its fields (on a
+ModelSerializer, by introspecting the model), then calls get_attribute() and
+to_representation() of each field. `compile_serializer()` inspects a
+serializer class once and keeps, per readable field, the attribute to read
+and a plain converter (`str` for the text and UUID fields, a dict lookup for
+choices, the value itself for primary keys), so that an object is rendered
+by one loop over the instance dict. The output is the same as the
+serializer's.
+
+Serializers using `CompiledSerializerMixin` render through it whenever all
+their readable fields are of the kinds below and read a plain attribute;
+otherwise, or with `compile_representation = False`, they are not compiled.
+Only serializers whose fields do not depend on the context or the instance
+can be compiled.
+"""
+from django.db.models.query_utils import DeferredAttribute
+from rest_framework import fields, relations, serializers
+
+from .encryption import DecryptingAttribute, EncryptedValue, decrypt_tokens, deferred_decryption
+
+_MISSING = object()
+_compiled = {}
+
+# descriptors returning the value of the instance dict (decrypted)
+COLUMN_GETTERS = (DeferredAttribute.__get__, DecryptingAttribute.__get__)
+
+# fields whose to_representation() only depends on their options
+BOUND = (fields.BooleanField, fields.IntegerField, fields.FloatField,
+         fields.DateField, fields.DateTimeField, fields.TimeField)
+
+
+def choice(field):
+    choices = field.choice_strings_to_values
+
+    def convert(value):
+        if value == '':
+            return value
+        return choices.get(str(value), value)
+    return convert
+
+
+def converter(field, model):
+    """(attribute, convert) of a field, convert None for the value itself; None when it cannot be compiled"""
+    if field.source == '*' or '.' in field.source:
+        return None
+    kind = type(field)
+    if isinstance(field, relations.PrimaryKeyRelatedField):
+        if field.pk_field is not None or kind.get_attribute is not relations.RelatedField.get_attribute or model is None:
+            return None
+        return model._meta.get_field(field.source).attname, None
+    if kind.get_attribute is not fields.Field.get_attribute:
+        return None
+    if kind.to_representation is fields.CharField.to_representation:
+        return field.source, str
+    if kind.to_representation is fields.ChoiceField.to_representation:
+        return field.source, choice(field)
+    if kind.to_representation is fields.UUIDField.to_representation and field.uuid_format == 'hex_verbose':
+        return field.source, str
+    if kind is fields.ReadOnlyField:
+        return field.source, None
+    for base in BOUND:
+        if isinstance(field, base) and kind.to_representation is base.to_representation:
+            return field.source, field.to_representation
+    return None
+
+
+class CompiledSerializer:
+    """The readable fields of a serializer as (field, name, attribute, read from the instance dict, convert)"""
+
+    def __init__(self, fields):
+        self.fields = fields
+
+    @property
+    def sources(self):
+        return [attribute for _, _, attribute, _, _ in self.fields]
+
+    def __call__(self, instance):
+        """The representation of a model instance, or of a row of values(*sources), as a dict"""
+        ret = {}
+        if isinstance(instance, dict):
+            for _, name, attribute, _, convert in self.fields:
+                value = instance[attribute]
+                ret[name] = value if value is None or convert is None else convert(value)
+            return ret
+        values = instance.__dict__
+        for field, name, attribute, direct, convert in self.fields:
+            value = values.get(attribute, _MISSING) if direct else _MISSING
+            if value is _MISSING or value.__class__ is EncryptedValue:
+                # deferred, still encrypted or not a column
+                try:
+                    value = getattr(instance, attribute)
+                except AttributeError:
+                    # the default of the field, None, skipped or the error of DRF
+                    try:
+                        value = field.get_attribute(instance)
+                    except fields.SkipField:
+                        continue
+                    if isinstance(value, relations.PKOnlyObject):
+                        value = value.pk
+            ret[name] = value if value is None or convert is None else convert(value)
+        return ret
+
+    def rows(self, queryset):
+        """
+           The representations of the rows of a queryset, without creating instances
+           The rows are read with values_list() and their encrypted columns decrypted in one batch
+        """
+        model = queryset.model
+        columns = [model._meta.get_field(attribute) for attribute in self.sources]
+        with deferred_decryption():
+            rows = [list(row) for row in queryset.values_list(*self.sources)]
+        pending = [(row, index) for row in rows for index, value in enumerate(row)
+                   if value.__class__ is EncryptedValue]
+        plaintexts = decrypt_tokens([columns[index].encrypted_section(row[index].raw) for row, index in pending])
+        for (row, index), plaintext in zip(pending, plaintexts):
+            row[index] = columns[index].from_plaintext(plaintext)
+        compiled = [(name, convert) for _, name, _, _, convert in self.fields]
+        return [{name: value if value is None or convert is None else convert(value)
+                 for (name, convert), value in zip(compiled, row)} for row in rows]
+
+
+def renders_fields(serializer_class):
+    """Whether the to_representation() below the mixin is that of Serializer, rendering the fields one by one"""
+    mro = serializer_class.__mro__
+    following = mro[mro.index(CompiledSerializerMixin) + 1:]
+    return next(cls for cls in following if 'to_representation' in vars(cls)) is serializers.Serializer
+
+
+def compile_serializer(serializer_class):
+    """The CompiledSerializer of a serializer class, None when it cannot be compiled"""
+    if serializer_class in _compiled:
+        return _compiled[serializer_class]
+    compiled = None
+    if getattr(serializer_class, 'compile_representation', False) and renders_fields(serializer_class):
+        template = serializer_class()
+        model = getattr(getattr(serializer_class, 'Meta', None), 'model', None)
+        entries = []
+        for field in template._readable_fields:
+            entry = converter(field, model)
+            if entry is None:
+                break
+            attribute, convert = entry
+            descriptor = getattr(model, attribute, None)
+            # the instance dict holds the value of a column as is, unlike that of a file, wrapped on access
+            direct = (getattr(type(descriptor), '__get__', None) in COLUMN_GETTERS
+                      and descriptor.field.attname == attribute)
+            entries.append((field, field.field_name, attribute, direct, convert))
+        else:
+            compiled = CompiledSerializer(entries)
+    _compiled[serializer_class] = compiled
+    return compiled
+
+
+class CompiledSerializerMixin:
+    """Renders instances through compile_serializer() when the serializer can be compiled"""
+    compile_representation = True
+
+    @property
+    def compiled(self):
+        return compile_serializer(type(self))
+
+    def to_representation(self, instance):
+        compiled = self.compiled
+        if compiled is None:
+            return super().to_representation(instance)
+        return compiled(instance)
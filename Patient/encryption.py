@@ -0,0 +1,311 @@
+"""
+Lazy and batched decryption of secured_fields columns
+
+secured_fields decrypts every encrypted column of every row in `from_db_value`,
+one value at a time, whether or not the value is used afterwards. The fields
+below instead keep the ciphertext (`EncryptedValue`) when their model sets
+`lazy_decryption = True` or rows are fetched through
+`EncryptedQuerySet.defer_decryption()`. List serializers then decrypt the
+columns they render for the whole page in one batch, any other column is
+decrypted on first attribute access, and a column that was never accessed is
+written back as the same ciphertext instead of being re-encrypted, unless an
+older key encrypted it (e.g. it was read before rotate_keys rewrote the row).
+"""
+import contextvars
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from itertools import islice
+
+import secured_fields
+from cryptography.fernet import Fernet, InvalidToken
+from django.conf import settings
+from django.db import models
+from django.db.models.query import ModelIterable
+from django.db.models.query_utils import DeferredAttribute
+from rest_framework import serializers
+from secured_fields.fernet import get_fernet
+from secured_fields.mixins import EncryptedMixin
+
+_deferred = contextvars.ContextVar('deferred_decryption', default=False)
+_stats = contextvars.ContextVar('decryption_stats', default=None)
+_executor = None
+
+
+class EncryptedValue:
+    """Ciphertext of an encrypted column, as stored in the database"""
+    __slots__ = ('raw',)
+
+    def __init__(self, raw):
+        self.raw = raw
+
+    def __repr__(self):
+        return '<EncryptedValue>'
+
+
+class DecryptionStats:
+    """Number of decrypted values and the time spent decrypting them"""
+    __slots__ = ('count', 'seconds')
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+
+@contextmanager
+def track_decryptions():
+    """Count the decryptions performed inside this block, e.g. during a request"""
+    stats = DecryptionStats()
+    token = _stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _stats.reset(token)
+
+
+def _record(count, started):
+    stats = _stats.get()
+    if stats is not None:
+        stats.count += count
+        stats.seconds += time.perf_counter() - started
+
+
+@contextmanager
+def deferred_decryption():
+    """Values read from the database inside this block stay encrypted"""
+    token = _deferred.set(True)
+    try:
+        yield
+    finally:
+        _deferred.reset(token)
+
+
+class DecryptingAttribute(DeferredAttribute):
+    """
+       Decrypts a value that is still encrypted on first access
+       Defines __set__ so that it is a data descriptor, consulted even when the value is in the instance dict
+    """
+
+    def __get__(self, instance, cls=None):
+        if instance is None:
+            return self
+        value = instance.__dict__.get(self.field.attname, self)
+        if value is self:
+            value = super().__get__(instance, cls)
+        if isinstance(value, EncryptedValue):
+            value = instance.__dict__[self.field.attname] = self.field.decrypt_value(value.raw)
+        return value
+
+    def __set__(self, instance, value):
+        instance.__dict__[self.field.attname] = value
+
+
+class BatchDecryptMixin:
+    descriptor_class = DecryptingAttribute
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return value
+        if _deferred.get():
+            return EncryptedValue(value)
+        return self.decrypt_value(value)
+
+    def pre_save(self, model_instance, add):
+        value = model_instance.__dict__.get(self.attname)
+        if isinstance(value, EncryptedValue):
+            if encrypted_with_primary(self.encrypted_section(value.raw)):
+                # never accessed, so unchanged
+                return value
+            # writing the old ciphertext back would undo a rotation that ran since the row was read
+            value = model_instance.__dict__[self.attname] = self.decrypt_value(value.raw)
+        return super().pre_save(model_instance, add)
+
+    def get_db_prep_save(self, value, connection):
+        if isinstance(value, EncryptedValue):
+            return value.raw
+        return super().get_db_prep_save(value, connection)
+
+    def encrypted_section(self, raw):
+        """The Fernet token of a stored value, without the hash of searchable fields"""
+        hashed_length = len(self.separator) + 64
+        if self.searchable and len(raw) > hashed_length and raw[-hashed_length] == self.separator:
+            return raw[:-hashed_length]
+        return raw
+
+    def decrypt_value(self, raw):
+        started = time.perf_counter()
+        value = super().from_db_value(raw, None, None)
+        _record(1, started)
+        return value
+
+    def from_plaintext(self, plaintext):
+        # skips EncryptedMixin.to_python(), which would try to decrypt the plaintext again
+        return super(EncryptedMixin, self).to_python(plaintext)
+
+
+class EncryptedCharField(BatchDecryptMixin, secured_fields.EncryptedCharField):
+    pass
+
+
+class EncryptedTextField(BatchDecryptMixin, secured_fields.EncryptedTextField):
+    pass
+
+
+class EncryptedDateField(BatchDecryptMixin, secured_fields.EncryptedDateField):
+    pass
+
+
+class EncryptedDateTimeField(BatchDecryptMixin, secured_fields.EncryptedDateTimeField):
+    pass
+
+
+class EncryptedQuerySet(models.QuerySet):
+    """
+       Keeps encrypted columns of the fetched instances encrypted when the model sets
+       `lazy_decryption = True` or `defer_decryption()` was called
+       Models using it lazily should also make it their base manager, which related object
+       descriptors (e.g. `record.patient`) query through
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._defer_decryption = getattr(self.model, 'lazy_decryption', False)
+
+    def defer_decryption(self):
+        """Keep encrypted columns encrypted until they are batch-decrypted or accessed"""
+        clone = self._chain()
+        clone._defer_decryption = True
+        return clone
+
+    def _clone(self):
+        clone = super()._clone()
+        clone._defer_decryption = self._defer_decryption
+        return clone
+
+    def _defers(self):
+        # values() and values_list() rows have no descriptor that could decrypt later
+        return self._defer_decryption and self._iterable_class is ModelIterable
+
+    def _fetch_all(self):
+        if self._defers():
+            with deferred_decryption():
+                super()._fetch_all()
+        else:
+            super()._fetch_all()
+
+    def _iterator(self, use_chunked_fetch, chunk_size):
+        if not self._defers():
+            yield from super()._iterator(use_chunked_fetch, chunk_size)
+            return
+        rows = super()._iterator(use_chunked_fetch, chunk_size)
+        while True:
+            # the context must not stay active in the caller between two rows
+            with deferred_decryption():
+                chunk = list(islice(rows, chunk_size or 100))
+            if not chunk:
+                return
+            yield from chunk
+
+
+def primary_fernet():
+    """Fernet of the first of `SECURED_FIELDS_KEY`, which encrypts new values"""
+    keys = settings.SECURED_FIELDS_KEY
+    return Fernet(keys if isinstance(keys, str) else keys[0])
+
+
+def encrypted_with_primary(token):
+    """Whether the first of `SECURED_FIELDS_KEY` encrypted a stored Fernet token"""
+    keys = settings.SECURED_FIELDS_KEY
+    if isinstance(keys, str) or len(keys) == 1:
+        # no other key could have
+        return True
+    try:
+        primary_fernet().decrypt(token.encode())
+    except InvalidToken:
+        return False
+    return True
+
+
+def decrypt_workers():
+    return getattr(settings, 'SECURED_FIELDS_DECRYPT_WORKERS', 0)
+
+
+def _decrypt_tokens(tokens):
+    fernet = get_fernet()
+    result = []
+    for token in tokens:
+        try:
+            result.append(fernet.decrypt(token.encode()).decode())
+        except InvalidToken:
+            # not encrypted
+            result.append(token)
+    return result
+
+
+def decrypt_tokens(tokens, workers=None):
+    """Decrypt Fernet tokens, split over a thread pool when `workers` > 1"""
+    global _executor
+
+    started = time.perf_counter()
+    workers = decrypt_workers() if workers is None else workers
+    if workers <= 1 or len(tokens) < 2 * workers:
+        plaintexts = _decrypt_tokens(tokens)
+    else:
+        if _executor is None or _executor._max_workers != workers:
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='decrypt')
+        size = -(-len(tokens) // workers)
+        chunks = _executor.map(_decrypt_tokens, [tokens[start:start + size] for start in range(0, len(tokens), size)])
+        plaintexts = [plaintext for chunk in chunks for plaintext in chunk]
+    _record(len(tokens), started)
+    return plaintexts
+
+
+def decrypt_batch(instances, field_names=None, workers=None):
+    """
+       Decrypt the still encrypted values of `field_names` (all by default) on all instances at once
+       Related instances are reached with `__`, e.g. 'user__first_name'
+    """
+    pending = []
+    paths = [name.split('__') for name in field_names] if field_names is not None else [[]]
+    # (model, name): the encrypted fields to look at, resolved once
+    encrypted = {}
+    for instance in instances:
+        for path in paths:
+            target = instance
+            for part in path[:-1]:
+                target = getattr(target, part, None)
+            if target is None:
+                continue
+            key = type(target), path[-1] if path else None
+            if key not in encrypted:
+                encrypted[key] = [field for field in target._meta.concrete_fields
+                                  if isinstance(field, BatchDecryptMixin) and (not path or field.name == path[-1])]
+            for field in encrypted[key]:
+                value = target.__dict__.get(field.attname)
+                if isinstance(value, EncryptedValue):
+                    pending.append((target, field, field.encrypted_section(value.raw)))
+    plaintexts = decrypt_tokens([token for _, _, token in pending], workers)
+    for (target, field, _), plaintext in zip(pending, plaintexts):
+        target.__dict__[field.attname] = field.from_plaintext(plaintext)
+    return instances
+
+
+class BatchDecryptListSerializer(serializers.ListSerializer):
+    """Decrypts the columns rendered by the child serializer for the whole page at once"""
+
+    def rendered_fields(self):
+        compiled = getattr(self.child, 'compiled', None)
+        if compiled is not None:
+            # without building the fields of the child
+            return compiled.sources
+        return [field.source.replace('.', '__') for field in self.child._readable_fields
+                if field.source != '*']
+
+    def to_representation(self, data):
+        if isinstance(data, models.Manager):
+            data = data.all()
+        if isinstance(data, EncryptedQuerySet):
+            data = data.defer_decryption()
+        instances = list(data)
+        decrypt_batch(instances, self.rendered_fields())
+        return super().to_representation(instances)
@@ -0,0 +1,221 @@
+import csv
+import json
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from django.contrib.auth.hashers import identify_hasher, make_password
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, IntegrityError, connections, transaction
+
+from Patient import aggregates, blind_index
+from Patient.encryption import EncryptedValue
+from Patient.models import CustomUser, LastNameBlindIndex, Patient
+from Polyclinic.bulk import copy_instances
+
+USER_COLUMNS = ('username', 'email', 'first_name', 'last_name', 'phone_number', 'gender', 'birth_date',
+                'password', 'is_active')
+PATIENT_COLUMNS = ('region', 'neighborhood', 'city', 'street', 'house', 'apartment', 'allergy', 'blood_type',
+                   'medical_insurance_number')
+
+
+def read_rows(path, file_format):
+    """(row number, dict) of every row of a CSV or NDJSON file, streamed"""
+    with open(path, newline='', encoding='utf-8') as file:
+        if file_format == 'csv':
+            yield from enumerate(csv.DictReader(file), start=1)
+            return
+        number = 0
+        for line in file:
+            if line.strip():
+                number += 1
+                yield number, json.loads(line)
+
+
+def _init_worker():
+    import django
+    from django.apps import apps
+
+    # processes started with "spawn" do not inherit the configured project
+    if not apps.ready:
+        django.setup()
+
+
+def _hash_password(password):
+    if not password:
+        # users without a password set one through the password reset
+        return make_password(None)
+    try:
+        identify_hasher(password)
+        # already hashed, e.g. exported from another Django project
+        return password
+    except ValueError:
+        return make_password(password)
+
+
+def _encrypt(instance, connection):
+    """Store the encrypted columns as EncryptedValue, which bulk_create() writes as is"""
+    for field in instance._meta.concrete_fields:
+        value = instance.__dict__.get(field.attname)
+        if hasattr(field, 'encrypted_section') and value is not None:
+            instance.__dict__[field.attname] = EncryptedValue(field.get_db_prep_save(value, connection))
+
+
+def _clean(instance, exclude):
+    # optional columns left empty would fail as blank
+    exclude = [*exclude, *(field.name for field in instance._meta.concrete_fields
+                           if field.null and getattr(instance, field.attname) is None)]
+    instance.clean_fields(exclude=exclude)
+
+
+def prepare_batch(rows, database):
+    """
+       Validate, hash and encrypt a batch of rows, in a worker process
+       Returns (prepared, errors): (number, user, patient, last name index rows, counted categories) and
+       (number, message)
+    """
+    connection = connections[database]
+    prepared, errors = [], []
+    for number, row in rows:
+        row = {key: value.strip() if isinstance(value, str) else value for key, value in row.items()}
+        row = {key: None if value == '' else value for key, value in row.items()}
+        try:
+            is_active = str(row.get('is_active') or '').lower() in ('1', 'true', 't', 'yes')
+            user = CustomUser(**{column: row.get(column) for column in USER_COLUMNS if column != 'is_active'},
+                              is_active=is_active)
+            user.password = _hash_password(user.password)
+            _clean(user, ['password', *(f'{name}_hash' for name in CustomUser.hashed_fields)])
+            patient = Patient(user=user, **{column: row.get(column) for column in PATIENT_COLUMNS})
+            _clean(patient, ['user', *(f'{name}_hash' for name in Patient.hashed_fields)])
+        except (ValidationError, TypeError, ValueError) as e:
+            errors.append((number, '; '.join(e.messages) if isinstance(e, ValidationError) else str(e)))
+            continue
+        blind_index.update_hashes(user, force=True)
+        blind_index.update_hashes(patient, force=True)
+        index_rows = blind_index.last_name_rows(user)
+        categories = (aggregates.changes(user, aggregates.touched(user))
+                      + aggregates.changes(patient, aggregates.touched(patient)))
+        _encrypt(user, connection)
+        _encrypt(patient, connection)
+        prepared.append((number, user, patient, index_rows, categories))
+    return prepared, errors
+
+
+def load_batch(prepared, database, use_copy):
+    users = [user for _, user, _, _, _ in prepared]
+    patients = [patient for _, _, patient, _, _ in prepared]
+    index_rows = [row for _, _, _, rows, _ in prepared for row in rows]
+    categories = sum((categories for *_, categories in prepared), Counter())
+    if use_copy:
+        connection = connections[database]
+        copy_instances(connection, CustomUser, users)
+        copy_instances(connection, Patient, patients)
+        copy_instances(connection, LastNameBlindIndex, index_rows)
+    else:
+        CustomUser.objects.using(database).bulk_create(users)
+        Patient.objects.using(database).bulk_create(patients)
+        LastNameBlindIndex.objects.using(database).bulk_create(index_rows)
+    # bulk_create() and COPY skip save(), which counts the categories
+    aggregates.add(categories, database)
+
+
+class Command(BaseCommand):
+    help = ("Import users with their patient profiles from a CSV file (with a header row) or NDJSON file. "
+            "Columns: " + ', '.join(USER_COLUMNS + PATIENT_COLUMNS) + ". "
+            "Rows without a password get an unusable one; passwords already hashed by Django are kept")
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'ndjson'],
+                            help="Defaults to the file extension (.csv, otherwise NDJSON)")
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help="Processes validating, hashing and encrypting rows (0 uses this process)")
+        parser.add_argument('--copy', action='store_true', help="Load with COPY (PostgreSQL only)")
+        parser.add_argument('--checkpoint', help="File recording the imported rows, to resume an "
+                                                 "interrupted import (defaults to <path>.checkpoint)")
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, path, batch_size, workers, copy, database, **options):
+        file_format = options['format'] or ('csv' if path.lower().endswith('.csv') else 'ndjson')
+        if copy and connections[database].vendor != 'postgresql':
+            raise CommandError("--copy requires PostgreSQL.")
+        checkpoint = options['checkpoint'] or f'{path}.checkpoint'
+        done = self.read_checkpoint(checkpoint, path)
+        if done:
+            self.stdout.write(f"Resuming after row {done}")
+
+        rows = islice(read_rows(path, file_format), done, None)
+        batches = iter(lambda: list(islice(rows, batch_size)), [])
+        self.imported = self.skipped = self.failed = 0
+        self.started = self.reported = time.monotonic()
+
+        if workers:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+                pending = []
+                for batch in batches:
+                    pending.append(executor.submit(prepare_batch, batch, database))
+                    # a bounded number of batches in flight keeps the memory flat
+                    if len(pending) >= 2 * workers:
+                        done = self.load(pending.pop(0).result(), database, copy, checkpoint, path)
+                for future in pending:
+                    done = self.load(future.result(), database, copy, checkpoint, path)
+        else:
+            for batch in batches:
+                done = self.load(prepare_batch(batch, database), database, copy, checkpoint, path)
+
+        self.report(done)
+        if os.path.exists(checkpoint):
+            os.remove(checkpoint)
+
+    def load(self, result, database, use_copy, checkpoint, path):
+        prepared, errors = result
+        for number, message in errors:
+            self.stderr.write(f"Row {number}: {message}")
+        self.failed += len(errors)
+        if prepared:
+            try:
+                with transaction.atomic(using=database):
+                    load_batch(prepared, database, use_copy)
+                self.imported += len(prepared)
+            except IntegrityError:
+                self.load_one_by_one(prepared, database)
+        last = max([number for number, *_ in prepared] + [number for number, _ in errors])
+        self.write_checkpoint(checkpoint, path, last)
+        if time.monotonic() - self.reported >= 10:
+            self.report(last)
+        return last
+
+    def load_one_by_one(self, prepared, database):
+        """Rows of a batch that failed, e.g. users imported before an interrupted run wrote its checkpoint"""
+        for row in prepared:
+            try:
+                with transaction.atomic(using=database):
+                    load_batch([row], database, False)
+                self.imported += 1
+            except DatabaseError:
+                self.stderr.write(f"Row {row[0]}: skipped, it conflicts with an existing user or patient")
+                self.skipped += 1
+
+    def report(self, rows):
+        elapsed = time.monotonic() - self.started
+        self.reported = time.monotonic()
+        self.stdout.write(f"{rows} row(s) read: {self.imported} imported, {self.skipped} skipped, "
+                          f"{self.failed} invalid in {elapsed:.1f}s ({self.imported / (elapsed or 1):.0f} rows/s)")
+
+    def read_checkpoint(self, checkpoint, path):
+        if not os.path.exists(checkpoint):
+            return 0
+        with open(checkpoint) as file:
+            state = json.load(file)
+        if state['path'] != os.path.abspath(path):
+            raise CommandError(f"{checkpoint} belongs to the import of {state['path']}.")
+        return state['rows']
+
+    def write_checkpoint(self, checkpoint, path, rows):
+        with open(f'{checkpoint}.tmp', 'w') as file:
+            json.dump({'path': os.path.abspath(path), 'rows': rows}, file)
+        os.replace(f'{checkpoint}.tmp', checkpoint)
@@ -0,0 +1,84 @@
+import os
+from collections import Counter
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+
+from Patient import aggregates
+from Patient.encryption import decrypt_tokens
+from Patient.management.commands.rotate_keys import _init_worker, read_batch
+
+
+def count_batch(rows, label, field_names):
+    """{(dimension, category): count} of a batch of (pk, stored values) rows, in a worker process"""
+    model = apps.get_model(label)
+    fields = [model._meta.get_field(name) for name in field_names]
+    stored = [(field, raw) for _, values in rows for field, raw in zip(fields, values) if raw is not None]
+    plaintexts = decrypt_tokens([field.encrypted_section(raw) for field, raw in stored], workers=0)
+    counts = Counter()
+    for (field, _), plaintext in zip(stored, plaintexts):
+        value = aggregates.category(field.from_plaintext(plaintext))
+        if value is not None:
+            counts[field.name, value] += 1
+    return counts
+
+
+class Command(BaseCommand):
+    help = ("Recount the categories of the counted encrypted fields (see Patient.aggregates) and correct "
+            "CategoryCounter. Runs online: the rows and the counters are read in one snapshot (REPEATABLE READ "
+            "on PostgreSQL) and only the difference is added, so writes made meanwhile are kept")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help="Processes decrypting the rows (0 uses this process)")
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, batch_size, workers, database, **options):
+        self.executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) if workers else None
+        self.in_flight = 2 * max(workers, 1)
+        try:
+            for model in aggregates.counted_models():
+                self.rebuild(model, batch_size, database)
+        finally:
+            if self.executor:
+                self.executor.shutdown()
+
+    def submit(self, function, *args):
+        if self.executor:
+            return self.executor.submit(function, *args)
+        future = Future()
+        future.set_result(function(*args))
+        return future
+
+    def rebuild(self, model, batch_size, database):
+        connection = connections[database]
+        field_names = list(model.counted_fields)
+        columns = [model._meta.get_field(name).column for name in field_names]
+        counted, rows = Counter(), 0
+        snapshot = connection.vendor == 'postgresql' and not connection.in_atomic_block
+        with transaction.atomic(using=database):
+            if snapshot:
+                with connection.cursor() as cursor:
+                    cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ')
+            current = aggregates.counts(field_names, database)
+            pending, after = [], None
+            while True:
+                batch = read_batch(connection, model, columns, after, batch_size)
+                if batch:
+                    after = batch[-1][0]
+                    rows += len(batch)
+                    pending.append(self.submit(count_batch, batch, model._meta.label, field_names))
+                # a bounded number of batches in flight keeps the memory flat
+                while pending and (not batch or len(pending) >= self.in_flight):
+                    counted.update(pending.pop(0).result())
+                if not batch:
+                    break
+
+        keys = set(counted) | set(current)
+        deltas = {key: counted[key] - current.get(key, 0) for key in keys if counted[key] != current.get(key, 0)}
+        with transaction.atomic(using=database):
+            aggregates.add(deltas, database)
+        self.stdout.write(f"{model._meta.label}: {rows} row(s) counted, {len(deltas)} counter(s) corrected")
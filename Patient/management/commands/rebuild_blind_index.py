@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from Patient import blind_index
+from Patient.models import CustomUser, LastNameBlindIndex, Patient
+
+
+class Command(BaseCommand):
+    help = "Recompute the blind indexes of encrypted fields, e.g. after changing BLIND_INDEX_KEY"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, batch_size, **options):
+        for model in (CustomUser, Patient):
+            hash_fields = [f'{name}_hash' for name in model.hashed_fields]
+            count = 0
+            last_pk = None
+            while True:
+                queryset = model.objects.order_by('pk').only('pk', *model.hashed_fields)
+                if last_pk is not None:
+                    queryset = queryset.filter(pk__gt=last_pk)
+                batch = list(queryset[:batch_size])
+                if not batch:
+                    break
+                for instance in batch:
+                    blind_index.update_hashes(instance, force=True)
+                with transaction.atomic():
+                    model.objects.bulk_update(batch, hash_fields)
+                    if model is CustomUser:
+                        LastNameBlindIndex.objects.filter(user__in=batch).delete()
+                        LastNameBlindIndex.objects.bulk_create(
+                            row for user in batch for row in blind_index.last_name_rows(user))
+                last_pk = batch[-1].pk
+                count += len(batch)
+            self.stdout.write(f"{model.__name__}: {count} row(s) indexed")
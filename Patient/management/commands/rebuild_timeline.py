@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+from django.utils import timezone
+
+from Patient.encryption import decrypt_batch
+from Patient.models import Record
+
+
+class Command(BaseCommand):
+    help = ("Copy the decrypted created_at of every record into timeline_key, e.g. after adding the column: "
+            "records saved before it kept the time of the migration")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, batch_size, **options):
+        count = 0
+        last_pk = None
+        while True:
+            queryset = Record.objects.order_by('pk').only('pk', 'created_at', 'timeline_key')
+            if last_pk is not None:
+                queryset = queryset.filter(pk__gt=last_pk)
+            batch = list(queryset[:batch_size])
+            if not batch:
+                break
+            decrypt_batch(batch, ['created_at'])
+            changed = []
+            for record in batch:
+                created_at = record.created_at
+                if timezone.is_naive(created_at):
+                    # backends without time zone support (SQLite) stored it in the time zone of the connection
+                    created_at = timezone.make_aware(created_at, connections[Record.objects.db].timezone)
+                if record.timeline_key != created_at:
+                    record.timeline_key = created_at
+                    changed.append(record)
+            with transaction.atomic():
+                Record.objects.bulk_update(changed, ['timeline_key'])
+            last_pk = batch[-1].pk
+            count += len(changed)
+        self.stdout.write(f"Record: {count} row(s) updated")
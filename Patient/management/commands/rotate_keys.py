@@ -0,0 +1,267 @@
+import json
+import os
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from cryptography.fernet import InvalidToken
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from secured_fields.fernet import get_fernet
+from secured_fields.mixins import EncryptedMixin, EncryptedStorageMixin
+from secured_fields.utils import hash_with_salt
+
+from Patient.encryption import primary_fernet
+from Patient.storage import rotate_file
+
+# separator and hex SHA-256 appended to searchable values
+HASH_LENGTH = 1 + 64
+
+
+def encrypted_columns(model):
+    return [field for field in model._meta.concrete_fields if isinstance(field, EncryptedMixin)]
+
+
+def encrypted_files(model):
+    return [field for field in model._meta.concrete_fields
+            if isinstance(getattr(field, 'storage', None), EncryptedStorageMixin)]
+
+
+def _init_worker():
+    import django
+
+    # processes started with "spawn" do not inherit the configured project
+    if not apps.ready:
+        django.setup()
+
+
+def rotate_value(raw, searchable, primary, fernet):
+    """
+       The stored value re-encrypted with the primary key and rehashed with the current salt
+       Returns `raw` itself when it is current, None when no key decrypts it
+    """
+    token = raw[:-HASH_LENGTH] if searchable and len(raw) > HASH_LENGTH else raw
+    try:
+        plaintext = primary.decrypt(token.encode())
+    except InvalidToken:
+        try:
+            plaintext = fernet.decrypt(token.encode())
+        except InvalidToken:
+            return None
+        token = primary.encrypt(plaintext).decode()
+    rotated = token + EncryptedMixin.separator + hash_with_salt(plaintext) if searchable else token
+    return raw if rotated == raw else rotated
+
+
+def rotate_batch(rows, searchable):
+    """
+       Rotate the values of (pk, values) rows, in a worker process
+       Returns (changes, unreadable): (pk, {index: (old, new)}) of the changed rows and the number of
+       values no key decrypts
+    """
+    primary, fernet = primary_fernet(), get_fernet()
+    changes, unreadable = [], 0
+    for pk, values in rows:
+        changed = {}
+        for index, (raw, is_searchable) in enumerate(zip(values, searchable)):
+            if raw is None:
+                continue
+            rotated = rotate_value(raw, is_searchable, primary, fernet)
+            if rotated is None:
+                unreadable += 1
+            elif rotated is not raw:
+                changed[index] = (raw, rotated)
+        if changed:
+            changes.append((pk, changed))
+    return changes, unreadable
+
+
+def rotate_files(rows, label, field_name):
+    """Rotate the stored files of (name,) rows, in a worker process; returns (rewritten, unreadable names)"""
+    storage = apps.get_model(label)._meta.get_field(field_name).storage
+    rewritten, unreadable = 0, []
+    for name, in rows:
+        try:
+            rewritten += rotate_file(storage, name)
+        except (InvalidToken, FileNotFoundError):
+            unreadable.append(name)
+    return rewritten, unreadable
+
+
+def read_batch(connection, model, columns, after, size):
+    """(pk, stored values) of the next rows after the pk `after`, read raw, without any decryption"""
+    quote = connection.ops.quote_name
+    pk = model._meta.pk
+    where, params = '', []
+    if after is not None:
+        where, params = f' WHERE {quote(pk.column)} > %s', [pk.get_db_prep_value(after, connection)]
+    sql = (f'SELECT {quote(pk.column)}, {", ".join(quote(column) for column in columns)} '
+           f'FROM {quote(model._meta.db_table)}{where} ORDER BY {quote(pk.column)} LIMIT %s')
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [*params, size])
+        return [(pk.to_python(row[0]), list(row[1:])) for row in cursor.fetchall()]
+
+
+def write_batch(connection, model, columns, changes):
+    """
+       Store rotated values, unless a row was written meanwhile (then it holds a current value already)
+       Returns the number of updated rows
+    """
+    quote = connection.ops.quote_name
+    pk = model._meta.pk
+    grouped = {}
+    for row_pk, changed in changes:
+        indexes = tuple(sorted(changed))
+        grouped.setdefault(indexes, []).append([
+            *(changed[index][1] for index in indexes),
+            pk.get_db_prep_value(row_pk, connection),
+            *(changed[index][0] for index in indexes),
+        ])
+    updated = 0
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        for indexes, params in grouped.items():
+            assignments = ', '.join(f'{quote(columns[index])} = %s' for index in indexes)
+            conditions = ''.join(f' AND {quote(columns[index])} = %s' for index in indexes)
+            cursor.executemany(f'UPDATE {quote(model._meta.db_table)} SET {assignments} '
+                               f'WHERE {quote(pk.column)} = %s{conditions}', params)
+            updated += max(cursor.rowcount, 0)
+    return updated
+
+
+class Command(BaseCommand):
+    help = ("Re-encrypt all encrypted columns and files with the first of SECURED_FIELDS_KEY and rehash "
+            "searchable values with SECURED_FIELDS_HASH_SALT. Runs online: rows are read in pk order and "
+            "updated in small transactions, and rows written meanwhile are left alone. Keep the old keys in "
+            "SECURED_FIELDS_KEY (after the new one) until it reports no unreadable values")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help="Processes re-encrypting values (0 uses this process)")
+        parser.add_argument('--max-rate', type=float, default=0,
+                            help="Rows (or files) per second at most, to spare the database (0: no limit)")
+        parser.add_argument('--checkpoint', default='rotate_keys.checkpoint',
+                            help="File recording the progress, to resume an interrupted rotation")
+        parser.add_argument('--skip-files', action='store_true')
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, batch_size, workers, max_rate, checkpoint, skip_files, database, **options):
+        self.connection = connections[database]
+        self.max_rate = max_rate
+        self.checkpoint = checkpoint
+        self.done = self.read_checkpoint()
+        self.unreadable = 0
+        # labels with unreadable values: their checkpoint stays before the first of them, so a rerun retries them
+        self.failed = set()
+        self.executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) if workers else None
+        self.in_flight = 2 * max(workers, 1)
+        try:
+            for model in apps.get_models():
+                columns = encrypted_columns(model)
+                if columns:
+                    self.rotate_model(model, columns, batch_size)
+                for field in [] if skip_files else encrypted_files(model):
+                    self.rotate_field_files(model, field, batch_size)
+        finally:
+            if self.executor:
+                self.executor.shutdown()
+
+        if self.unreadable:
+            raise CommandError(f"{self.unreadable} value(s) or file(s) could not be decrypted with any key; "
+                               f"keep the old keys until they are fixed, then run it again to retry them.")
+        if os.path.exists(checkpoint):
+            os.remove(checkpoint)
+
+    def submit(self, function, *args):
+        if self.executor:
+            return self.executor.submit(function, *args)
+        future = Future()
+        future.set_result(function(*args))
+        return future
+
+    def batches(self, read, function, *args):
+        """Results of `function` on the batches returned by `read(after)`, with their last pk, in order"""
+        pending = []
+        after = None
+        while True:
+            batch = read(after)
+            if batch:
+                after = batch[-1][0]
+                pending.append((self.submit(function, batch, *args), after, len(batch)))
+            # a bounded number of batches in flight keeps the memory flat
+            while pending and (not batch or len(pending) >= self.in_flight):
+                future, last, size = pending.pop(0)
+                yield future.result(), last, size
+            if not batch:
+                return
+
+    def rotate_model(self, model, columns, batch_size):
+        label = model._meta.label
+        pk = model._meta.pk
+        start = self.done.get(label)
+        start = None if start is None else pk.to_python(start)
+        column_names = [field.column for field in columns]
+        searchable = [field.searchable for field in columns]
+        rows = rewritten = 0
+        started = time.monotonic()
+
+        def read(after):
+            return read_batch(self.connection, model, column_names, start if after is None else after, batch_size)
+
+        for (changes, unreadable), last, size in self.batches(read, rotate_batch, searchable):
+            if changes:
+                rewritten += write_batch(self.connection, model, column_names, changes)
+            self.unreadable += unreadable
+            rows += size
+            self.advance(label, str(last), unreadable)
+            self.throttle(rows, started)
+        self.stdout.write(f"{label}: {rows} row(s) read, {rewritten} rewritten")
+
+    def rotate_field_files(self, model, field, batch_size):
+        label = f'{model._meta.label}.{field.name}'
+        start = self.done.get(label)
+        names = (model._base_manager.using(self.connection.alias).exclude(**{field.attname: ''})
+                 .exclude(**{f'{field.attname}__isnull': True}).order_by(field.attname)
+                 .values_list(field.attname).distinct())
+        files = rewritten = 0
+        started = time.monotonic()
+
+        def read(after):
+            after = start if after is None else after
+            return list((names.filter(**{f'{field.attname}__gt': after}) if after else names)[:batch_size])
+
+        for (count, unreadable), last, size in self.batches(read, rotate_files, model._meta.label, field.name):
+            rewritten += count
+            for name in unreadable:
+                self.stderr.write(f"{label}: {name} could not be decrypted with any key")
+            self.unreadable += len(unreadable)
+            files += size
+            self.advance(label, last, len(unreadable))
+            self.throttle(files, started)
+        self.stdout.write(f"{label}: {files} file(s) read, {rewritten} rewritten")
+
+    def throttle(self, count, started):
+        if self.max_rate:
+            time.sleep(max(started + count / self.max_rate - time.monotonic(), 0))
+
+    def read_checkpoint(self):
+        if not os.path.exists(self.checkpoint):
+            return {}
+        with open(self.checkpoint) as file:
+            done = json.load(file)
+        self.stdout.write(f"Resuming after {', '.join(f'{label} {last}' for label, last in done.items())}")
+        return done
+
+    def advance(self, label, last, unreadable):
+        """Record that `label` is done up to `last`, unless this or an earlier batch had unreadable values"""
+        if unreadable:
+            self.failed.add(label)
+        if label not in self.failed:
+            self.write_checkpoint(label, last)
+
+    def write_checkpoint(self, label, last):
+        self.done[label] = last
+        with open(f'{self.checkpoint}.tmp', 'w') as file:
+            json.dump(self.done, file)
+        os.replace(f'{self.checkpoint}.tmp', self.checkpoint)
+
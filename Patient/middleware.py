@@ -0,0 +1,39 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from .encryption import track_decryptions
+
+
+class DecryptionCountMiddleware:
+    """
+       Counts the encrypted values a request decrypts (`request.decryptions`)
+       With DECRYPTION_COUNT_HEADER set, reports them in the `X-Decryption-Count` header
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        # under ASGI the async views must not be pushed into a thread by this middleware
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with track_decryptions() as stats:
+            request.decryptions = stats
+            response = self.get_response(request)
+        return self.report(response, stats)
+
+    async def __acall__(self, request):
+        with track_decryptions() as stats:
+            request.decryptions = stats
+            response = await self.get_response(request)
+        return self.report(response, stats)
+
+    @staticmethod
+    def report(response, stats):
+        if getattr(settings, 'DECRYPTION_COUNT_HEADER', False):
+            response['X-Decryption-Count'] = str(stats.count)
+        return response
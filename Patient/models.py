@@ -1,10 +1,12 @@
 import uuid
-from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.contrib.auth.models import AbstractUser, UserManager
+from django.db import models, router, transaction
 
 import secured_fields
 from django.utils import timezone
-from django.contrib.auth.hashers import make_password
+from django.contrib.auth.hashers import UNUSABLE_PASSWORD_PREFIX, identify_hasher, make_password
+
+from . import aggregates, blind_index, encryption
 
 OPTIONS_GENDER = (
     ('Male', 'Male'),
@@ -24,24 +26,81 @@ OPTIONS_BLOOD = (
 )
 
 
+class CustomUserManager(UserManager.from_queryset(encryption.EncryptedQuerySet)):
+    pass
+
+
+def password_needs_hashing(password):
+    """Whether a password is neither empty, unusable nor hashed by one of the `PASSWORD_HASHERS`"""
+    if not password or password.startswith(UNUSABLE_PASSWORD_PREFIX):
+        return False
+    try:
+        identify_hasher(password)
+    except ValueError:
+        return True
+    return False
+
+
+def save_counted(instance, save, *args, **kwargs):
+    """Call the model's `save` and update the category counters of the change in one transaction"""
+    names = aggregates.touched(instance, kwargs.get('update_fields'))
+    if not names:
+        return save(*args, **kwargs)
+    using = kwargs.get('using') or router.db_for_write(type(instance), instance=instance)
+    with transaction.atomic(using=using):
+        deltas = aggregates.changes(instance, names, using)
+        save(*args, **kwargs)
+        aggregates.add(deltas, using)
+
+
 #TODO: add activation via phone confirmation
 class CustomUser(AbstractUser):
     """Model of the main user"""
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    first_name = secured_fields.EncryptedCharField(max_length=50, searchable=True)
-    last_name = secured_fields.EncryptedCharField(max_length=50, searchable=True)
-    phone_number = secured_fields.EncryptedCharField(max_length=10, unique=True, searchable=True)
-    email = secured_fields.EncryptedCharField(max_length=255, unique=True)
-    gender = secured_fields.EncryptedCharField(max_length=20, choices=OPTIONS_GENDER, blank=False, null=False)
-    birth_date = secured_fields.EncryptedDateField()
-    created_at = secured_fields.EncryptedDateTimeField(default=timezone.now, editable=False)
+    first_name = encryption.EncryptedCharField(max_length=50, searchable=True)
+    last_name = encryption.EncryptedCharField(max_length=50, searchable=True)
+    phone_number = encryption.EncryptedCharField(max_length=10, unique=True, searchable=True)
+    email = encryption.EncryptedCharField(max_length=255, unique=True)
+    gender = encryption.EncryptedCharField(max_length=20, choices=OPTIONS_GENDER, blank=False, null=False)
+    birth_date = encryption.EncryptedDateField()
+    created_at = encryption.EncryptedDateTimeField(default=timezone.now, editable=False)
     is_active = models.BooleanField(default=False)
+    # blind indexes of the searchable fields, see Patient.blind_index
+    first_name_hash = models.CharField(max_length=64, null=True, editable=False, db_index=True)
+    last_name_hash = models.CharField(max_length=64, null=True, editable=False, db_index=True)
+    phone_number_hash = models.CharField(max_length=64, null=True, editable=False, db_index=True)
+
+    objects = CustomUserManager()
+
+    lazy_decryption = True
+    hashed_fields = ('first_name', 'last_name', 'phone_number')
+    # categories counted in CategoryCounter, see Patient.aggregates
+    counted_fields = ('gender',)
+
+    class Meta(AbstractUser.Meta):
+        base_manager_name = 'objects'
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # the stored hash, to tell whether the password was changed since
+        instance._loaded_password = instance.__dict__.get('password')
+        return instance
+
+    def password_changed(self):
+        """Whether a password other than the stored one was assigned (deferred passwords are unchanged)"""
+        return 'password' in self.__dict__ and self.password != getattr(self, '_loaded_password', None)
 
     def save(self, *args, **kwargs):
-        # Check if the password is set and not already hashed
-        if self.password and not self.password.startswith('pbkdf2_sha256$'):
+        # A changed password that no configured hasher recognizes was assigned in plain text
+        if self.password_changed() and password_needs_hashing(self.password):
             self.password = make_password(self.password)
-        super().save(*args, **kwargs)
+        last_name_hash = self.last_name_hash
+        kwargs['update_fields'] = blind_index.update_hashes(self, kwargs.get('update_fields'))
+        save_counted(self, super().save, *args, **kwargs)
+        self._loaded_password = self.__dict__.get('password')
+        if self.last_name_hash != last_name_hash:
+            blind_index.index_last_name(self)
 
 
 
@@ -52,19 +111,57 @@ class Patient(models.Model):
     """
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     user = models.OneToOneField(CustomUser, on_delete=models.CASCADE)
-    region = secured_fields.EncryptedCharField(max_length=50)
-    neighborhood = secured_fields.EncryptedCharField(max_length=50)
-    city = secured_fields.EncryptedCharField(max_length=50)
-    street = secured_fields.EncryptedCharField(max_length=50, null=True)
-    house = secured_fields.EncryptedCharField(max_length=50, null=True)
-    apartment = secured_fields.EncryptedCharField(max_length=50, null=True)
-    allergy = secured_fields.EncryptedTextField(max_length=50)
-    blood_type = secured_fields.EncryptedCharField(max_length=50, choices=OPTIONS_BLOOD, blank=False, null=False)
-    medical_insurance_number = secured_fields.EncryptedCharField(max_length=20,
+    region = encryption.EncryptedCharField(max_length=50)
+    neighborhood = encryption.EncryptedCharField(max_length=50)
+    city = encryption.EncryptedCharField(max_length=50)
+    street = encryption.EncryptedCharField(max_length=50, null=True)
+    house = encryption.EncryptedCharField(max_length=50, null=True)
+    apartment = encryption.EncryptedCharField(max_length=50, null=True)
+    allergy = encryption.EncryptedTextField(max_length=50)
+    blood_type = encryption.EncryptedCharField(max_length=50, choices=OPTIONS_BLOOD, blank=False, null=False)
+    medical_insurance_number = encryption.EncryptedCharField(max_length=20,
                                                                  blank=True,
                                                                  null=True,
                                                                  searchable=True,
                                                                  unique=True)
+    medical_insurance_number_hash = models.CharField(max_length=64, null=True, editable=False, db_index=True)
+
+    objects = encryption.EncryptedQuerySet.as_manager()
+
+    lazy_decryption = True
+    hashed_fields = ('medical_insurance_number',)
+    counted_fields = ('blood_type', 'city')
+
+    class Meta:
+        base_manager_name = 'objects'
+
+    def save(self, *args, **kwargs):
+        kwargs['update_fields'] = blind_index.update_hashes(self, kwargs.get('update_fields'))
+        save_counted(self, super().save, *args, **kwargs)
+
+
+class CategoryCounter(models.Model):
+    """Number of rows in a category of a counted encrypted field, one shard of it, see Patient.aggregates"""
+    dimension = models.CharField(max_length=50)
+    category = models.CharField(max_length=50)
+    shard = models.PositiveSmallIntegerField(default=0)
+    count = models.BigIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('dimension', 'category', 'shard')
+
+
+class LastNameBlindIndex(models.Model):
+    """Prefix and phonetic hashes of a user's last name, for searching without decrypting"""
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='last_name_index')
+    kind = models.CharField(max_length=10, choices=((blind_index.PREFIX, 'Prefix'),
+                                                    (blind_index.PHONETIC, 'Phonetic')))
+    digest = models.CharField(max_length=64)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['kind', 'digest']),
+        ]
 
 
 
@@ -72,15 +169,38 @@ class Patient(models.Model):
 class Record(models.Model):
     """Patient records"""
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    description = secured_fields.EncryptedTextField(max_length=50)
+    description = encryption.EncryptedTextField(max_length=50)
     doctor_autohor = models.ForeignKey('Doctor.Doctor', on_delete=models.DO_NOTHING)
     patient = models.ForeignKey(Patient, on_delete=models.CASCADE)
-    created_at = secured_fields.EncryptedDateTimeField(default=timezone.now)
-    updated_at = secured_fields.EncryptedDateTimeField(default=timezone.now, editable=False)
+    created_at = encryption.EncryptedDateTimeField(default=timezone.now)
+    updated_at = encryption.EncryptedDateTimeField(default=timezone.now, editable=False)
     file_analysis = secured_fields.EncryptedFileField(upload_to='record/', blank=True, null=True)
+    # plaintext copy of created_at, the encrypted column cannot be sorted in SQL
+    timeline_key = models.DateTimeField(default=timezone.now, editable=False)
+
+    objects = encryption.EncryptedQuerySet.as_manager()
+
+    lazy_decryption = True
+
+    class Meta:
+        base_manager_name = 'objects'
+        indexes = [
+            models.Index(fields=['patient', '-timeline_key', '-id'], name='record_timeline_idx'),
+        ]
 
     def save(self, *args, **kwargs):
         """Check whether the doctor and patient are the same user"""
-        if self.doctor_autohor.user == self.patient.user:
+        if self.written_by_patient():
             raise ValueError("A doctor cannot create a record for himself/herself.")
+        if not isinstance(self.__dict__.get('created_at'), encryption.EncryptedValue):
+            self.timeline_key = self.created_at
+            if kwargs.get('update_fields') is not None and 'created_at' in kwargs['update_fields']:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'timeline_key'}
         super().save(*args, **kwargs)
+
+    def written_by_patient(self):
+        """Whether the doctor is the patient, compared by user id without loading (and decrypting) the users"""
+        descriptors = Record.doctor_autohor, Record.patient
+        if all(descriptor.is_cached(self) for descriptor in descriptors):
+            return self.doctor_autohor.user_id == self.patient.user_id
+        return Patient.objects.filter(pk=self.patient_id, user__doctor=self.doctor_autohor_id).exists()
@@ -0,0 +1,86 @@
+import base64
+import binascii
+import uuid
+from datetime import datetime
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class TimelinePagination(BasePagination):
+    """
+       Keyset pagination of records, newest first
+       The cursor is the (timeline_key, id) of the last record of the page, and the next page
+       is read from the `record_timeline_idx` index after it, so any page costs the same as the first
+       Subclasses paginate other models by another datetime `ordering_field`
+    """
+    ordering_field = 'timeline_key'
+    page_size = 50
+    max_page_size = 200
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def encode_cursor(self, record):
+        position = f'{getattr(record, self.ordering_field).isoformat()}|{record.pk}'
+        return base64.urlsafe_b64encode(position.encode()).decode()
+
+    def decode_cursor(self, cursor):
+        try:
+            timeline_key, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+            return datetime.fromisoformat(timeline_key), uuid.UUID(pk)
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def page_queryset(self, queryset, request):
+        """The records of the requested page, plus the first record of the next page if there is one"""
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        field = self.ordering_field
+        queryset = queryset.order_by(f'-{field}', '-id')
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            key, pk = self.decode_cursor(cursor)
+            # the redundant `timeline_key <= ` bounds the index range scan
+            queryset = queryset.filter(Q(**{f'{field}__lt': key}) | Q(**{field: key, 'id__lt': pk}),
+                                       **{f'{field}__lte': key})
+        return queryset[:self.page_size + 1]
+
+    def set_page(self, records):
+        self.has_next = len(records) > self.page_size
+        self.page = records[:self.page_size]
+        return self.page
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.set_page(list(self.page_queryset(queryset, request)))
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.cursor_query_param)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'results': data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
@@ -1,10 +1,24 @@
 from djoser.serializers import UserCreatePasswordRetypeSerializer
 from rest_framework import serializers
-from .models import Patient
 
+from Polyclinic.profiling import ProfiledListSerializer, ProfiledSerializerMixin
+
+from .compiled import CompiledSerializerMixin
+from .encryption import BatchDecryptListSerializer
+from .models import Patient, Record
+
+
+class ProfiledBatchDecryptListSerializer(ProfiledSerializerMixin, BatchDecryptListSerializer):
+    pass
+
+
+class CustomUserCreatePasswordRetypeSerializer(ProfiledSerializerMixin, CompiledSerializerMixin,
+                                               UserCreatePasswordRetypeSerializer):
+    # also the `user` serializer of djoser, rendering users, which have no re_password
+    re_password = serializers.CharField(style={'input_type': 'password'}, write_only=True)
 
-class CustomUserCreatePasswordRetypeSerializer(UserCreatePasswordRetypeSerializer):
     class Meta(UserCreatePasswordRetypeSerializer.Meta):
+        list_serializer_class = ProfiledListSerializer
         fields = ['id',
                   'username',
                   'email',
@@ -14,13 +28,20 @@ class CustomUserCreatePasswordRetypeSerializer(UserCreatePasswordRetypeSerialize
                   'gender',
                   'birth_date',
                   'password',
+                  're_password',
                   ]
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # UserCreatePasswordRetypeSerializer.__init__() replaces re_password with a readable field
+        self.fields['re_password'].write_only = True
+
 
 
-class PatientSerializer(serializers.ModelSerializer):
+class PatientSerializer(ProfiledSerializerMixin, CompiledSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Patient
+        list_serializer_class = ProfiledBatchDecryptListSerializer
         fields = [
             'id',
             'user',
@@ -49,3 +70,65 @@ class PatientSerializer(serializers.ModelSerializer):
             setattr(instance, attr, value)
         instance.save()
         return instance
+
+
+class RecordSerializer(ProfiledSerializerMixin, CompiledSerializerMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Record
+        list_serializer_class = ProfiledBatchDecryptListSerializer
+        fields = [
+            'id',
+            'patient',
+            'doctor_autohor',
+            'description',
+            'created_at',
+            'updated_at',
+        ]
+
+
+class RecordBulkListSerializer(serializers.ListSerializer):
+    """Validates the patients of all records in one query and inserts the records in one statement"""
+
+    def to_internal_value(self, data):
+        # errors are reported per item, like those of the child serializer
+        attrs = super().to_internal_value(data)
+        patient_ids = {item['patient_id'] for item in attrs}
+        users = dict(Patient.objects.filter(pk__in=patient_ids).values_list('pk', 'user_id'))
+        doctor = self.context['doctor']
+        errors = []
+        for item in attrs:
+            if item['patient_id'] not in users:
+                errors.append({'patient': ["Patient not found."]})
+            elif users[item['patient_id']] == doctor.user_id:
+                errors.append({'patient': ["A doctor cannot create a record for himself/herself."]})
+            else:
+                errors.append({})
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return attrs
+
+    def create(self, validated_data):
+        doctor = self.context['doctor']
+        records = [Record(doctor_autohor=doctor, **item) for item in validated_data]
+        for record in records:
+            # bulk_create() skips Record.save()
+            record.timeline_key = record.created_at
+        return Record.objects.bulk_create(records)
+
+
+class RecordBulkSerializer(serializers.ModelSerializer):
+    """A record written by the requesting doctor, see RecordBulkCreateView"""
+    patient = serializers.UUIDField(source='patient_id')
+    doctor_autohor = serializers.PrimaryKeyRelatedField(read_only=True)
+
+    class Meta:
+        model = Record
+        list_serializer_class = RecordBulkListSerializer
+        fields = [
+            'id',
+            'patient',
+            'doctor_autohor',
+            'description',
+            'created_at',
+            'updated_at',
+        ]
@@ -0,0 +1,32 @@
+import secured_fields.fernet
+from django.core.signals import setting_changed
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from . import aggregates, authentication
+from .models import CustomUser, Patient
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    authentication.invalidate([instance.key])
+
+
+@receiver(post_save, sender=CustomUser)
+def user_saved(sender, instance, update_fields=None, **kwargs):
+    authentication.user_saved(instance, update_fields)
+
+
+@receiver(pre_delete, sender=CustomUser)
+@receiver(pre_delete, sender=Patient)
+def counted_row_deleted(sender, instance, using, **kwargs):
+    # sent inside the transaction of the delete, while deferred values can still be loaded
+    aggregates.add(aggregates.removed(instance), using)
+
+
+@receiver(setting_changed)
+def encryption_keys_changed(setting, **kwargs):
+    if setting == 'SECURED_FIELDS_KEY':
+        # get_fernet() builds its client once
+        secured_fields.fernet.fernet_client = None
@@ -0,0 +1,261 @@
+"""
+Chunked encryption of stored files
+
+secured_fields encrypts a file as one Fernet token, so saving or opening it
+holds the whole file, plaintext and ciphertext, in memory. Files are stored
+here as a header followed by fixed-size chunks, each encrypted as its own
+Fernet token, and are encrypted and decrypted one chunk at a time. A chunk
+also encrypts its index and whether it is the last one, so chunks cannot be
+reordered or dropped unnoticed. Since every chunk but the last one has the
+same encrypted size, reads can seek, which serves HTTP range requests.
+
+Uploads go through `EncryptingUploadHandler`, which encrypts them the same way
+as they arrive: Django's own handlers would write the plaintext of an upload
+larger than FILE_UPLOAD_MAX_MEMORY_SIZE to a temporary file.
+
+Files written by `secured_fields.storage.EncryptedFileSystemStorage` are
+still read (whole, as before).
+"""
+import base64
+import io
+import os
+import struct
+
+from cryptography.fernet import InvalidToken
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from secured_fields.fernet import get_fernet
+from secured_fields.mixins import EncryptedStorageMixin
+
+from .encryption import primary_fernet
+
+MAGIC = b'\x00PCEF1'
+HEADER = struct.Struct('>6sI')
+CHUNK_PREFIX = struct.Struct('>Q?')
+# version, timestamp, IV and HMAC of a Fernet token
+FERNET_OVERHEAD = 1 + 8 + 16 + 32
+
+
+def chunk_size():
+    return getattr(settings, 'SECURED_FIELDS_FILE_CHUNK_SIZE', 64 * 1024)
+
+
+def encrypted_chunk_size(size):
+    """Size of a stored chunk of `size` plaintext bytes (AES-CBC pads to whole 16 byte blocks)"""
+    return FERNET_OVERHEAD + ((CHUNK_PREFIX.size + size) // 16 + 1) * 16
+
+
+def encrypt_chunk(index, last, data):
+    token = get_fernet().encrypt(CHUNK_PREFIX.pack(index, last) + data)
+    return base64.urlsafe_b64decode(token)
+
+
+def decrypt_chunk(index, chunk):
+    try:
+        data = get_fernet().decrypt(base64.urlsafe_b64encode(chunk))
+    except InvalidToken:
+        raise SuspiciousFileOperation(f'Chunk {index} of an encrypted file is corrupted.')
+    stored_index, last = CHUNK_PREFIX.unpack_from(data)
+    if stored_index != index:
+        raise SuspiciousFileOperation(f'Chunk {index} of an encrypted file is out of place.')
+    return last, data[CHUNK_PREFIX.size:]
+
+
+class ChunkEncryptor:
+    """Turns plaintext fed in pieces of any size into the stored chunks"""
+
+    def __init__(self, plain_chunk_size):
+        self.plain_chunk_size = plain_chunk_size
+        self.index = 0
+        self.buffer = b''
+
+    def header(self):
+        return HEADER.pack(MAGIC, self.plain_chunk_size)
+
+    def feed(self, data):
+        """The chunks completed by `data`; a full chunk is held back until it is known not to be the last one"""
+        self.buffer += data
+        chunks = []
+        while len(self.buffer) > self.plain_chunk_size:
+            chunks.append(encrypt_chunk(self.index, False, self.buffer[:self.plain_chunk_size]))
+            self.buffer = self.buffer[self.plain_chunk_size:]
+            self.index += 1
+        return chunks
+
+    def finish(self):
+        # an empty file still gets its (empty) last chunk
+        return encrypt_chunk(self.index, True, self.buffer)
+
+
+class EncryptingFile(File):
+    """Yields the stored form of `content` from chunks(), encrypting as it reads"""
+
+    def __init__(self, content, size):
+        super().__init__(content, getattr(content, 'name', None))
+        self.plain_chunk_size = size
+
+    def chunks(self, chunk_size=None):
+        encryptor = ChunkEncryptor(self.plain_chunk_size)
+        yield encryptor.header()
+        if hasattr(self.file, 'seek'):
+            self.file.seek(0)
+        for data in iter(lambda: self.file.read(self.plain_chunk_size), b''):
+            yield from encryptor.feed(data)
+        yield encryptor.finish()
+
+
+class EncryptedUploadedFile(TemporaryUploadedFile):
+    """An upload in a temporary file already in the stored form; `size` is that of the plaintext"""
+
+
+class EncryptingUploadHandler(TemporaryFileUploadHandler):
+    """Encrypts an upload chunk by chunk as it arrives, into an `EncryptedUploadedFile`"""
+
+    def new_file(self, *args, **kwargs):
+        # skips TemporaryFileUploadHandler.new_file(), which creates a plaintext temporary file
+        super(TemporaryFileUploadHandler, self).new_file(*args, **kwargs)
+        self.encryptor = ChunkEncryptor(chunk_size())
+        self.file = EncryptedUploadedFile(self.file_name, self.content_type, 0, self.charset,
+                                          self.content_type_extra)
+        self.file.write(self.encryptor.header())
+
+    def receive_data_chunk(self, raw_data, start):
+        for chunk in self.encryptor.feed(raw_data):
+            self.file.write(chunk)
+
+    def file_complete(self, file_size):
+        self.file.write(self.encryptor.finish())
+        return super().file_complete(file_size)
+
+
+class DecryptingFile(io.RawIOBase):
+    """Seekable plaintext view of a chunked encrypted file, decrypting one chunk at a time"""
+
+    def __init__(self, raw, plain_chunk_size):
+        self.raw = raw
+        self.plain_chunk_size = plain_chunk_size
+        self.stored_chunk_size = encrypted_chunk_size(plain_chunk_size)
+        self.raw.seek(0, io.SEEK_END)
+        stored_size = self.raw.tell() - HEADER.size
+        self.chunk_count = max(-(-stored_size // self.stored_chunk_size), 1)
+        self.position = 0
+        self._size = None
+        self._cached = (None, b'')
+
+    def _chunk(self, index):
+        if self._cached[0] != index:
+            self.raw.seek(HEADER.size + index * self.stored_chunk_size)
+            last, data = decrypt_chunk(index, self.raw.read(self.stored_chunk_size))
+            if last != (index == self.chunk_count - 1):
+                raise SuspiciousFileOperation('An encrypted file is truncated.')
+            self._cached = (index, data)
+        return self._cached[1]
+
+    @property
+    def size(self):
+        if self._size is None:
+            last = self.chunk_count - 1
+            self._size = last * self.plain_chunk_size + len(self._chunk(last))
+        return self._size
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += self.size
+        if offset < 0:
+            raise ValueError('Negative seek position')
+        self.position = offset
+        return offset
+
+    def readinto(self, buffer):
+        if self.position >= self.size:
+            return 0
+        index, offset = divmod(self.position, self.plain_chunk_size)
+        data = self._chunk(index)[offset:offset + len(buffer)]
+        buffer[:len(data)] = data
+        self.position += len(data)
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            self.raw.close()
+        super().close()
+
+
+class ChunkedEncryptedStorageMixin(EncryptedStorageMixin):
+    """Encrypts files in chunks of `SECURED_FIELDS_FILE_CHUNK_SIZE` bytes"""
+
+    def _open(self, name, mode='rb'):
+        raw = super(EncryptedStorageMixin, self)._open(name, mode)
+        magic, plain_chunk_size = HEADER.unpack(raw.read(HEADER.size).ljust(HEADER.size, b'\x00'))
+        if magic != MAGIC:
+            # whole-file Fernet token of secured_fields
+            raw.seek(0)
+            with raw:
+                return File(io.BytesIO(get_fernet().decrypt(raw.read())), name)
+        decrypted = DecryptingFile(raw, plain_chunk_size)
+        file = File(io.BufferedReader(decrypted, buffer_size=plain_chunk_size), name)
+        file.size = decrypted.size
+        return file
+
+    def _save(self, name, content):
+        if not isinstance(content, EncryptedUploadedFile):
+            content = EncryptingFile(content, chunk_size())
+        return super(EncryptedStorageMixin, self)._save(name, content)
+
+
+class ChunkedEncryptedFileSystemStorage(ChunkedEncryptedStorageMixin, FileSystemStorage):
+    pass
+
+
+def rotate_file(storage, name):
+    """
+       Re-encrypt a stored file with the first of `SECURED_FIELDS_KEY`, one chunk at a time
+       Whole-file tokens are converted to chunks. Returns whether the file was rewritten
+    """
+    path = storage.path(name)
+    with open(path, 'rb') as raw:
+        magic, plain_chunk_size = HEADER.unpack(raw.read(HEADER.size).ljust(HEADER.size, b'\x00'))
+        if magic == MAGIC:
+            stored_chunk_size = encrypted_chunk_size(plain_chunk_size)
+            first = raw.read(stored_chunk_size)
+            try:
+                primary_fernet().decrypt(base64.urlsafe_b64encode(first))
+                # a file is written with one key
+                return False
+            except InvalidToken:
+                pass
+            raw.seek(HEADER.size)
+            chunks = iter(lambda: raw.read(stored_chunk_size), b'')
+            rotated = (base64.urlsafe_b64decode(get_fernet().rotate(base64.urlsafe_b64encode(chunk)))
+                       for chunk in chunks)
+            _replace(path, [HEADER.pack(MAGIC, plain_chunk_size)], rotated)
+        else:
+            raw.seek(0)
+            plaintext = io.BytesIO(get_fernet().decrypt(raw.read()))
+            _replace(path, EncryptingFile(plaintext, chunk_size()).chunks())
+    return True
+
+
+def _replace(path, *parts):
+    # readers keep the file they opened, new ones get the rewritten file
+    temporary = f'{path}.rotating'
+    with open(temporary, 'wb') as file:
+        for part in parts:
+            for data in part:
+                file.write(data)
+    os.replace(temporary, path)
@@ -0,0 +1,121 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from Patient import aggregates
+from Patient.encryption import track_decryptions
+from Patient.models import CategoryCounter, CustomUser, Patient
+
+
+def create_patient(number, blood_type='O+', city='City', gender='Male'):
+    user = CustomUser.objects.create(username=f'user{number}', first_name='John', last_name='Doe',
+                                     phone_number=f'{number:010d}', email=f'user{number}@example.com',
+                                     gender=gender, birth_date='1990-01-01')
+    return Patient.objects.create(user=user, region='Region', neighborhood='Neighborhood', city=city,
+                                  allergy='None', blood_type=blood_type, medical_insurance_number=f'INS{number}')
+
+
+class CategoryCounterTest(TestCase):
+
+    def test_created_rows_are_counted(self):
+        create_patient(1)
+        create_patient(2, blood_type='A+', city='Town', gender='Woman')
+        create_patient(3, blood_type='A+')
+        self.assertEqual(aggregates.distribution('blood_type'), {'A+': 2, 'O+': 1})
+        self.assertEqual(aggregates.distribution('city'), {'City': 2, 'Town': 1})
+        self.assertEqual(aggregates.distribution('gender'), {'Male': 2, 'Woman': 1})
+
+    def test_changed_category_moves_the_count(self):
+        patient = create_patient(1)
+        patient = Patient.objects.get(pk=patient.pk)
+        patient.blood_type = 'B-'
+        with track_decryptions() as stats:
+            patient.save()
+        # only the stored blood type, to decrement its counter
+        self.assertEqual(stats.count, 1)
+        self.assertEqual(aggregates.distribution('blood_type'), {'B-': 1})
+        self.assertEqual(aggregates.distribution('city'), {'City': 1})
+
+    def test_untouched_counted_fields_cost_nothing(self):
+        patient = Patient.objects.get(pk=create_patient(1).pk)
+        patient.allergy = 'Pollen'
+        # the update only
+        with self.assertNumQueries(1):
+            patient.save()
+
+    def test_same_category_is_not_counted_again(self):
+        patient = Patient.objects.get(pk=create_patient(1).pk)
+        patient.blood_type = 'O+'
+        patient.save()
+        self.assertEqual(aggregates.distribution('blood_type'), {'O+': 1})
+
+    def test_fields_outside_update_fields_are_unchanged(self):
+        patient = create_patient(1)
+        patient.blood_type = 'AB+'
+        patient.save(update_fields=['allergy'])
+        self.assertEqual(aggregates.distribution('blood_type'), {'O+': 1})
+
+    def test_deleted_rows_are_uncounted(self):
+        first, second = create_patient(1), create_patient(2, blood_type='A+')
+        first.delete()
+        self.assertEqual(aggregates.distribution('blood_type'), {'A+': 1})
+        self.assertEqual(aggregates.distribution('gender'), {'Male': 2})
+        # the patient profile goes with the user
+        CustomUser.objects.filter(pk=second.user_id).delete()
+        self.assertEqual(aggregates.distribution('blood_type'), {})
+        self.assertEqual(aggregates.distribution('gender'), {'Male': 1})
+
+    @override_settings(AGGREGATE_SHARDS=4)
+    def test_counts_are_spread_over_shards(self):
+        for number in range(20):
+            create_patient(number)
+        self.assertEqual(aggregates.distribution('blood_type'), {'O+': 20})
+        shards = CategoryCounter.objects.filter(dimension='blood_type').values_list('shard', flat=True)
+        self.assertLessEqual(set(shards), {0, 1, 2, 3})
+        self.assertGreater(len(shards), 1)
+
+
+class RebuildAggregatesTest(TestCase):
+
+    def test_counters_are_corrected(self):
+        create_patient(1)
+        create_patient(2, blood_type='A+')
+        # written behind the counters' back
+        Patient.objects.filter(user__username='user2').update(blood_type='B+')
+        CategoryCounter.objects.create(dimension='city', category='Nowhere', count=3)
+        stdout = StringIO()
+        call_command('rebuild_aggregates', workers=0, batch_size=1, stdout=stdout)
+        self.assertEqual(aggregates.distribution('blood_type'), {'B+': 1, 'O+': 1})
+        self.assertEqual(aggregates.distribution('city'), {'City': 2})
+        self.assertEqual(aggregates.distribution('gender'), {'Male': 2})
+        self.assertIn('Patient.Patient: 2 row(s) counted, 3 counter(s) corrected', stdout.getvalue())
+
+        call_command('rebuild_aggregates', workers=0, stdout=stdout)
+        self.assertIn('Patient.Patient: 2 row(s) counted, 0 counter(s) corrected', stdout.getvalue())
+
+
+class CategoryCountViewTest(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.staff = CustomUser.objects.create(username='staff', phone_number='9999999999', email='staff@example.com',
+                                               gender='Other', birth_date='1980-01-01', is_staff=True)
+        create_patient(1)
+        create_patient(2, blood_type='A-')
+
+    def test_distribution(self):
+        self.client.force_authenticate(self.staff)
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/v1/patient/statistics/blood_type/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'dimension': 'blood_type', 'total': 2, 'counts': {'A-': 1, 'O+': 1}})
+
+    def test_unknown_statistic(self):
+        self.client.force_authenticate(self.staff)
+        self.assertEqual(self.client.get('/api/v1/patient/statistics/allergy/').status_code, 404)
+
+    def test_staff_only(self):
+        self.client.force_authenticate(CustomUser.objects.get(username='user1'))
+        self.assertEqual(self.client.get('/api/v1/patient/statistics/blood_type/').status_code, 403)
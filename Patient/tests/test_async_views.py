@@ -0,0 +1,88 @@
+import json
+from datetime import datetime, time, timedelta, timezone
+
+from django.core.cache import cache
+from django.test import AsyncClient, TestCase
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from Doctor.availability import availability_index
+from Doctor.models import Doctor, OpeningHours
+from Patient.authentication import get_token_cache
+from Patient.models import CustomUser, Patient, Record
+
+
+class AsyncViewsTest(TestCase):
+
+    def setUp(self):
+        """A patient with three records and a doctor"""
+        cache.clear()
+        get_token_cache().clear()
+        availability_index.reset()
+        users = [
+            CustomUser.objects.create(username=f"user{number}", first_name="John", last_name="Doe",
+                                      phone_number=f"123456789{number}", email=f"user{number}@example.com",
+                                      gender="Male", birth_date="1990-01-01", is_active=True)
+            for number in range(3)
+        ]
+        self.doctor = Doctor.objects.create(user=users[0], specialty="Cardiology", phone_general="1", cabinet="1")
+        OpeningHours.objects.create(weekday=1, open_hour=time(9, 0), close_hour=time(10, 0), doctor=self.doctor)
+        self.patient = Patient.objects.create(user=users[1], region="Region", neighborhood="Neighborhood",
+                                              city="City", allergy="None", blood_type="O+")
+        start = datetime(2030, 1, 7, 8, tzinfo=timezone.utc)
+        for days in range(3):
+            Record.objects.create(description=f"Visit {days}", doctor_autohor=self.doctor, patient=self.patient,
+                                  created_at=start + timedelta(days=days))
+        self.token = Token.objects.create(user=self.patient.user).key
+        self.other_token = Token.objects.create(user=users[2]).key
+        self.async_client = AsyncClient()
+        self.sync_client = APIClient(headers={'Authorization': f'Token {self.token}'})
+
+    async def get(self, path, **params):
+        return await self.async_client.get(f'/api/v1/async/{path}', params, headers=self.headers(self.token))
+
+    def headers(self, token):
+        return {'Authorization': f'Token {token}'}
+
+    async def test_profile_matches_sync_view(self):
+        response = await self.get('patient/me/')
+        self.assertEqual(response.status_code, 200)
+        sync = await self.sync_get('/api/v1/patient/me/')
+        self.assertEqual(json.loads(response.content), sync)
+
+    async def test_timeline_matches_sync_view(self):
+        path = f'patient/{self.patient.pk}/records/'
+        response = await self.get(path, page_size=2)
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.content)
+        sync = await self.sync_get(f'/api/v1/patient/{self.patient.pk}/records/?page_size=2')
+        self.assertEqual(data['results'], sync['results'])
+        self.assertIn('/api/v1/async/', data['next'])
+        response = await self.async_client.get(data['next'], headers=self.headers(self.token))
+        self.assertEqual([record['description'] for record in json.loads(response.content)['results']],
+                         ["Visit 0"])
+
+    async def test_availability(self):
+        response = await self.async_client.get('/api/v1/async/doctor/availability/', {
+            'from': '2030-01-07T09:00:00Z', 'to': '2030-01-07T10:00:00Z'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(json.loads(response.content)['results']), 2)
+
+    async def test_errors(self):
+        self.assertEqual((await AsyncClient().get('/api/v1/async/patient/me/')).status_code, 401)
+        client = AsyncClient()
+        response = await client.get('/api/v1/async/patient/me/', headers=self.headers('invalid'))
+        self.assertEqual(response.status_code, 401)
+        response = await client.get('/api/v1/async/patient/me/', headers=self.headers(self.other_token))
+        self.assertEqual(response.status_code, 404)
+        response = await client.get(f'/api/v1/async/patient/{self.patient.pk}/records/',
+                                    headers=self.headers(self.other_token))
+        self.assertEqual(response.status_code, 403)
+        response = await self.get('doctor/availability/', to='not a date')
+        self.assertEqual(response.status_code, 400)
+
+    async def sync_get(self, url):
+        from asgiref.sync import sync_to_async
+
+        response = await sync_to_async(self.sync_client.get)(url)
+        return json.loads(json.dumps(response.data, default=str))
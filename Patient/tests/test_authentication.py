@@ -0,0 +1,64 @@
+from django.test import TestCase
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+
+from Patient.authentication import CachedTokenAuthentication, cache_key, get_token_cache
+from Patient.models import CustomUser, Patient
+
+
+class CachedTokenAuthenticationTest(TestCase):
+
+    def setUp(self):
+        """A user with a token and an empty token cache"""
+        get_token_cache().clear()
+        self.user = CustomUser.objects.create(username="john", first_name="John", last_name="Doe",
+                                              phone_number="1234567890", email="john@example.com",
+                                              gender="Male", birth_date="1990-01-01", is_active=True)
+        self.token = Token.objects.create(user=self.user)
+        self.authentication = CachedTokenAuthentication()
+
+    def authenticate(self):
+        return self.authentication.authenticate_credentials(self.token.key)
+
+    def test_cache_hit_runs_no_query(self):
+        self.authenticate()
+        with self.assertNumQueries(0):
+            user, token = self.authenticate()
+        self.assertEqual(user.pk, self.user.pk)
+        self.assertEqual(user.username, "john")
+        self.assertEqual(token.key, self.token.key)
+
+    def test_encrypted_columns_are_loaded_on_access(self):
+        self.authenticate()
+        user, _ = self.authenticate()
+        self.assertNotIn('last_name', user.__dict__)
+        self.assertEqual(user.last_name, "Doe")
+
+    def test_token_delete_invalidates(self):
+        self.authenticate()
+        key = self.token.key
+        self.token.delete()
+        with self.assertRaises(AuthenticationFailed):
+            self.authentication.authenticate_credentials(key)
+
+    def test_user_save_invalidates(self):
+        self.authenticate()
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    def test_unrelated_update_keeps_snapshot(self):
+        self.authenticate()
+        self.user.first_name = "Johnny"
+        self.user.save(update_fields=['first_name'])
+        self.assertIsNotNone(get_token_cache().get(cache_key(self.token.key)))
+
+    def test_api_request(self):
+        Patient.objects.create(user=self.user, region="Region", neighborhood="Neighborhood", city="City",
+                               allergy="None", blood_type="O+")
+        for _ in range(2):
+            response = self.client.get('/api/v1/appointment/', HTTP_AUTHORIZATION=f'Token {self.token.key}')
+            self.assertEqual(response.status_code, 200)
+        response = self.client.get('/api/v1/appointment/', HTTP_AUTHORIZATION='Token invalid')
+        self.assertEqual(response.status_code, 401)
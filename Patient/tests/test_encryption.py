@@ -0,0 +1,130 @@
+from datetime import date
+
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from Doctor.models import Doctor
+from Patient.encryption import EncryptedValue, decrypt_batch, decrypt_tokens, track_decryptions
+from Patient.models import CustomUser, Patient, Record
+from Patient.serializers import PatientSerializer
+
+
+class BatchDecryptionTest(TestCase):
+
+    def setUp(self):
+        """Three patients"""
+        for number in range(3):
+            user = CustomUser.objects.create(
+                username=f"patient{number}",
+                first_name="John",
+                last_name=f"Doe{number}",
+                phone_number=f"123456789{number}",
+                email=f"patient{number}@example.com",
+                gender="Male",
+                birth_date="1990-01-01",
+            )
+            Patient.objects.create(user=user, region="Region", neighborhood="Neighborhood", city=f"City{number}",
+                                   allergy="None", blood_type="O+", medical_insurance_number=f"INS{number}")
+
+    def test_deferred_values_stay_encrypted(self):
+        patient = Patient.objects.defer_decryption().first()
+        self.assertIsInstance(patient.__dict__['city'], EncryptedValue)
+        self.assertIsInstance(patient.__dict__['medical_insurance_number'], EncryptedValue)
+
+    def test_attribute_access_decrypts(self):
+        patient = Patient.objects.defer_decryption().get(medical_insurance_number="INS1")
+        self.assertEqual(patient.city, "City1")
+        self.assertEqual(patient.__dict__['city'], "City1")
+
+    def test_values_list_is_never_deferred(self):
+        cities = Patient.objects.defer_decryption().values_list('city', flat=True)
+        self.assertEqual(sorted(cities), ["City0", "City1", "City2"])
+
+    def test_decrypt_batch_only_given_fields(self):
+        patients = list(Patient.objects.defer_decryption())
+        decrypt_batch(patients, ['city', 'medical_insurance_number'])
+        self.assertEqual(sorted(patient.__dict__['city'] for patient in patients), ["City0", "City1", "City2"])
+        self.assertTrue(all(isinstance(patient.__dict__['region'], EncryptedValue) for patient in patients))
+
+    def test_decrypt_batch_related_fields(self):
+        patients = list(Patient.objects.select_related('user').defer_decryption())
+        decrypt_batch(patients, ['user__last_name', 'user__birth_date'])
+        users = [patient.user for patient in patients]
+        self.assertEqual(sorted(user.__dict__['last_name'] for user in users), ["Doe0", "Doe1", "Doe2"])
+        self.assertEqual(users[0].__dict__['birth_date'], date(1990, 1, 1))
+        self.assertIsInstance(users[0].__dict__['email'], EncryptedValue)
+
+    def test_thread_pool_keeps_order(self):
+        patients = list(Patient.objects.defer_decryption().order_by('id'))
+        tokens = [patient.__dict__['city'].raw for patient in patients] * 4
+        expected = [patient.city for patient in patients] * 4
+        self.assertEqual(decrypt_tokens(tokens, workers=4), expected)
+
+    def test_list_serializer_matches_plain_decryption(self):
+        queryset = Patient.objects.order_by('id')
+        batched = PatientSerializer(queryset, many=True).data
+        plain = [PatientSerializer(patient).data for patient in queryset]
+        self.assertEqual(batched, plain)
+
+
+class LazyDecryptionTest(TestCase):
+
+    def setUp(self):
+        """A patient with a record written by a doctor"""
+        users = [
+            CustomUser.objects.create(username=f"user{number}", first_name="John", last_name="Doe",
+                                      phone_number=f"123456789{number}", email=f"user{number}@example.com",
+                                      gender="Male", birth_date="1990-01-01")
+            for number in range(2)
+        ]
+        self.doctor = Doctor.objects.create(user=users[0], specialty="Cardiology", phone_general="1", cabinet="1")
+        self.patient = Patient.objects.create(user=users[1], region="Region", neighborhood="Neighborhood",
+                                              city="City", allergy="None", blood_type="O+")
+        self.record = Record.objects.create(description="Healthy", doctor_autohor=self.doctor, patient=self.patient)
+
+    def test_nothing_is_decrypted_on_load(self):
+        with track_decryptions() as stats:
+            record = Record.objects.get(pk=self.record.pk)
+            self.assertEqual(record.patient_id, self.patient.pk)
+            self.assertEqual(record.patient.user.username, "user1")
+        self.assertEqual(stats.count, 0)
+
+    def test_only_accessed_columns_are_decrypted(self):
+        with track_decryptions() as stats:
+            patient = Patient.objects.get(pk=self.patient.pk)
+            self.assertEqual(patient.blood_type, "O+")
+            self.assertEqual(patient.blood_type, "O+")
+        self.assertEqual(stats.count, 1)
+
+    def test_untouched_columns_keep_their_ciphertext(self):
+        """Saving does not decrypt and re-encrypt columns that were never accessed"""
+        before = Patient.objects.get(pk=self.patient.pk).__dict__['city'].raw
+        patient = Patient.objects.get(pk=self.patient.pk)
+        # not a counted field, whose stored value would be decrypted to update its counter
+        patient.allergy = "Pollen"
+        with track_decryptions() as stats:
+            patient.save()
+        self.assertEqual(stats.count, 0)
+        patient = Patient.objects.get(pk=self.patient.pk)
+        self.assertEqual(patient.__dict__['city'].raw, before)
+        self.assertEqual(patient.allergy, "Pollen")
+
+    def test_iterator_is_lazy(self):
+        with track_decryptions() as stats:
+            patients = list(Patient.objects.iterator(chunk_size=1))
+            self.assertIsInstance(patients[0].__dict__['city'], EncryptedValue)
+        self.assertEqual(stats.count, 0)
+
+    @override_settings(DECRYPTION_COUNT_HEADER=True)
+    def test_decryption_count_header(self):
+        client = APIClient()
+        client.force_authenticate(CustomUser.objects.create(
+            username="staff", first_name="Staff", last_name="Member", phone_number="5555555555",
+            email="staff@example.com", gender="Other", birth_date="1980-01-01", is_staff=True))
+        response = client.get('/api/v1/patient/search/', {'phone_number': '1234567891'})
+        self.assertEqual(len(response.data['results']), 1)
+        # the five non-null encrypted columns rendered by PatientSerializer
+        self.assertEqual(response['X-Decryption-Count'], '5')
+        with override_settings(DECRYPTION_COUNT_HEADER=False):
+            response = client.get('/api/v1/patient/search/', {'phone_number': '1234567891'})
+        self.assertFalse(response.has_header('X-Decryption-Count'))
@@ -0,0 +1,131 @@
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files import uploadhandler
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from secured_fields.fernet import get_fernet
+
+from Doctor.models import Doctor
+from Patient.models import CustomUser, Patient, Record
+from Patient.storage import ChunkedEncryptedFileSystemStorage
+
+CONTENT = bytes(range(256)) * 40
+
+
+@override_settings(SECURED_FIELDS_FILE_CHUNK_SIZE=1000)
+class ChunkedStorageTest(TestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        self.storage = ChunkedEncryptedFileSystemStorage(location=self.media_root)
+
+    def test_round_trip(self):
+        for content in [b'', b'x', CONTENT[:1000], CONTENT]:
+            name = self.storage.save('file.bin', ContentFile(content))
+            with self.storage.open(name) as file:
+                self.assertEqual(file.size, len(content))
+                self.assertEqual(file.read(), content)
+
+    def test_stored_encrypted(self):
+        name = self.storage.save('file.bin', ContentFile(CONTENT))
+        with open(self.storage.path(name), 'rb') as file:
+            self.assertNotIn(CONTENT[:100], file.read())
+
+    def test_seek(self):
+        name = self.storage.save('file.bin', ContentFile(CONTENT))
+        with self.storage.open(name) as file:
+            file.seek(2990)
+            self.assertEqual(file.read(20), CONTENT[2990:3010])
+
+    def test_truncation_is_detected(self):
+        name = self.storage.save('file.bin', ContentFile(CONTENT))
+        path = self.storage.path(name)
+        with open(path, 'r+b') as file:
+            file.truncate(os.path.getsize(path) - 1100)
+        with self.assertRaises(SuspiciousFileOperation), self.storage.open(name) as file:
+            file.read()
+
+    def test_reads_whole_file_tokens(self):
+        """Files encrypted by secured_fields before are still readable"""
+        with open(os.path.join(self.media_root, 'old.bin'), 'wb') as file:
+            file.write(get_fernet().encrypt(CONTENT))
+        with self.storage.open('old.bin') as file:
+            self.assertEqual(file.read(), CONTENT)
+
+
+@override_settings(SECURED_FIELDS_FILE_CHUNK_SIZE=1000)
+class RecordFileTest(TestCase):
+
+    def setUp(self):
+        """A record of a patient written by a doctor"""
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+        users = [
+            CustomUser.objects.create(username=f"user{number}", first_name="John", last_name="Doe",
+                                      phone_number=f"123456789{number}", email=f"user{number}@example.com",
+                                      gender="Male", birth_date="1990-01-01")
+            for number in range(2)
+        ]
+        self.doctor = Doctor.objects.create(user=users[0], specialty="Cardiology", phone_general="1", cabinet="1")
+        self.patient = Patient.objects.create(user=users[1], region="Region", neighborhood="Neighborhood",
+                                              city="City", allergy="None", blood_type="O+")
+        self.record = Record.objects.create(description="Healthy", doctor_autohor=self.doctor, patient=self.patient)
+        self.url = f'/api/v1/patient/{self.patient.pk}/records/{self.record.pk}/file/'
+        self.client = APIClient()
+
+    def upload(self):
+        self.client.force_authenticate(self.doctor.user)
+        return self.client.put(self.url, CONTENT, content_type='application/octet-stream',
+                               HTTP_CONTENT_DISPOSITION='attachment; filename="analysis.bin"')
+
+    def test_upload_and_download(self):
+        self.assertEqual(self.upload().status_code, 200)
+        self.client.force_authenticate(self.patient.user)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Length'], str(len(CONTENT)))
+        self.assertEqual(b''.join(response.streaming_content), CONTENT)
+
+    @override_settings(FILE_UPLOAD_MAX_MEMORY_SIZE=1000)
+    def test_large_upload_never_written_in_plaintext(self):
+        with mock.patch('django.core.files.uploadhandler.TemporaryUploadedFile',
+                        wraps=uploadhandler.TemporaryUploadedFile) as plaintext_file, \
+                mock.patch('django.core.files.uploadhandler.InMemoryUploadedFile',
+                           wraps=uploadhandler.InMemoryUploadedFile) as in_memory_file:
+            response = self.upload()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['size'], len(CONTENT))
+        plaintext_file.assert_not_called()
+        in_memory_file.assert_not_called()
+        self.record.refresh_from_db()
+        with open(self.record.file_analysis.path, 'rb') as file:
+            self.assertNotIn(CONTENT[:100], file.read())
+        with self.record.file_analysis.open() as file:
+            self.assertEqual(file.read(), CONTENT)
+
+    def test_range(self):
+        self.upload()
+        for header, start, end in [('bytes=990-2009', 990, 2009), ('bytes=10200-', 10200, 10239),
+                                   ('bytes=-5', 10235, 10239)]:
+            response = self.client.get(self.url, HTTP_RANGE=header)
+            self.assertEqual(response.status_code, 206)
+            self.assertEqual(response['Content-Range'], f'bytes {start}-{end}/{len(CONTENT)}')
+            self.assertEqual(b''.join(response.streaming_content), CONTENT[start:end + 1])
+
+    def test_unsatisfiable_range(self):
+        self.upload()
+        response = self.client.get(self.url, HTTP_RANGE='bytes=20000-')
+        self.assertEqual(response.status_code, 416)
+
+    def test_patient_cannot_upload(self):
+        self.client.force_authenticate(self.patient.user)
+        response = self.client.put(self.url, CONTENT, content_type='application/octet-stream',
+                                   HTTP_CONTENT_DISPOSITION='attachment; filename="analysis.bin"')
+        self.assertEqual(response.status_code, 403)
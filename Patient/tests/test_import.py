@@ -0,0 +1,100 @@
+import csv
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.test import TestCase
+
+from Patient import aggregates, blind_index
+from Patient.models import CustomUser, LastNameBlindIndex, Patient
+
+ROW = {
+    'username': 'patient', 'email': 'patient@example.com', 'first_name': 'John', 'last_name': 'Doe',
+    'phone_number': '1234567890', 'gender': 'Male', 'birth_date': '1990-01-01', 'password': '',
+    'is_active': 'true', 'region': 'Region', 'neighborhood': 'Neighborhood', 'city': 'City', 'street': '',
+    'house': '', 'apartment': '', 'allergy': 'None', 'blood_type': 'O+', 'medical_insurance_number': 'INS',
+}
+
+
+class ImportPatientsTest(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def rows(self, count):
+        return [{**ROW, 'username': f'patient{number}', 'email': f'patient{number}@example.com',
+                 'phone_number': f'{number:010d}', 'medical_insurance_number': f'INS{number}'}
+                for number in range(count)]
+
+    def write_csv(self, rows):
+        path = os.path.join(self.directory, 'patients.csv')
+        with open(path, 'w', newline='') as file:
+            writer = csv.DictWriter(file, fieldnames=list(ROW))
+            writer.writeheader()
+            writer.writerows(rows)
+        return path
+
+    def run_import(self, path, **options):
+        stdout, stderr = StringIO(), StringIO()
+        call_command('import_patients', path, stdout=stdout, stderr=stderr, **{'workers': 0, **options})
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_csv(self):
+        self.run_import(self.write_csv(self.rows(5)), batch_size=2)
+        self.assertEqual(Patient.objects.count(), 5)
+        patient = Patient.objects.select_related('user').get(user__username='patient3')
+        self.assertEqual(patient.user.last_name, 'Doe')
+        self.assertEqual(patient.city, 'City')
+        self.assertIsNone(patient.street)
+        self.assertTrue(patient.user.is_active)
+        self.assertFalse(patient.user.has_usable_password())
+        self.assertEqual(patient.user.phone_number_hash, blind_index.exact('0000000003'))
+        self.assertEqual(patient.medical_insurance_number_hash, blind_index.exact('INS3'))
+        self.assertTrue(LastNameBlindIndex.objects.filter(user=patient.user,
+                                                          digest=blind_index.prefix_lookup('do')).exists())
+        self.assertEqual(aggregates.distribution('blood_type'), {'O+': 5})
+        self.assertEqual(aggregates.distribution('gender'), {'Male': 5})
+
+    def test_ndjson_with_passwords(self):
+        """Plain passwords are hashed, hashed ones are kept"""
+        rows = self.rows(2)
+        rows[0]['password'] = 'secret-password'
+        rows[1]['password'] = make_password('other-password')
+        path = os.path.join(self.directory, 'patients.ndjson')
+        with open(path, 'w') as file:
+            file.writelines(json.dumps(row) + '\n' for row in rows)
+        self.run_import(path)
+        self.assertTrue(CustomUser.objects.get(username='patient0').check_password('secret-password'))
+        self.assertTrue(CustomUser.objects.get(username='patient1').check_password('other-password'))
+
+    def test_invalid_rows_are_reported(self):
+        rows = self.rows(3)
+        rows[1]['blood_type'] = 'X'
+        rows[2]['first_name'] = ''
+        _, errors = self.run_import(self.write_csv(rows))
+        self.assertEqual(Patient.objects.count(), 1)
+        self.assertIn('Row 2:', errors)
+        self.assertIn('Row 3:', errors)
+
+    def test_resume(self):
+        """Rows before the checkpoint are skipped, rows imported without a checkpoint are not duplicated"""
+        path = self.write_csv(self.rows(4))
+        with open(f'{path}.checkpoint', 'w') as file:
+            json.dump({'path': os.path.abspath(path), 'rows': 2}, file)
+        self.run_import(path)
+        self.assertEqual(set(CustomUser.objects.values_list('username', flat=True)), {'patient2', 'patient3'})
+        self.assertFalse(os.path.exists(f'{path}.checkpoint'))
+
+        _, errors = self.run_import(path, batch_size=3)
+        self.assertEqual(Patient.objects.count(), 4)
+        self.assertEqual(errors.count('skipped'), 2)
+
+    def test_process_pool(self):
+        self.run_import(self.write_csv(self.rows(4)), workers=2, batch_size=1)
+        self.assertEqual(Patient.objects.count(), 4)
+        self.assertEqual(Patient.objects.get(user__username='patient2').medical_insurance_number, 'INS2')
@@ -0,0 +1,49 @@
+from unittest import mock
+
+from django.contrib.auth.hashers import make_password
+from django.test import TestCase
+
+from Patient.models import CustomUser
+
+
+class PasswordTrackingTest(TestCase):
+
+    def setUp(self):
+        self.user = CustomUser.objects.create(username="john", first_name="John", last_name="Doe",
+                                              phone_number="1234567890", email="john@example.com",
+                                              gender="Male", birth_date="1990-01-01", password="secret-password")
+
+    def test_plain_password_is_hashed(self):
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$'))
+        self.assertTrue(CustomUser.objects.get(pk=self.user.pk).check_password("secret-password"))
+
+    def test_profile_update_does_not_hash(self):
+        user = CustomUser.objects.get(pk=self.user.pk)
+        user.first_name = "Johnny"
+        with mock.patch('Patient.models.make_password') as hash_password:
+            user.save()
+        hash_password.assert_not_called()
+
+    def test_other_algorithms_are_kept(self):
+        """Hashes of any configured hasher are not hashed again"""
+        scrypt = make_password("secret-password", hasher='scrypt')
+        CustomUser.objects.filter(pk=self.user.pk).update(password=scrypt)
+        user = CustomUser.objects.get(pk=self.user.pk)
+        user.first_name = "Johnny"
+        user.save()
+        user.password = make_password("other-password", hasher='pbkdf2_sha1')
+        user.save()
+        self.assertTrue(CustomUser.objects.get(pk=self.user.pk).password.startswith('pbkdf2_sha1$'))
+
+    def test_changed_password_is_hashed(self):
+        user = CustomUser.objects.get(pk=self.user.pk)
+        user.password = "new-password"
+        user.save(update_fields=['password'])
+        self.assertTrue(CustomUser.objects.get(pk=self.user.pk).check_password("new-password"))
+
+    def test_deferred_password_is_not_loaded(self):
+        user = CustomUser.objects.only('id', 'first_name', 'last_name_hash').get(pk=self.user.pk)
+        user.first_name = "Johnny"
+        with self.assertNumQueries(1):
+            user.save(update_fields=['first_name'])
+        self.assertNotIn('password', user.__dict__)
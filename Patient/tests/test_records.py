@@ -0,0 +1,104 @@
+import uuid
+from datetime import datetime, timezone
+
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from Doctor.models import Doctor
+from Patient.encryption import track_decryptions
+from Patient.models import CustomUser, Patient, Record
+
+
+def create_user(number, **extra):
+    return CustomUser.objects.create(username=f"user{number}", first_name="John", last_name="Doe",
+                                     phone_number=f"123456789{number}", email=f"user{number}@example.com",
+                                     gender="Male", birth_date="1990-01-01", **extra)
+
+
+def create_patient(user):
+    return Patient.objects.create(user=user, region="Region", neighborhood="Neighborhood", city="City",
+                                  allergy="None", blood_type="O+")
+
+
+class RecordSaveTest(TestCase):
+
+    def setUp(self):
+        """A doctor who is also a patient, and another patient"""
+        users = [create_user(number) for number in range(2)]
+        self.doctor = Doctor.objects.create(user=users[0], specialty="Cardiology", phone_general="1", cabinet="1")
+        self.doctor_as_patient = create_patient(users[0])
+        self.patient = create_patient(users[1])
+
+    def test_loaded_doctor_and_patient_need_no_query(self):
+        with self.assertNumQueries(1), track_decryptions() as stats:
+            Record.objects.create(description="Healthy", doctor_autohor=self.doctor, patient=self.patient)
+        self.assertEqual(stats.count, 0)
+
+    def test_ids_only_need_one_query(self):
+        with self.assertNumQueries(2), track_decryptions() as stats:
+            Record.objects.create(description="Healthy", doctor_autohor_id=self.doctor.pk,
+                                  patient_id=self.patient.pk)
+        self.assertEqual(stats.count, 0)
+
+    def test_doctor_cannot_write_own_record(self):
+        with self.assertRaises(ValueError):
+            Record.objects.create(description="Healthy", doctor_autohor=self.doctor, patient=self.doctor_as_patient)
+        with self.assertRaises(ValueError):
+            Record.objects.create(description="Healthy", doctor_autohor_id=self.doctor.pk,
+                                  patient_id=self.doctor_as_patient.pk)
+
+
+class RecordBulkCreateTest(TestCase):
+
+    def setUp(self):
+        """A doctor who is also a patient, and three other patients"""
+        users = [create_user(number, is_active=True) for number in range(4)]
+        self.doctor = Doctor.objects.create(user=users[0], specialty="Cardiology", phone_general="1", cabinet="1")
+        self.doctor_as_patient = create_patient(users[0])
+        self.patients = [create_patient(user) for user in users[1:]]
+        self.client = APIClient()
+        self.client.force_authenticate(CustomUser.objects.get(pk=users[0].pk))
+        self.url = '/api/v1/patient/records/bulk/'
+
+    def test_creates_all_records(self):
+        created_at = datetime(2030, 1, 7, 8, tzinfo=timezone.utc)
+        data = [{'patient': str(patient.pk), 'description': f"Visit {number}", 'created_at': created_at.isoformat()}
+                for number, patient in enumerate(self.patients)]
+        response = self.client.post(self.url, data, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data), 3)
+        self.assertEqual(response.data[0]['doctor_autohor'], self.doctor.pk)
+        records = Record.objects.filter(doctor_autohor=self.doctor).order_by('patient__user__username')
+        self.assertEqual([record.description for record in records], ["Visit 0", "Visit 1", "Visit 2"])
+        self.assertEqual({record.timeline_key for record in records}, {created_at})
+
+    def test_validates_patients_in_one_query(self):
+        data = [{'patient': str(patient.pk), 'description': "Visit"} for patient in self.patients * 10]
+        # the doctor, the patients, and the insert of all records
+        with self.assertNumQueries(3):
+            response = self.client.post(self.url, data, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Record.objects.count(), 30)
+
+    def test_invalid_items_reject_the_batch(self):
+        data = [
+            {'patient': str(self.patients[0].pk), 'description': "Visit"},
+            {'patient': str(self.doctor_as_patient.pk), 'description': "Visit"},
+            {'patient': str(uuid.uuid4()), 'description': "Visit"},
+        ]
+        response = self.client.post(self.url, data, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data[0], {})
+        self.assertIn('patient', response.data[1])
+        self.assertEqual(response.data[2]['patient'], ["Patient not found."])
+        self.assertFalse(Record.objects.exists())
+
+    def test_empty_and_oversized_batches(self):
+        self.assertEqual(self.client.post(self.url, [], format='json').status_code, 400)
+        data = [{'patient': str(self.patients[0].pk), 'description': "Visit"}] * 501
+        self.assertEqual(self.client.post(self.url, data, format='json').status_code, 400)
+
+    def test_doctors_only(self):
+        self.client.force_authenticate(CustomUser.objects.get(pk=self.patients[0].user_id))
+        data = [{'patient': str(self.patients[1].pk), 'description': "Visit"}]
+        self.assertEqual(self.client.post(self.url, data, format='json').status_code, 403)
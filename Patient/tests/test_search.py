@@ -0,0 +1,122 @@
+from io import StringIO
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from Patient import blind_index
+from Patient.models import CustomUser, LastNameBlindIndex, Patient
+
+
+class BlindIndexTest(TestCase):
+
+    def test_soundex(self):
+        """Similar sounding names share a code"""
+        self.assertEqual(blind_index.soundex("Robert"), "R163")
+        self.assertEqual(blind_index.soundex("Rupert"), "R163")
+        self.assertEqual(blind_index.soundex("Ashcraft"), "A261")
+        self.assertEqual(blind_index.soundex("Lee"), "L000")
+        self.assertIsNone(blind_index.soundex("Шевченко"))
+
+    def test_exact_ignores_case_and_whitespace(self):
+        self.assertEqual(blind_index.exact(" DOE  smith"), blind_index.exact("Doe Smith"))
+        self.assertNotEqual(blind_index.exact("Doe"), blind_index.exact("Do"))
+
+    @override_settings(BLIND_INDEX_KEY='')
+    def test_missing_key(self):
+        with self.assertRaises(ImproperlyConfigured):
+            blind_index.check_key()
+
+    def test_hashes_are_set_on_save(self):
+        user = CustomUser.objects.create(username="john", first_name="John", last_name="Doe",
+                                         phone_number="1234567890", email="john@example.com",
+                                         gender="Male", birth_date="1990-01-01")
+        user.refresh_from_db()
+        self.assertEqual(user.last_name_hash, blind_index.exact("Doe"))
+        self.assertEqual(user.phone_number_hash, blind_index.exact("1234567890"))
+        self.assertEqual(LastNameBlindIndex.objects.filter(user=user, kind=blind_index.PREFIX).count(), 2)
+
+    def test_last_name_change_reindexes(self):
+        user = CustomUser.objects.create(username="john", first_name="John", last_name="Doe",
+                                         phone_number="1234567890", email="john@example.com",
+                                         gender="Male", birth_date="1990-01-01")
+        user.last_name = "Smith"
+        user.save(update_fields=['last_name'])
+        user.refresh_from_db()
+        self.assertEqual(user.last_name_hash, blind_index.exact("Smith"))
+        self.assertTrue(LastNameBlindIndex.objects.filter(
+            user=user, digest=blind_index.prefix_lookup("smi")).exists())
+        self.assertFalse(LastNameBlindIndex.objects.filter(
+            user=user, digest=blind_index.prefix_lookup("do")).exists())
+
+
+class PatientSearchTest(TestCase):
+
+    def setUp(self):
+        """Three patients and a staff member"""
+        self.patients = {
+            last_name: self.create_patient(number, last_name)
+            for number, last_name in enumerate(["Doe", "Doherty", "Smith"])
+        }
+        self.client = APIClient()
+        self.client.force_authenticate(CustomUser.objects.create(
+            username="staff", first_name="Staff", last_name="Member", phone_number="5555555555",
+            email="staff@example.com", gender="Other", birth_date="1980-01-01", is_staff=True))
+
+    def create_patient(self, number, last_name):
+        user = CustomUser.objects.create(
+            username=f"patient{number}",
+            first_name="John",
+            last_name=last_name,
+            phone_number=f"123456789{number}",
+            email=f"patient{number}@example.com",
+            gender="Male",
+            birth_date="1990-01-01",
+        )
+        return Patient.objects.create(user=user, region="Region", neighborhood="Neighborhood", city="City",
+                                      allergy="None", blood_type="O+",
+                                      medical_insurance_number=f"INS{number}")
+
+    def search(self, **params):
+        response = self.client.get('/api/v1/patient/search/', params)
+        self.assertEqual(response.status_code, 200)
+        return {result['id'] for result in response.data['results']}
+
+    def ids(self, *last_names):
+        return {str(self.patients[last_name].pk) for last_name in last_names}
+
+    def test_exact_last_name(self):
+        self.assertEqual(self.search(last_name="Doe"), self.ids("Doe"))
+
+    def test_prefix_last_name(self):
+        """The prefix search ignores case"""
+        self.assertEqual(self.search(last_name="do*"), self.ids("Doe", "Doherty"))
+        self.assertEqual(self.search(last_name="DOH*"), self.ids("Doherty"))
+
+    def test_phonetic_last_name(self):
+        self.assertEqual(self.search(sounds_like="Smyth"), self.ids("Smith"))
+
+    def test_phone_and_insurance_number(self):
+        self.assertEqual(self.search(phone_number="1234567892"), self.ids("Smith"))
+        self.assertEqual(self.search(medical_insurance_number="INS1"), self.ids("Doherty"))
+
+    def test_criteria_are_combined(self):
+        self.assertEqual(self.search(last_name="Do*", phone_number="1234567890"), self.ids("Doe"))
+
+    def test_short_prefix_is_rejected(self):
+        response = self.client.get('/api/v1/patient/search/', {'last_name': 'D*'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_search_requires_staff(self):
+        self.client.force_authenticate(self.patients["Doe"].user)
+        response = self.client.get('/api/v1/patient/search/', {'last_name': 'Doe'})
+        self.assertEqual(response.status_code, 403)
+
+    def test_rebuild_blind_index(self):
+        """Rows written without save() are found after rebuilding the index"""
+        CustomUser.objects.update(last_name_hash=None)
+        LastNameBlindIndex.objects.all().delete()
+        call_command('rebuild_blind_index', batch_size=2, stdout=StringIO())
+        self.assertEqual(self.search(last_name="Doe"), self.ids("Doe"))
+        self.assertEqual(self.search(last_name="Do*"), self.ids("Doe", "Doherty"))
@@ -0,0 +1,106 @@
+import json
+from datetime import date
+from unittest import mock
+
+from django.test import TestCase
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from Audit.models import AccessEvent
+from Doctor.models import Doctor
+from Patient.compiled import CompiledSerializer, CompiledSerializerMixin, compile_serializer
+from Patient.models import CustomUser, Patient, Record
+from Patient.serializers import CustomUserCreatePasswordRetypeSerializer, PatientSerializer, RecordSerializer
+
+
+def uncompiled(serializer_class):
+    return type(serializer_class.__name__, (serializer_class,), {'compile_representation': False})
+
+
+class CompiledSerializerTest(TestCase):
+
+    def setUp(self):
+        """Two patients, one with empty optional fields, and a record"""
+        for number, blood_type in enumerate(['AB-', '']):
+            user = CustomUser.objects.create_user(
+                username=f"patient{number}", password="password", first_name="John", last_name=f"Doe{number}",
+                phone_number=f"123456789{number}", email=f"patient{number}@example.com", gender="Female",
+                birth_date=date(1990, 1, number + 1),
+            )
+            Patient.objects.create(user=user, region="Region", city=f"City{number}", allergy="",
+                                   blood_type=blood_type, medical_insurance_number=f"INS{number}" if number else None)
+        doctor_user = CustomUser.objects.create(username="doctor", phone_number="5550000000", gender="Male",
+                                                birth_date="1980-01-01", email="doctor@example.com")
+        doctor = Doctor.objects.create(user=doctor_user, specialty="Therapist", phone_general="1", cabinet="1")
+        Record.objects.create(patient=Patient.objects.first(), doctor_autohor=doctor, description="Checkup")
+
+    def assertSameAsDRF(self, serializer_class, instances):
+        expected = uncompiled(serializer_class)(instances, many=True).data
+        self.assertEqual(serializer_class(instances, many=True).data, expected)
+        self.assertEqual([serializer_class(instance).data for instance in instances], expected)
+
+    def test_serializers_are_compiled(self):
+        for serializer_class in (PatientSerializer, RecordSerializer, CustomUserCreatePasswordRetypeSerializer):
+            self.assertIsNotNone(compile_serializer(serializer_class), serializer_class.__name__)
+
+    def test_same_output_as_drf(self):
+        self.assertSameAsDRF(PatientSerializer, list(Patient.objects.order_by('pk')))
+        self.assertSameAsDRF(RecordSerializer, list(Record.objects.all()))
+        self.assertSameAsDRF(CustomUserCreatePasswordRetypeSerializer, list(CustomUser.objects.order_by('pk')))
+
+    def test_still_encrypted_and_deferred_values(self):
+        expected = uncompiled(PatientSerializer)(Patient.objects.order_by('pk'), many=True).data
+        lazy = [PatientSerializer(patient).data for patient in Patient.objects.defer_decryption().order_by('pk')]
+        deferred = [PatientSerializer(patient).data for patient in Patient.objects.only('pk').order_by('pk')]
+        self.assertEqual(lazy, expected)
+        self.assertEqual(deferred, expected)
+
+    def test_rows(self):
+        rows = compile_serializer(PatientSerializer).rows(Patient.objects.order_by('pk'))
+        self.assertEqual(rows, uncompiled(PatientSerializer)(Patient.objects.order_by('pk'), many=True).data)
+
+    def test_export_endpoint(self):
+        client = APIClient()
+        client.force_authenticate(CustomUser.objects.create(
+            username="staff", phone_number="5550000001", gender="Male", birth_date="1980-01-01",
+            email="staff@example.com", is_staff=True, is_active=True))
+        with mock.patch('Patient.compiled.CompiledSerializer.rows', autospec=True,
+                        side_effect=CompiledSerializer.rows) as rows:
+            response = client.get('/api/v1/patient/export/')
+        self.assertEqual(response.status_code, 200)
+        rows.assert_called_once()
+        expected = uncompiled(PatientSerializer)(Patient.objects.order_by('pk'), many=True).data
+        self.assertEqual(response.json(), json.loads(JSONRenderer().render(expected)))
+        self.assertEqual(AccessEvent.objects.filter(endpoint='patient-export').count(), 2)
+
+    def test_not_compiled(self):
+        class Nested(CompiledSerializerMixin, serializers.ModelSerializer):
+            user = CustomUserCreatePasswordRetypeSerializer()
+
+            class Meta:
+                model = Patient
+                fields = ['id', 'user']
+
+        self.assertIsNone(compile_serializer(Nested))
+        patient = Patient.objects.select_related('user').get(user__username="patient0")
+        self.assertEqual(Nested(patient).data['user']['last_name'], "Doe0")
+
+    def test_users_endpoint(self):
+        client = APIClient()
+        client.force_authenticate(CustomUser.objects.create(
+            username="staff", phone_number="5550000001", gender="Male", birth_date="1980-01-01",
+            email="staff@example.com", is_staff=True, is_active=True))
+        response = client.get('/api/v1/patient/auth/users/')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('re_password', response.json()[0])
+        self.assertEqual(sorted(user['username'] for user in response.json())[:2], ["doctor", "patient0"])
+
+    def test_registration_still_checks_the_retyped_password(self):
+        serializer = CustomUserCreatePasswordRetypeSerializer(data={
+            'username': 'new', 'email': 'new@example.com', 'first_name': 'John', 'last_name': 'Doe',
+            'phone_number': '5550000002', 'gender': 'Male', 'birth_date': '1990-01-01',
+            'password': 'Secret-password-1', 're_password': 'Secret-password-2',
+        })
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('non_field_errors', serializer.errors)
@@ -0,0 +1,137 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIClient
+
+from Patient import throttling
+from Patient.models import CustomUser
+from Patient.throttling import Bucket, CacheBucketStore, LocMemBucketStore, take, throttle_metrics
+
+LOGIN_URL = '/api/v1/patient/auth/token/login/'
+LIMITS = {
+    'IP': {'BURST': 3, 'PER_MINUTE': 6},
+    'USERNAME': {'BURST': 2, 'PER_MINUTE': 6},
+    'GLOBAL': {'BURST': 100, 'PER_MINUTE': 600},
+}
+
+
+class TokenBucketTest(SimpleTestCase):
+
+    def test_burst_then_refill(self):
+        bucket = Bucket('ip', 'key', 2, 0.5)
+        states = [None]
+        for now in (0, 0):
+            states, exhausted, _ = take([bucket], states, now)
+            self.assertIsNone(exhausted)
+        self.assertEqual(take([bucket], states, 1), (None, bucket, 1.0))
+        states, exhausted, _ = take([bucket], states, 2)
+        self.assertIsNone(exhausted)
+        self.assertEqual(states, [(0, 2)])
+
+    def test_rejection_takes_no_token_from_the_other_buckets(self):
+        full, empty = Bucket('ip', 'a', 5, 1), Bucket('username', 'b', 5, 1)
+        states, exhausted, wait = take([full, empty], [(3, 10), (0.5, 10)], 10)
+        self.assertEqual((states, exhausted, wait), (None, empty, 0.5))
+        store = LocMemBucketStore()
+        store._states[empty.key] = (0.5, 10)
+        self.assertEqual(store.take([full, empty], 10), (empty, 0.5))
+        self.assertNotIn(full.key, store._states)
+
+    def test_least_recently_used_buckets_dropped(self):
+        store = LocMemBucketStore(max_size=2)
+        for key in 'abc':
+            store.take([Bucket('ip', key, 1, 1)], 0)
+        self.assertEqual(list(store._states), ['b', 'c'])
+
+
+@override_settings(AUTH_THROTTLE=LIMITS, PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class PasswordCheckThrottleTest(TestCase):
+
+    def setUp(self):
+        throttling.get_bucket_store().clear()
+        throttle_metrics.clear()
+        self.addCleanup(throttling.get_bucket_store().clear)
+        for number in range(2):
+            CustomUser.objects.create_user(username=f"user{number}", password="Secret-password-1", is_active=True,
+                                           email=f"user{number}@example.com", phone_number=f"555000000{number}",
+                                           gender="Female", birth_date="1990-01-01")
+        self.client = APIClient()
+
+    def login(self, username, address='10.0.0.1', password='wrong', **headers):
+        return self.client.post(LOGIN_URL, {'username': username, 'password': password}, format='json',
+                                REMOTE_ADDR=address, **headers)
+
+    def test_ip_bucket(self):
+        with mock.patch('djoser.serializers.authenticate', return_value=None) as authenticate:
+            statuses = [self.login(f"user{number % 2}", address='10.0.0.1').status_code for number in range(4)]
+            rejected = self.login('user0', address='10.0.0.1')
+            admitted = self.login('user1', address='10.0.0.2')
+        self.assertEqual(statuses, [400, 400, 400, 429])
+        self.assertEqual(rejected.status_code, 429)
+        self.assertIn('Retry-After', rejected)
+        self.assertEqual(admitted.status_code, 400)
+        # the rejected attempts never reached the password check
+        self.assertEqual(authenticate.call_count, 4)
+
+    def test_forged_forwarded_for_ignored(self):
+        with mock.patch('djoser.serializers.authenticate', return_value=None):
+            statuses = [self.login(f"user{number % 2}", HTTP_X_FORWARDED_FOR=f'192.0.2.{number}').status_code
+                        for number in range(5)]
+        self.assertEqual(statuses, [400, 400, 400, 429, 429])
+
+    def test_trusted_proxy(self):
+        with override_settings(AUTH_THROTTLE={**LIMITS, 'NUM_PROXIES': 1}), \
+                mock.patch('djoser.serializers.authenticate', return_value=None):
+            # the client prepends forged addresses, the proxy at 10.0.0.1 appends the real one
+            statuses = [self.login(f"user{number % 2}", HTTP_X_FORWARDED_FOR=f'192.0.2.{number}, 198.51.100.7')
+                        .status_code for number in range(4)]
+            other = self.login('user1', HTTP_X_FORWARDED_FOR='198.51.100.8')
+        self.assertEqual(statuses, [400, 400, 400, 429])
+        self.assertEqual(other.status_code, 400)
+
+    def test_username_bucket_over_several_addresses(self):
+        statuses = [self.login('USER0', address=f'10.0.1.{number}').status_code for number in range(3)]
+        self.assertEqual(statuses, [400, 400, 429])
+        self.assertEqual(self.login('user0', address='10.0.1.9').status_code, 429)
+        self.assertEqual(self.login('user1', address='10.0.1.9', password='Secret-password-1').status_code, 200)
+
+    def test_global_bucket(self):
+        limits = {**LIMITS, 'GLOBAL': {'BURST': 1, 'PER_MINUTE': 1}}
+        with override_settings(AUTH_THROTTLE=limits):
+            self.assertEqual(self.login('user0', address='10.0.2.1').status_code, 400)
+            self.assertEqual(self.login('user1', address='10.0.2.2').status_code, 429)
+
+    def test_other_endpoints_not_throttled(self):
+        self.client.force_authenticate(CustomUser.objects.get(username='user0'))
+        statuses = {self.client.get('/api/v1/patient/auth/users/me/', REMOTE_ADDR='10.0.3.1').status_code
+                    for _ in range(5)}
+        self.assertEqual(statuses, {200})
+
+    def test_disabled(self):
+        with override_settings(AUTH_THROTTLE={**LIMITS, 'ENABLED': False}):
+            statuses = {self.login('user0').status_code for _ in range(5)}
+        self.assertEqual(statuses, {400})
+
+    def test_shared_cache_store(self):
+        store = CacheBucketStore()
+        with mock.patch.object(throttling, '_bucket_store', store):
+            statuses = [self.login('user0', address=f'10.0.4.{number}').status_code for number in range(3)]
+            self.assertEqual(statuses, [400, 400, 429])
+            cache.set('unrelated', 1)
+            self.addCleanup(cache.delete, 'unrelated')
+            store.clear()
+            self.assertEqual(self.login('user0', address='10.0.4.9').status_code, 400)
+        # only the buckets were cleared
+        self.assertEqual(cache.get('unrelated'), 1)
+
+    def test_metrics(self):
+        for _ in range(3):
+            self.login('user0', address='10.0.5.1')
+        self.assertEqual(throttle_metrics.counts(), {('login', 'admitted'): 2, ('login', 'username'): 1})
+        staff = CustomUser.objects.create(username="staff", phone_number="5550000009", gender="Male",
+                                          birth_date="1980-01-01", email="staff@example.com", is_staff=True,
+                                          is_active=True)
+        self.client.force_login(staff)
+        content = self.client.get('/metrics/').content.decode()
+        self.assertIn('polyclinic_auth_throttle_requests_total{endpoint="login",result="username"} 1', content)
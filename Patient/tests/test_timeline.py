@@ -0,0 +1,84 @@
+from datetime import datetime, timedelta, timezone
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from Doctor.models import Doctor
+from Patient.models import CustomUser, Patient, Record
+
+
+class RecordTimelineTest(TestCase):
+
+    def setUp(self):
+        """A patient with five records, two of them written at the same time, and a doctor"""
+        users = [
+            CustomUser.objects.create(username=f"user{number}", first_name="John", last_name="Doe",
+                                      phone_number=f"123456789{number}", email=f"user{number}@example.com",
+                                      gender="Male", birth_date="1990-01-01")
+            for number in range(3)
+        ]
+        self.doctor = Doctor.objects.create(user=users[0], specialty="Cardiology", phone_general="1", cabinet="1")
+        self.patient = Patient.objects.create(user=users[1], region="Region", neighborhood="Neighborhood",
+                                              city="City", allergy="None", blood_type="O+")
+        self.other = users[2]
+        start = self.start = datetime(2030, 1, 7, 8, tzinfo=timezone.utc)
+        for created_at in [start, start + timedelta(days=1), start + timedelta(days=1),
+                           start + timedelta(days=2), start + timedelta(days=3)]:
+            Record.objects.create(description=f"Visit {created_at:%d}", doctor_autohor=self.doctor,
+                                  patient=self.patient, created_at=created_at)
+        self.url = f'/api/v1/patient/{self.patient.pk}/records/'
+        self.client = APIClient()
+
+    def pages(self, page_size):
+        url, pages = self.url + f'?page_size={page_size}', []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            pages.append([record['id'] for record in response.data['results']])
+            url = response.data['next']
+        return pages
+
+    def test_timeline_key_follows_created_at(self):
+        record = Record.objects.order_by('-timeline_key').first()
+        self.assertEqual(record.timeline_key, datetime(2030, 1, 10, 8, tzinfo=timezone.utc))
+        record.created_at = datetime(2031, 1, 1, tzinfo=timezone.utc)
+        record.save(update_fields=['created_at'])
+        record.refresh_from_db()
+        self.assertEqual(record.timeline_key, datetime(2031, 1, 1, tzinfo=timezone.utc))
+
+    def test_cursor_pages_are_newest_first(self):
+        """Records written at the same time are neither repeated nor skipped across pages"""
+        self.client.force_authenticate(self.patient.user)
+        pages = self.pages(2)
+        self.assertEqual([len(page) for page in pages], [2, 2, 1])
+        expected = list(Record.objects.order_by('-timeline_key', '-id').values_list('id', flat=True))
+        self.assertEqual([record_id for page in pages for record_id in page], [str(pk) for pk in expected])
+
+    def test_doctor_can_read(self):
+        self.client.force_authenticate(self.doctor.user)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'][0]['description'], "Visit 10")
+        self.assertIsNone(response.data['next'])
+
+    def test_other_patient_cannot_read(self):
+        self.client.force_authenticate(self.other)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+    def test_invalid_cursor(self):
+        self.client.force_authenticate(self.patient.user)
+        self.assertEqual(self.client.get(self.url, {'cursor': 'nonsense'}).status_code, 404)
+
+    def test_rebuild_timeline(self):
+        """Rows written before timeline_key existed get it from their created_at"""
+        Record.objects.update(timeline_key=datetime(2031, 1, 1, tzinfo=timezone.utc))
+        out = StringIO()
+        call_command('rebuild_timeline', batch_size=2, stdout=out)
+        self.assertIn("5 row(s) updated", out.getvalue())
+        self.assertEqual(sorted(Record.objects.values_list('timeline_key', flat=True)),
+                         [self.start, self.start + timedelta(days=1), self.start + timedelta(days=1),
+                          self.start + timedelta(days=2), self.start + timedelta(days=3)])
+        call_command('rebuild_timeline', stdout=out)
+        self.assertIn("0 row(s) updated", out.getvalue())
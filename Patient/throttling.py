@@ -0,0 +1,255 @@
+"""
+Throttling of the auth endpoints that check or hash a password
+
+A login (djoser's token/login/), a registration or a password change spends
+about half a second of a CPU core in the password hasher, so a credential
+stuffing burst keeps every worker busy hashing and legitimate requests time
+out. `PasswordCheckThrottle` admits a request to these endpoints only when
+each of its token buckets holds a token:
+- that of the client IP, REMOTE_ADDR or, behind AUTH_THROTTLE['NUM_PROXIES']
+  trusted proxies, the address the last of them added to X-Forwarded-For
+  (which the client can otherwise fill with any address),
+- that of the username (an HMAC of the submitted login, never the login
+  itself) or, for the password changes, of the authenticated user,
+- the global one, the password checks per minute the servers can afford.
+DRF runs throttles before the view, so a rejected attempt costs a bucket
+lookup and no hash, and is answered 429 with Retry-After. The buckets of
+all the scopes are taken together: a request rejected by one of them takes
+no token from the others.
+
+The buckets live in AUTH_THROTTLE['BACKEND']: `LocMemBucketStore` keeps
+them per worker process, so every worker admits the limits on its own;
+`CacheBucketStore` shares them through one of CACHES (e.g. Redis), at the
+price of a cache round trip, and like DRF's throttles reads and writes them
+without a lock, so concurrent attempts may slightly exceed the limits.
+Admitted and rejected requests are counted for the metrics endpoint.
+"""
+import hashlib
+import hmac
+import os
+import threading
+import time
+from collections import Counter, OrderedDict, namedtuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+from rest_framework.throttling import BaseThrottle
+
+ADMITTED = 'admitted'
+# version of the bucket keys in CacheBucketStore, incremented to clear them
+GENERATION_KEY = 'auth-throttle:generation'
+# UserViewSet actions checking or hashing a password
+USER_ACTIONS = {'create', 'destroy', 'set_password', 'set_username', 'reset_password_confirm'}
+
+_bucket_store = None
+_bucket_store_lock = threading.Lock()
+
+
+def throttle_settings():
+    cpus = os.cpu_count() or 1
+    return {
+        'ENABLED': True,
+        'BACKEND': 'Patient.throttling.LocMemBucketStore',
+        'OPTIONS': {},
+        'NUM_PROXIES': 0,
+        'IP': {'BURST': 20, 'PER_MINUTE': 10},
+        'USERNAME': {'BURST': 5, 'PER_MINUTE': 2},
+        # a PBKDF2 check takes about 0.5 s of a core
+        'GLOBAL': {'BURST': 4 * cpus, 'PER_MINUTE': 120 * cpus},
+        **getattr(settings, 'AUTH_THROTTLE', {}),
+    }
+
+
+class Bucket(namedtuple('Bucket', 'scope key burst per_second')):
+    """A token bucket holding up to `burst` tokens, refilled with `per_second` tokens per second"""
+    __slots__ = ()
+
+    @classmethod
+    def configured(cls, scope, key, limits):
+        return cls(scope, f'auth-throttle:{scope}:{key}', limits['BURST'], limits['PER_MINUTE'] / 60)
+
+    def tokens(self, state, now):
+        """Tokens left at `now` of a stored (tokens, updated) state; a missing state is a full bucket"""
+        if state is None:
+            return self.burst
+        tokens, updated = state
+        return min(self.burst, tokens + max(now - updated, 0) * self.per_second)
+
+    def refill_seconds(self):
+        """Seconds after which an untouched bucket is full again, and its state can be dropped"""
+        return self.burst / self.per_second if self.per_second else None
+
+
+def take(buckets, states, now):
+    """
+       Take a token from each bucket, given their stored states
+       Returns (new states, None, 0) or, when a bucket is empty, (None, that bucket, seconds until it has a token)
+    """
+    tokens = [bucket.tokens(state, now) for bucket, state in zip(buckets, states)]
+    for bucket, left in zip(buckets, tokens):
+        if left < 1:
+            wait = (1 - left) / bucket.per_second if bucket.per_second else None
+            return None, bucket, wait
+    return [(left - 1, now) for left in tokens], None, 0
+
+
+class LocMemBucketStore:
+    """Buckets of this process; the least recently used are dropped past `max_size` (dropped buckets are full)"""
+
+    def __init__(self, max_size=100000):
+        self.max_size = max_size
+        self._states = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, buckets, now):
+        with self._lock:
+            states, exhausted, wait = take(buckets, [self._states.get(bucket.key) for bucket in buckets], now)
+            if states is not None:
+                for bucket, state in zip(buckets, states):
+                    self._states[bucket.key] = state
+                    self._states.move_to_end(bucket.key)
+                while len(self._states) > self.max_size:
+                    self._states.popitem(last=False)
+        return exhausted, wait
+
+    def clear(self):
+        with self._lock:
+            self._states.clear()
+
+
+class CacheBucketStore:
+    """
+       Buckets kept in one of `CACHES`, e.g. Redis shared by all workers
+       Their keys are versioned with a generation kept in the cache, clear() starts a new one
+    """
+
+    def __init__(self, alias='default'):
+        self.cache = caches[alias]
+
+    def take(self, buckets, now):
+        generation = self.cache.get(GENERATION_KEY, 1)
+        stored = self.cache.get_many([bucket.key for bucket in buckets], version=generation)
+        states, exhausted, wait = take(buckets, [stored.get(bucket.key) for bucket in buckets], now)
+        if states is not None:
+            for bucket, state in zip(buckets, states):
+                timeout = bucket.refill_seconds()
+                self.cache.set(bucket.key, state, None if timeout is None else int(timeout) + 1, version=generation)
+        return exhausted, wait
+
+    def clear(self):
+        """Empty the buckets, leaving the other entries of the cache; those of the previous generation expire"""
+        try:
+            self.cache.incr(GENERATION_KEY)
+        except ValueError:
+            self.cache.add(GENERATION_KEY, 2, timeout=None)
+
+
+def get_bucket_store():
+    global _bucket_store
+
+    if _bucket_store is None:
+        with _bucket_store_lock:
+            if _bucket_store is None:
+                options = throttle_settings()
+                _bucket_store = import_string(options['BACKEND'])(**options['OPTIONS'])
+    return _bucket_store
+
+
+class ThrottleMetrics:
+    """Requests to the throttled endpoints, by endpoint and result (admitted or the scope of the empty bucket)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = Counter()
+
+    def add(self, endpoint, result):
+        with self._lock:
+            self._counts[endpoint, result] += 1
+
+    def counts(self):
+        with self._lock:
+            return dict(self._counts)
+
+    def clear(self):
+        with self._lock:
+            self._counts.clear()
+
+    def render(self, prefix='polyclinic'):
+        """The counts in the Prometheus text exposition format"""
+        name = f'{prefix}_auth_throttle_requests_total'
+        lines = [f'# HELP {name} Requests to the password checking auth endpoints, by result '
+                 f'(admitted, or rejected by the ip, username or global bucket)', f'# TYPE {name} counter']
+        lines += [f'{name}{{endpoint="{endpoint}",result="{result}"}} {count}'
+                  for (endpoint, result), count in sorted(self.counts().items())]
+        return '\n'.join(lines) + '\n'
+
+
+throttle_metrics = ThrottleMetrics()
+
+
+def password_endpoint(request, view):
+    """The name of the throttled endpoint a request goes to, None for the other requests"""
+    # imported here: throttle classes are imported with rest_framework.views, before djoser can be
+    from djoser.views import TokenCreateView, UserViewSet
+
+    if isinstance(view, TokenCreateView):
+        return 'login'
+    if isinstance(view, UserViewSet):
+        action = 'destroy' if view.action == 'me' and request.method == 'DELETE' else view.action
+        if action in USER_ACTIONS:
+            return action
+    return None
+
+
+def client_ip(request, num_proxies):
+    """The client address: REMOTE_ADDR or, behind `num_proxies` trusted proxies, the one they saw"""
+    remote_addr = request.META.get('REMOTE_ADDR', '')
+    forwarded = request.META.get('HTTP_X_FORWARDED_FOR')
+    if not num_proxies or not forwarded:
+        return remote_addr
+    addresses = [address.strip() for address in forwarded.split(',')]
+    # each proxy appends the address it got the request from: the client can only forge the ones before
+    return addresses[-min(num_proxies, len(addresses))]
+
+
+def username_key(request):
+    """The HMAC of the login the request submits or, without one, of the authenticated user; None without either"""
+    from djoser.conf import settings as djoser_settings
+
+    data = request.data
+    login = data.get(djoser_settings.LOGIN_FIELD) if hasattr(data, 'get') else None
+    if login in (None, ''):
+        login = data.get('uid') if hasattr(data, 'get') else None
+    if login in (None, '') and request.user is not None and request.user.is_authenticated:
+        login = f'user:{request.user.pk}'
+    if login in (None, ''):
+        return None
+    return hmac.new(settings.SECRET_KEY.encode(), str(login).casefold().encode(), hashlib.sha256).hexdigest()[:32]
+
+
+class PasswordCheckThrottle(BaseThrottle):
+    """Token buckets of the auth endpoints checking or hashing a password, see the module docstring"""
+
+    def allow_request(self, request, view):
+        self.retry_after = None
+        options = throttle_settings()
+        if not options['ENABLED']:
+            return True
+        endpoint = password_endpoint(request, view)
+        if endpoint is None:
+            return True
+        buckets = [Bucket.configured('ip', client_ip(request, options['NUM_PROXIES']), options['IP'])]
+        username = username_key(request)
+        if username is not None:
+            buckets.append(Bucket.configured('username', username, options['USERNAME']))
+        buckets.append(Bucket.configured('global', 'all', options['GLOBAL']))
+        exhausted, wait = get_bucket_store().take(buckets, time.time())
+        throttle_metrics.add(endpoint, ADMITTED if exhausted is None else exhausted.scope)
+        if exhausted is not None:
+            self.retry_after = wait
+            return False
+        return True
+
+    def wait(self):
+        return self.retry_after
@@ -4,9 +4,19 @@ from django.urls import re_path, include
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 
+from .views import (CategoryCountView, PatientExportView, PatientProfileView, PatientSearchView, RecordBulkCreateView,
+                    RecordFileView, RecordTimelineView)
+
 
 urlpatterns = [
     # path("", include(router.urls)),
     re_path(r'^auth/', include('djoser.urls')),
     re_path(r'^auth/', include('djoser.urls.authtoken')),
+    path('me/', PatientProfileView.as_view(), name='patient-profile'),
+    path('search/', PatientSearchView.as_view(), name='patient-search'),
+    path('export/', PatientExportView.as_view(), name='patient-export'),
+    path('statistics/<str:dimension>/', CategoryCountView.as_view(), name='patient-statistics'),
+    path('records/bulk/', RecordBulkCreateView.as_view(), name='record-bulk-create'),
+    path('<uuid:patient_id>/records/', RecordTimelineView.as_view(), name='patient-records'),
+    path('<uuid:patient_id>/records/<uuid:pk>/file/', RecordFileView.as_view(), name='patient-record-file'),
 ]
@@ -1,3 +1,251 @@
-from django.shortcuts import render
+import os
+import re
 
-# Create your views here.
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.http import content_disposition_header
+from rest_framework import generics, status
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.parsers import FileUploadParser
+from rest_framework.permissions import SAFE_METHODS, BasePermission, IsAdminUser, IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from Audit import log as audit
+from Audit.models import DOWNLOAD
+from Polyclinic.profiling import serializing
+
+from . import aggregates, blind_index
+from .compiled import compile_serializer
+from .models import LastNameBlindIndex, Patient, Record
+from .pagination import TimelinePagination
+from .serializers import PatientSerializer, RecordBulkSerializer, RecordSerializer
+from .storage import EncryptingUploadHandler, chunk_size
+
+
+class PatientSearchPagination(PageNumberPagination):
+    page_size = 50
+
+
+class AuditedListMixin:
+    """Logs the reading of every patient or record of the page, see Audit.log"""
+
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(queryset)
+        audit.record(self.request, page or [])
+        return page
+
+
+class PatientSearchView(AuditedListMixin, generics.ListAPIView):
+    """
+       Staff search of patients without decrypting the table
+       Query parameters (combined with AND): first_name, last_name (a trailing `*` searches by prefix),
+       sounds_like (phonetic match of the last name), phone_number, medical_insurance_number
+    """
+    serializer_class = PatientSerializer
+    permission_classes = [IsAdminUser]
+    pagination_class = PatientSearchPagination
+
+    exact_lookups = {
+        'first_name': 'user__first_name_hash',
+        'phone_number': 'user__phone_number_hash',
+        'medical_insurance_number': 'medical_insurance_number_hash',
+    }
+
+    def get_queryset(self):
+        params = self.request.query_params
+        filters = {lookup: blind_index.exact(params[name])
+                   for name, lookup in self.exact_lookups.items() if params.get(name)}
+        name_digests = []
+
+        last_name = params.get('last_name')
+        if last_name and last_name.endswith('*'):
+            digest = blind_index.prefix_lookup(last_name[:-1])
+            if digest is None:
+                raise ValidationError({'last_name': f"At least {blind_index.min_prefix_length()} "
+                                                    f"characters are required before `*`."})
+            name_digests.append((blind_index.PREFIX, digest))
+        elif last_name:
+            filters['user__last_name_hash'] = blind_index.exact(last_name)
+
+        if params.get('sounds_like'):
+            name_digests.append((blind_index.PHONETIC, blind_index.phonetic_lookup(params['sounds_like'])))
+
+        if not filters and not name_digests:
+            raise ValidationError("At least one search parameter is required.")
+
+        queryset = Patient.objects.filter(**filters)
+        for kind, digest in name_digests:
+            queryset = queryset.filter(user_id__in=LastNameBlindIndex.objects.filter(
+                kind=kind, digest=digest).values('user_id'))
+        # the serializer decrypts the page in one batch
+        return queryset.order_by('id').defer_decryption()
+
+
+class PatientExportView(APIView):
+    """
+       Staff export of all patients, as PatientSerializer renders them
+       The rows are read with values_list() and rendered by the compiled serializer, without creating instances
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        queryset = Patient.objects.order_by('id')
+        compiled = compile_serializer(PatientSerializer)
+        with serializing():
+            data = compiled.rows(queryset) if compiled is not None else PatientSerializer(queryset, many=True).data
+        audit.record(request, [Patient(pk=row['id']) for row in data])
+        return Response(data)
+
+
+class CategoryCountView(APIView):
+    """
+       Staff statistics of an encrypted categorical field (blood_type, city, gender): rows per category
+       Read from the maintained counters, without decrypting anything
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, dimension):
+        if dimension not in aggregates.dimensions():
+            raise NotFound(f"Unknown statistic, one of: {', '.join(sorted(aggregates.dimensions()))}.")
+        counts = aggregates.distribution(dimension)
+        return Response({'dimension': dimension, 'total': sum(counts.values()), 'counts': counts})
+
+
+class PatientProfileView(generics.RetrieveAPIView):
+    """Patient profile of the current user"""
+    serializer_class = PatientSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_object(self):
+        patient = generics.get_object_or_404(Patient, user_id=self.request.user.pk)
+        audit.record(self.request, [patient])
+        return patient
+
+
+class CanReadRecords(BasePermission):
+    """The patient, doctors and staff; only doctors and staff may write"""
+
+    def has_permission(self, request, view):
+        user = request.user
+        if request.method not in SAFE_METHODS:
+            return user.is_staff or hasattr(user, 'doctor')
+        if user.is_staff or Patient.objects.filter(pk=view.kwargs['patient_id'], user_id=user.pk).exists():
+            return True
+        return hasattr(user, 'doctor')
+
+
+class RecordTimelineView(AuditedListMixin, generics.ListAPIView):
+    """Medical records of a patient, newest first, paginated by cursor"""
+    serializer_class = RecordSerializer
+    permission_classes = [IsAuthenticated, CanReadRecords]
+    pagination_class = TimelinePagination
+
+    def get_queryset(self):
+        return Record.objects.filter(patient_id=self.kwargs['patient_id'])
+
+
+class IsDoctor(BasePermission):
+
+    def has_permission(self, request, view):
+        return hasattr(request.user, 'doctor')
+
+
+class RecordBulkCreateView(generics.CreateAPIView):
+    """
+       Records written by the requesting doctor, for any number of patients, created at once
+       Takes a list of {patient, description, created_at (optional)}; invalid items reject the whole list
+    """
+    serializer_class = RecordBulkSerializer
+    permission_classes = [IsAuthenticated, IsDoctor]
+    max_records = 500
+
+    def get_serializer_context(self):
+        return {**super().get_serializer_context(), 'doctor': getattr(self.request.user, 'doctor', None)}
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data, many=True, allow_empty=False,
+                                         max_length=self.max_records)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+def parse_range(header, size):
+    """(start, end) of a single `bytes=` range, inclusive, None for a missing or unsupported header"""
+    match = re.fullmatch(r'bytes=(\d*)-(\d*)', header.strip()) if header else None
+    if not match or match.groups() == ('', ''):
+        return None
+    start, end = match.groups()
+    if not start:
+        # the last `end` bytes
+        return max(size - int(end), 0), size - 1
+    start, end = int(start), min(int(end), size - 1) if end else size - 1
+    # an unsatisfiable range is answered with 416, an invalid one is ignored
+    return (start, end) if start <= end or start >= size else None
+
+
+def stream(file, start, length):
+    with file:
+        file.seek(start)
+        while length > 0:
+            data = file.read(min(length, chunk_size()))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+
+
+class RecordFileView(APIView):
+    """
+       Analysis file of a record
+       GET streams it decrypting chunk by chunk and serves `Range: bytes=` requests,
+       PUT uploads it (raw body, file name in `Content-Disposition`) encrypting chunk by chunk as it arrives
+    """
+    permission_classes = [IsAuthenticated, CanReadRecords]
+    parser_classes = [FileUploadParser]
+
+    def initialize_request(self, request, *args, **kwargs):
+        # instead of Django's handlers, which write large uploads to a temporary file in plaintext
+        request.upload_handlers = [EncryptingUploadHandler(request)]
+        return super().initialize_request(request, *args, **kwargs)
+
+    def get_record(self):
+        return generics.get_object_or_404(Record, pk=self.kwargs['pk'], patient_id=self.kwargs['patient_id'])
+
+    def get(self, request, patient_id, pk):
+        record = self.get_record()
+        if not record.file_analysis:
+            raise NotFound("The record has no file.")
+        file = record.file_analysis.storage.open(record.file_analysis.name)
+        size = file.size
+        byte_range = parse_range(request.headers.get('Range'), size)
+        if byte_range and byte_range[0] >= size:
+            file.close()
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+        start, end = byte_range or (0, size - 1)
+        audit.record(request, [record], DOWNLOAD)
+        response = StreamingHttpResponse(stream(file, start, end - start + 1),
+                                         status=206 if byte_range else 200,
+                                         content_type='application/octet-stream')
+        response['Content-Length'] = end - start + 1
+        response['Accept-Ranges'] = 'bytes'
+        if byte_range:
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Disposition'] = content_disposition_header(True, os.path.basename(record.file_analysis.name))
+        return response
+
+    def put(self, request, patient_id, pk):
+        record = self.get_record()
+        upload = request.data.get('file')
+        if upload is None:
+            raise ValidationError({'file': "No file was submitted."})
+        old_name = record.file_analysis.name
+        record.file_analysis.save(upload.name, upload, save=False)
+        record.save(update_fields=['file_analysis'])
+        if old_name:
+            record.file_analysis.storage.delete(old_name)
+        return Response({'name': os.path.basename(record.file_analysis.name), 'size': upload.size})
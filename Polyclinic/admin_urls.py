@@ -0,0 +1,6 @@
+"""URLs of the admin site, included lazily by Polyclinic.urls; registers the ModelAdmins of all apps first"""
+from django.contrib import admin
+
+admin.autodiscover()
+
+urlpatterns = admin.site.get_urls()
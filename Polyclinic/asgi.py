@@ -12,5 +12,12 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Polyclinic.settings')
+# read by the settings, e.g. for the default of DB_CONN_MAX_AGE
+os.environ['DJANGO_ASGI'] = '1'
 
 application = get_asgi_application()
+
+# each worker writes its audit log from a thread, see Audit.log
+from Audit.log import start_background_flush  # noqa: E402
+
+start_background_flush()
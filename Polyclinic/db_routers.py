@@ -0,0 +1,41 @@
+import contextvars
+import random
+
+from django.conf import settings
+from django.core.signals import request_started
+from django.db import DEFAULT_DB_ALIAS, connections
+
+_wrote = contextvars.ContextVar('wrote_to_primary', default=False)
+
+
+def _request_started(**kwargs):
+    _wrote.set(False)
+
+
+request_started.connect(_request_started)
+
+
+class ReplicaRouter:
+    """
+       Sends reads of `DATABASE_REPLICA_MODELS` to a random one of `DATABASE_REPLICAS`
+       Once a request wrote anything, or inside a transaction, reads stay on the primary,
+       so they never miss a write that has not been replicated yet
+    """
+
+    def db_for_read(self, model, **hints):
+        replicas = getattr(settings, 'DATABASE_REPLICAS', [])
+        if (not replicas or model._meta.label not in getattr(settings, 'DATABASE_REPLICA_MODELS', [])
+                or _wrote.get() or connections[DEFAULT_DB_ALIAS].in_atomic_block):
+            return None
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        _wrote.set(True)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
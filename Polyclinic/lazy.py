@@ -0,0 +1,37 @@
+"""
+Views and URLconfs imported on first use
+
+Worker start-up imports the root URLconf and, through it, every view. Views
+that are rarely requested and pull in large libraries (the schema generator,
+the admin) are referenced through these wrappers instead, so that a new
+worker does not pay for them until they are actually requested.
+"""
+from django.urls import URLResolver
+from django.urls.resolvers import RoutePattern
+from django.utils.module_loading import import_string
+from django.views.decorators.csrf import csrf_exempt
+
+
+def lazy_view(path, **initkwargs):
+    """The class based view at the dotted `path`, imported and set up on its first request"""
+    view = None
+
+    # like the DRF views it stands for; they enforce CSRF themselves
+    @csrf_exempt
+    def lazy(request, *args, **kwargs):
+        nonlocal view
+        if view is None:
+            view = import_string(path).as_view(**initkwargs)
+        return view(request, *args, **kwargs)
+
+    lazy.__name__ = lazy.__qualname__ = path.rsplit('.', 1)[-1]
+    lazy.__module__ = path.rsplit('.', 1)[0]
+    return lazy
+
+
+def lazy_include(route, urlconf, namespace=None):
+    """
+       path(route, include(urlconf, namespace)) that imports the URLconf module only when a URL under
+       `route` is resolved, or any URL is reversed
+    """
+    return URLResolver(RoutePattern(route), urlconf, app_name=namespace, namespace=namespace)
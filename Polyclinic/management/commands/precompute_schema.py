@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from Polyclinic.schema import PrecomputedSchema, render
+
+
+class Command(BaseCommand):
+    help = ("Render the OpenAPI schema, plain and compressed, into OPENAPI_SCHEMA_DIR for the schema "
+            "endpoint to serve; run it on every deploy")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--directory', default=None, help="Defaults to OPENAPI_SCHEMA_DIR")
+
+    def handle(self, *args, directory, **options):
+        directory = directory or settings.OPENAPI_SCHEMA_DIR
+        if not directory:
+            raise CommandError("Set OPENAPI_SCHEMA_DIR or pass --directory")
+        schema = PrecomputedSchema.from_rendered(render())
+        schema.save(directory)
+        for (name, encoding), variant in sorted(schema.variants.items()):
+            self.stdout.write(f"schema.{name} ({encoding}): {len(variant.content)} bytes, ETag {variant.etag}")
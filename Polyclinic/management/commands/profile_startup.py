@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from Polyclinic.startup import LAZY_MODULES, by_group, measure
+
+
+class Command(BaseCommand):
+    help = ("Start fresh workers and report the cold start time per phase and the import time per app; "
+            "fails when the fastest start exceeds STARTUP_TARGET_MS or a lazily loaded module is imported")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5, help="Starts timed, the fastest is reported")
+        parser.add_argument('--top', type=int, default=15, help="Apps and packages listed")
+        parser.add_argument('--modules', type=int, default=10, help="Slowest modules listed")
+        parser.add_argument('--target-ms', type=float, default=None, help="Defaults to STARTUP_TARGET_MS")
+
+    def handle(self, *args, repeat, top, modules, target_ms, **options):
+        target_ms = settings.STARTUP_TARGET_MS if target_ms is None else target_ms
+        # timed without -X importtime, which slows imports down
+        fastest = min((measure() for _ in range(max(repeat, 1))), key=lambda profile: profile.total)
+        imports = measure(importtime=True).imports
+
+        self.stdout.write(f"Cold start: {fastest.total:.0f} ms (target {target_ms:g} ms, best of {repeat})")
+        for phase, milliseconds in fastest.phases.items():
+            self.stdout.write(f"  {phase:<12} {milliseconds:8.1f} ms")
+        self.stdout.write("Import time per app or package (with -X importtime):")
+        for name, milliseconds in by_group(imports)[:top]:
+            self.stdout.write(f"  {name:<32} {milliseconds:8.1f} ms")
+        self.stdout.write("Slowest modules, with what they import:")
+        for name, _, cumulative_us in sorted(imports, key=lambda row: row[2], reverse=True)[:modules]:
+            self.stdout.write(f"  {name:<48} {cumulative_us / 1000:8.1f} ms")
+
+        eager = sorted(set(LAZY_MODULES) & fastest.modules)
+        if eager:
+            raise CommandError(f"Imported at start-up, though loaded lazily: {', '.join(eager)}")
+        if fastest.total > target_ms:
+            raise CommandError(f"Cold start of {fastest.total:.0f} ms exceeds the target of {target_ms:g} ms")
@@ -0,0 +1,300 @@
+"""
+Per-request profiling
+
+`ProfilingMiddleware` measures the SQL queries, decryptions, view,
+serializer and rendering time of every request. The view time includes the
+serializers; the serializer time is that of building `data` in the
+serializers using `ProfiledSerializerMixin` (or inside `serializing()`), the
+rendering time that of the JSON renderer (Polyclinic.renderers), which
+reports it with `record_render()`. A SELECT executed `N_PLUS_ONE_THRESHOLD` times or
+more within one request (the same SQL with different parameters, as when
+related objects are loaded one row at a time) is flagged as an N+1 pattern
+and logged. The figures are returned in the `Server-Timing` header, which
+browser developer tools display, and summed per view for the Prometheus
+text endpoint `metrics` (labelled by view name and one of `METHODS`), which also counts the admitted and rejected
+requests of the throttled auth endpoints (Patient.throttling). The sums are
+kept per process, so Prometheus must scrape every worker (or run one worker
+per target). Profiling and the header are off unless PROFILING enables them.
+"""
+import contextvars
+import hmac
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponseForbidden
+from rest_framework import serializers
+
+from Patient.encryption import track_decryptions
+from Patient.throttling import throttle_metrics
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# method label of the metrics, any other method is counted as OTHER
+METHODS = frozenset({'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'})
+
+_profile = contextvars.ContextVar('request_profile', default=None)
+_installed = False
+_install_lock = threading.Lock()
+
+
+def profiling_settings():
+    return {
+        'ENABLED': False,
+        'SERVER_TIMING': False,
+        'N_PLUS_ONE_THRESHOLD': 5,
+        'METRICS_TOKEN': None,
+        **getattr(settings, 'PROFILING', {}),
+    }
+
+
+class RequestProfile:
+    __slots__ = ('statements', 'query_count', 'sql_seconds', 'serialize_seconds', 'serializing', 'render_seconds')
+
+    def __init__(self):
+        self.statements = Counter()
+        self.query_count = 0
+        self.sql_seconds = 0.0
+        self.serialize_seconds = 0.0
+        self.serializing = False
+        self.render_seconds = 0.0
+
+    def repeated_selects(self, threshold):
+        """SELECT statements executed at least `threshold` times, most repeated first"""
+        return [(sql, count) for sql, count in self.statements.most_common()
+                if count >= threshold and sql.lstrip()[:6].upper() == 'SELECT']
+
+
+def _profile_query(execute, sql, params, many, context):
+    profile = _profile.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.sql_seconds += time.perf_counter() - started
+        profile.query_count += 1
+        profile.statements[sql] += 1
+
+
+def _add_query_wrapper(connection, **kwargs):
+    if _profile_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_profile_query)
+
+
+def record_render(seconds):
+    """Add the time a renderer took to the profile of the current request, if any"""
+    profile = _profile.get()
+    if profile is not None:
+        profile.render_seconds += seconds
+
+
+@contextmanager
+def serializing():
+    """Add the time spent in this block to the serializer time of the current request, if profiled"""
+    profile = _profile.get()
+    if profile is None or profile.serializing:
+        # not profiled, or inside a block already timed
+        yield
+        return
+    profile.serializing = True
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.serialize_seconds += time.perf_counter() - started
+        profile.serializing = False
+
+
+class ProfiledSerializerMixin:
+    """
+       Times the building of `data` for the request profile
+       A serializer used with many=True needs a list_serializer_class using it too, e.g. ProfiledListSerializer
+    """
+
+    @property
+    def data(self):
+        with serializing():
+            return super().data
+
+
+class ProfiledListSerializer(ProfiledSerializerMixin, serializers.ListSerializer):
+    pass
+
+
+def install():
+    """Time the queries of every connection, once per process"""
+    global _installed
+
+    with _install_lock:
+        if _installed:
+            return
+        # the wrapper stays on the connection, it records only while a request is profiled
+        connection_created.connect(_add_query_wrapper)
+        for connection in connections.all(initialized_only=True):
+            _add_query_wrapper(connection)
+        _installed = True
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Metrics:
+    """Per view sums of the profiled figures, and a histogram of the request durations"""
+    COUNTERS = (
+        ('requests_total', 'Requests'),
+        ('db_queries_total', 'SQL queries'),
+        ('db_seconds_total', 'Time spent in SQL queries'),
+        ('decryptions_total', 'Decrypted values'),
+        ('decrypt_seconds_total', 'Time spent decrypting'),
+        ('view_seconds_total', 'Time spent in views, serializers included'),
+        ('serialize_seconds_total', 'Time spent in profiled serializers'),
+        ('render_seconds_total', 'Time spent rendering responses'),
+        ('n_plus_one_total', 'Requests with repeated (N+1) queries'),
+    )
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(lambda: dict.fromkeys([name for name, _ in self.COUNTERS], 0))
+        self._buckets = defaultdict(lambda: [0] * len(DURATION_BUCKETS))
+        self._durations = defaultdict(float)
+
+    def observe(self, labels, duration, **values):
+        with self._lock:
+            counters = self._counters[labels]
+            counters['requests_total'] += 1
+            for name, value in values.items():
+                counters[name] += value
+            buckets = self._buckets[labels]
+            for index, bound in enumerate(DURATION_BUCKETS):
+                if duration <= bound:
+                    buckets[index] += 1
+            self._durations[labels] += duration
+
+    def clear(self):
+        with self._lock:
+            self._counters.clear()
+            self._buckets.clear()
+            self._durations.clear()
+
+    def render(self, prefix='polyclinic'):
+        """The metrics in the Prometheus text exposition format"""
+        def label_text(labels, **extra):
+            pairs = {'method': labels[0], 'view': labels[1], **extra}
+            return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in pairs.items()) + '}'
+
+        with self._lock:
+            lines = []
+            for name, description in self.COUNTERS:
+                lines += [f'# HELP {prefix}_{name} {description}', f'# TYPE {prefix}_{name} counter']
+                lines += [f'{prefix}_{name}{label_text(labels)} {counters[name]}'
+                          for labels, counters in sorted(self._counters.items())]
+            name = f'{prefix}_request_duration_seconds'
+            lines += [f'# HELP {name} Request duration', f'# TYPE {name} histogram']
+            for labels, buckets in sorted(self._buckets.items()):
+                lines += [f'{name}_bucket{label_text(labels, le=bound)} {count}'
+                          for bound, count in zip(DURATION_BUCKETS, buckets)]
+                lines.append(f'{name}_bucket{label_text(labels, le="+Inf")} '
+                             f'{self._counters[labels]["requests_total"]}')
+                lines.append(f'{name}_sum{label_text(labels)} {self._durations[labels]}')
+                lines.append(f'{name}_count{label_text(labels)} {self._counters[labels]["requests_total"]}')
+        return '\n'.join(lines) + '\n'
+
+
+metrics_registry = Metrics()
+
+
+class ProfilingMiddleware:
+    """
+       Profiles every request, see the module docstring
+       Placed before DecryptionCountMiddleware, it reads the decryptions counted there
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.settings = profiling_settings()
+        if not self.settings['ENABLED']:
+            raise MiddlewareNotUsed
+        install()
+        self.get_response = get_response
+        # under ASGI the async views must not be pushed into a thread by this middleware
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        profile = RequestProfile()
+        token = _profile.set(profile)
+        started = time.perf_counter()
+        try:
+            with track_decryptions() as decryptions:
+                response = self.get_response(request)
+        finally:
+            _profile.reset(token)
+        self.finish(request, response, profile, getattr(request, 'decryptions', decryptions), started)
+        return response
+
+    async def __acall__(self, request):
+        profile = RequestProfile()
+        token = _profile.set(profile)
+        started = time.perf_counter()
+        try:
+            with track_decryptions() as decryptions:
+                response = await self.get_response(request)
+        finally:
+            _profile.reset(token)
+        self.finish(request, response, profile, getattr(request, 'decryptions', decryptions), started)
+        return response
+
+    def finish(self, request, response, profile, decryptions, started):
+        duration = time.perf_counter() - started
+        # past this middleware a request is resolved, handled by its view, then rendered
+        view_seconds = max(duration - profile.render_seconds, 0)
+        match = request.resolver_match
+        view = match.view_name if match else '<unresolved>'
+        repeated = profile.repeated_selects(self.settings['N_PLUS_ONE_THRESHOLD'])
+        for sql, count in repeated:
+            logger.warning('N+1 query executed %d times by %s %s: %s', count, request.method, request.path, sql)
+        method = request.method if request.method in METHODS else 'OTHER'
+        metrics_registry.observe(
+            (method, view), duration,
+            db_queries_total=profile.query_count, db_seconds_total=profile.sql_seconds,
+            decryptions_total=decryptions.count, decrypt_seconds_total=decryptions.seconds,
+            view_seconds_total=view_seconds, serialize_seconds_total=profile.serialize_seconds,
+            render_seconds_total=profile.render_seconds,
+            n_plus_one_total=int(bool(repeated)),
+        )
+        if self.settings['SERVER_TIMING']:
+            timings = [
+                f'db;dur={profile.sql_seconds * 1000:.2f};desc="{profile.query_count} queries"',
+                f'decrypt;dur={decryptions.seconds * 1000:.2f};desc="{decryptions.count} values"',
+                f'view;dur={view_seconds * 1000:.2f}',
+                f'serialize;dur={profile.serialize_seconds * 1000:.2f}',
+                f'render;dur={profile.render_seconds * 1000:.2f}',
+                f'total;dur={duration * 1000:.2f}',
+            ]
+            if repeated:
+                timings.append(f'n-plus-one;desc="{len(repeated)} statements, up to {repeated[0][1]}x"')
+            response['Server-Timing'] = ', '.join(timings)
+
+
+def metrics(request):
+    """Prometheus endpoint, for staff users or with `Authorization: Bearer <PROFILING['METRICS_TOKEN']>`"""
+    token = profiling_settings()['METRICS_TOKEN']
+    authorized = token and hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+    if not (authorized or request.user.is_staff):
+        return HttpResponseForbidden()
+    return HttpResponse(metrics_registry.render() + throttle_metrics.render(),
+                        content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,175 @@
+"""
+Precomputed OpenAPI schema
+
+Generating the schema walks every view and serializer, which takes hundreds
+of milliseconds. `precompute_schema` (run once per deploy, e.g. in the image build)
+renders it as YAML and JSON, each also gzip and, when the brotli package is
+installed, brotli compressed, into OPENAPI_SCHEMA_DIR. `PrecomputedSchemaView`
+serves those files, or, when they are missing, variants it renders on its
+first request and keeps for the life of the process. Every variant carries a
+strong ETag derived from its content, so clients revalidate with a 304.
+
+With DEBUG on the files are ignored, as they would not follow code changes.
+"""
+import gzip
+import hashlib
+import os
+import threading
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from drf_spectacular.renderers import OpenApiJsonRenderer, OpenApiYamlRenderer
+from drf_spectacular.settings import spectacular_settings
+from drf_spectacular.utils import extend_schema
+from drf_spectacular.views import SCHEMA_KWARGS, SpectacularAPIView
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+FORMATS = {'yaml': OpenApiYamlRenderer, 'json': OpenApiJsonRenderer}
+# preferred first
+ENCODINGS = ['br', 'gzip']
+SUFFIXES = {'br': '.br', 'gzip': '.gz', 'identity': ''}
+
+_schema = None
+_lock = threading.Lock()
+
+
+def compress(content, encoding):
+    if encoding == 'br':
+        return brotli.compress(content, quality=11)
+    # no timestamp, so that a build of the same schema is byte for byte the same
+    return gzip.compress(content, compresslevel=9, mtime=0)
+
+
+def render():
+    """{format: content} of the public schema, as SpectacularAPIView would render it"""
+    generator = spectacular_settings.DEFAULT_GENERATOR_CLASS(urlconf=spectacular_settings.SERVE_URLCONF)
+    schema = generator.get_schema(request=None, public=True)
+    return {name: renderer().render(schema, renderer_context={}) for name, renderer in FORMATS.items()}
+
+
+class Variant:
+    __slots__ = ('content', 'etag')
+
+    def __init__(self, content):
+        self.content = content
+        self.etag = f'"{hashlib.sha256(content).hexdigest()[:32]}"'
+
+
+class PrecomputedSchema:
+    """The variants of the schema, keyed by (format, encoding)"""
+
+    def __init__(self, variants):
+        self.variants = variants
+
+    @classmethod
+    def from_rendered(cls, rendered):
+        encodings = [encoding for encoding in ENCODINGS if encoding != 'br' or brotli]
+        variants = {}
+        for name, content in rendered.items():
+            variants[name, 'identity'] = Variant(content)
+            for encoding in encodings:
+                variants[name, encoding] = Variant(compress(content, encoding))
+        return cls(variants)
+
+    @classmethod
+    def load(cls, directory):
+        """The schema stored by save(), None when it is incomplete"""
+        variants = {}
+        for name in FORMATS:
+            for encoding, suffix in SUFFIXES.items():
+                path = os.path.join(directory, f'schema.{name}{suffix}')
+                if os.path.exists(path):
+                    with open(path, 'rb') as file:
+                        variants[name, encoding] = Variant(file.read())
+            if (name, 'identity') not in variants:
+                return None
+        return cls(variants)
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        for (name, encoding), variant in self.variants.items():
+            path = os.path.join(directory, f'schema.{name}{SUFFIXES[encoding]}')
+            # replaced whole, as running servers may read it meanwhile
+            with open(f'{path}.tmp', 'wb') as file:
+                file.write(variant.content)
+            os.replace(f'{path}.tmp', path)
+
+    def variant(self, name, accept_encoding):
+        """(encoding, variant) of the format for an Accept-Encoding header"""
+        accepted = accepted_encodings(accept_encoding)
+        for encoding in ENCODINGS:
+            if (encoding in accepted or '*' in accepted) and (name, encoding) in self.variants:
+                return encoding, self.variants[name, encoding]
+        return 'identity', self.variants[name, 'identity']
+
+
+def accepted_encodings(header):
+    """Content codings of an Accept-Encoding header, without those refused with q=0"""
+    accepted = set()
+    for part in header.split(','):
+        coding, *parameters = [item.strip().lower() for item in part.split(';')]
+        if coding and not any(quality(parameter) == 0 for parameter in parameters):
+            accepted.add(coding)
+    return accepted
+
+
+def quality(parameter):
+    name, _, value = parameter.partition('=')
+    try:
+        return float(value) if name.strip() == 'q' else None
+    except ValueError:
+        return None
+
+
+def get_schema():
+    """The schema of this process: the precomputed files, else rendered once"""
+    global _schema
+    if _schema is None:
+        with _lock:
+            if _schema is None:
+                directory = settings.OPENAPI_SCHEMA_DIR
+                schema = None if settings.DEBUG or not directory else PrecomputedSchema.load(directory)
+                _schema = schema or PrecomputedSchema.from_rendered(render())
+    return _schema
+
+
+@receiver(setting_changed)
+def schema_settings_changed(setting, **kwargs):
+    global _schema
+    if setting in ('OPENAPI_SCHEMA_DIR', 'DEBUG', 'SPECTACULAR_SETTINGS'):
+        _schema = None
+
+
+class PrecomputedSchemaView(SpectacularAPIView):
+    """SpectacularAPIView serving the precomputed schema, in the encoding and format negotiated"""
+
+    @extend_schema(**SCHEMA_KWARGS)
+    def get(self, request, *args, **kwargs):
+        # translated and versioned schemas are not precomputed
+        if request.GET.get('lang') or request.GET.get('version'):
+            return super().get(request, *args, **kwargs)
+        renderer = request.accepted_renderer
+        name = 'json' if renderer.format == 'json' else 'yaml'
+        encoding, variant = get_schema().variant(name, request.headers.get('Accept-Encoding', ''))
+
+        if_none_match = request.headers.get('If-None-Match', '')
+        if variant.etag in [tag.strip() for tag in if_none_match.split(',')] or if_none_match.strip() == '*':
+            response = HttpResponse(status=304)
+        else:
+            charset = f'; charset={renderer.charset}' if renderer.charset else ''
+            response = HttpResponse(variant.content, content_type=f'{renderer.media_type}{charset}')
+            response['Content-Disposition'] = (
+                f'inline; filename="{spectacular_settings.TITLE or "schema"}.{renderer.format}"')
+            if encoding != 'identity':
+                response['Content-Encoding'] = encoding
+        response['ETag'] = variant.etag
+        patch_vary_headers(response, ['Accept', 'Accept-Encoding'])
+        response['Cache-Control'] = 'no-cache'
+        return response
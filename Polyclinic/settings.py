@@ -15,24 +15,36 @@ import os
 
 from dotenv import load_dotenv
 
-# Load environment variables from .env.postgres file
-load_dotenv("env_file/.env.postgres")
-load_dotenv("env_file/.env.app")
-
-# Access environment variables
-
-
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# Load environment variables from the env files, wherever the process is started from
+for env_file in ('.env.postgres', '.env.app'):
+    load_dotenv(BASE_DIR / 'env_file' / env_file)
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.1/howto/deployment/checklist/
 
 # SECURITY WARNING: keep the secret key used in production secret!
 SECRET_KEY = os.getenv('SECRET_KEY')
-SECURED_FIELDS_KEY = os.getenv('ENCRYPTION_KEY')
-SECURED_FILDS_HASH_SALT = os.getenv('SECURED_FILDS_HASH')
+# Fernet keys, comma separated: values are encrypted with the first key and decrypted with any of them.
+# To rotate, put the new key first, run `manage.py rotate_keys`, then drop the old keys
+SECURED_FIELDS_KEY = [key.strip() for key in os.getenv('ENCRYPTION_KEY', '').split(',') if key.strip()] or None
+# Salt of the hashes appended to searchable values; `manage.py rotate_keys` rehashes after a change
+SECURED_FIELDS_HASH_SALT = os.getenv('SECURED_FILDS_HASH', '')
+# Threads decrypting a page of encrypted columns in one batch (0 decrypts in the calling thread)
+SECURED_FIELDS_DECRYPT_WORKERS = int(os.getenv('SECURED_FIELDS_DECRYPT_WORKERS', 0))
+# Report the values each request decrypted in the X-Decryption-Count response header, for development
+DECRYPTION_COUNT_HEADER = os.getenv('DECRYPTION_COUNT_HEADER', '0') == '1'
+# Key of the blind indexes used to search encrypted fields (Patient.blind_index)
+BLIND_INDEX_KEY = os.getenv('BLIND_INDEX_KEY')
+# Rows each category counter of encrypted fields is spread over, so that concurrent writes rarely wait
+# for the same row (Patient.aggregates)
+AGGREGATE_SHARDS = int(os.getenv('AGGREGATE_SHARDS', 8))
+# Encrypted files are stored and streamed in chunks of this size (Patient.storage)
+SECURED_FIELDS_FILE_STORAGE = 'Patient.storage.ChunkedEncryptedFileSystemStorage'
+SECURED_FIELDS_FILE_CHUNK_SIZE = 64 * 1024
 
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = os.getenv('DEBUG')
@@ -42,7 +54,8 @@ ALLOWED_HOSTS = []
 # Application definition
 
 INSTALLED_APPS = [
-    'django.contrib.admin',
+    # without autodiscovery at start-up, the admin URLs discover the ModelAdmins on first use
+    'django.contrib.admin.apps.SimpleAdminConfig',
     'django.contrib.auth',
     'django.contrib.contenttypes',
     'django.contrib.sessions',
@@ -57,6 +70,10 @@ INSTALLED_APPS = [
 
     'Doctor',
     'Patient',
+    'Appointment',
+    'Notification',
+    'Audit',
+    'Polyclinic',
 ]
 
 MIDDLEWARE = [
@@ -67,6 +84,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'Polyclinic.profiling.ProfilingMiddleware',
+    'Patient.middleware.DecryptionCountMiddleware',
 ]
 
 ROOT_URLCONF = 'Polyclinic.urls'
@@ -102,13 +121,78 @@ DATABASES = {
         "PASSWORD":  f"{os.getenv('POSTGRES_PASSWORD')}",
         "HOST":  f"{os.getenv('POSTGRES_HOST')}",
         "PORT":  f"{os.getenv('POSTGRES_PORT')}",
+        # connections are checked before reuse, so a restarted server does not fail the next request
+        "CONN_HEALTH_CHECKS": True,
     }
 }
 
+# Connections are kept open between requests for DB_CONN_MAX_AGE seconds, or, with DB_POOL=1, taken from a
+# pool of DB_POOL_MIN_SIZE to DB_POOL_MAX_SIZE connections per worker process. Size the pools so that
+# workers * DB_POOL_MAX_SIZE stays below the server's max_connections.
+# Under ASGI (asgi.py sets DJANGO_ASGI) sync code runs in many threads, each keeping a persistent connection
+# of its own until it expires: DB_CONN_MAX_AGE defaults to 0 there, and DB_POOL=1 is the way to reuse them.
+if os.getenv('DB_POOL') == '1':
+    DATABASES['default']['OPTIONS'] = {
+        'pool': {
+            'min_size': int(os.getenv('DB_POOL_MIN_SIZE', 2)),
+            'max_size': int(os.getenv('DB_POOL_MAX_SIZE', 10)),
+            'timeout': float(os.getenv('DB_POOL_TIMEOUT', 10)),
+        },
+    }
+else:
+    DATABASES['default']['CONN_MAX_AGE'] = int(os.getenv('DB_CONN_MAX_AGE') or (0 if os.getenv('DJANGO_ASGI') else 60))
+
+# Read replicas: POSTGRES_REPLICA_HOSTS=host[:port],... adds the aliases replica1, replica2, ...
+# Reads of DATABASE_REPLICA_MODELS go to a replica, unless the request or transaction wrote already
+for number, address in enumerate(filter(None, os.getenv('POSTGRES_REPLICA_HOSTS', '').split(',')), start=1):
+    host, _, port = address.partition(':')
+    DATABASES[f'replica{number}'] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'PORT': port or DATABASES['default']['PORT'],
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias.startswith('replica')]
+DATABASE_REPLICA_MODELS = ['Patient.Record']
+DATABASE_ROUTERS = ['Polyclinic.db_routers.ReplicaRouter']
+
+
+# Cache
+# Shared by all workers when REDIS_URL is set (requires the redis package); the availability index and
+# the doctor directory publish their changes through it. The local memory cache is per process: it only
+# suits a single worker (runserver, tests), deployments running several workers must set REDIS_URL.
+
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            # one entry per doctor is kept by the doctor directory
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
+# New passwords are hashed with the first hasher, the others still verify stored hashes and
+# upgrade them on the next login, e.g. PASSWORD_HASHERS=django.contrib.auth.hashers.Argon2PasswordHasher,...
+# (Argon2 and bcrypt require the argon2-cffi and bcrypt packages)
+PASSWORD_HASHERS = os.getenv('PASSWORD_HASHERS', ','.join([
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+])).split(',')
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -142,6 +226,8 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+MEDIA_ROOT = os.getenv('MEDIA_ROOT', BASE_DIR / 'media')
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -153,9 +239,85 @@ AUTH_USER_MODEL = 'Patient.CustomUser'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
+        'Patient.authentication.CachedTokenAuthentication',
     ),
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    # orjson when installed, else the json module (see Polyclinic.renderers)
+    'DEFAULT_RENDERER_CLASSES': (
+        'Polyclinic.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'Polyclinic.renderers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
+    # only throttles the auth endpoints checking passwords, see AUTH_THROTTLE
+    'DEFAULT_THROTTLE_CLASSES': (
+        'Patient.throttling.PasswordCheckThrottle',
+    ),
+}
+
+# Cold start a new worker must stay within (settings, apps, URLconf and middleware), checked by
+# `manage.py profile_startup` and the Polyclinic tests
+STARTUP_TARGET_MS = int(os.getenv('STARTUP_TARGET_MS', 1500))
+
+# OpenAPI schema files written by `manage.py precompute_schema` on deploy and served by /api/schema/
+# (without them it is rendered once per process); empty disables the files
+OPENAPI_SCHEMA_DIR = os.getenv('OPENAPI_SCHEMA_DIR', BASE_DIR / 'openapi')
+
+
+# Token -> user snapshots of CachedTokenAuthentication. Deleting a token or saving its user drops the snapshot
+# from the cache of the process doing it only: with REDIS_URL the snapshots are shared through CACHES, so they
+# are dropped for all workers at once, otherwise each process keeps them a few seconds
+if os.getenv('REDIS_URL'):
+    TOKEN_AUTH_CACHE = {
+        'BACKEND': os.getenv('TOKEN_AUTH_CACHE_BACKEND', 'Patient.authentication.DjangoTokenCache'),
+        'TIMEOUT': int(os.getenv('TOKEN_AUTH_CACHE_TIMEOUT', 300)),
+        'OPTIONS': {},
+    }
+else:
+    TOKEN_AUTH_CACHE = {
+        'BACKEND': os.getenv('TOKEN_AUTH_CACHE_BACKEND', 'Patient.authentication.LocMemTokenCache'),
+        'TIMEOUT': int(os.getenv('TOKEN_AUTH_CACHE_TIMEOUT', 5)),
+        'OPTIONS': {},
+    }
+
+
+# Token buckets of the auth endpoints checking or hashing a password (Patient.throttling), per client IP, per
+# username and for all requests: BURST requests at once, then PER_MINUTE. GLOBAL defaults to 2 checks per second
+# and CPU. Use 'Patient.throttling.CacheBucketStore' with OPTIONS {'alias': ...} to share the buckets of all
+# workers through CACHES (e.g. Redis); the in-process default gives every worker its own. The IP buckets key
+# on REMOTE_ADDR unless AUTH_THROTTLE_NUM_PROXIES trusted proxies append the client to X-Forwarded-For
+AUTH_THROTTLE = {
+    'ENABLED': os.getenv('AUTH_THROTTLE_ENABLED', '1') == '1',
+    'BACKEND': os.getenv('AUTH_THROTTLE_BACKEND', 'Patient.throttling.LocMemBucketStore'),
+    'OPTIONS': {},
+    'NUM_PROXIES': int(os.getenv('AUTH_THROTTLE_NUM_PROXIES', 0)),
+    'IP': {
+        'BURST': int(os.getenv('AUTH_THROTTLE_IP_BURST', 20)),
+        'PER_MINUTE': float(os.getenv('AUTH_THROTTLE_IP_PER_MINUTE', 10)),
+    },
+    'USERNAME': {
+        'BURST': int(os.getenv('AUTH_THROTTLE_USERNAME_BURST', 5)),
+        'PER_MINUTE': float(os.getenv('AUTH_THROTTLE_USERNAME_PER_MINUTE', 2)),
+    },
+    'GLOBAL': {
+        'BURST': int(os.getenv('AUTH_THROTTLE_GLOBAL_BURST', 4 * (os.cpu_count() or 1))),
+        'PER_MINUTE': float(os.getenv('AUTH_THROTTLE_GLOBAL_PER_MINUTE', 120 * (os.cpu_count() or 1))),
+    },
+}
+
+
+# Per-request profiling (Polyclinic.profiling): Server-Timing headers, N+1 warnings and the metrics/ endpoint,
+# which staff users or requests with "Authorization: Bearer <PROFILING_METRICS_TOKEN>" may read. Off unless
+# PROFILING_ENABLED=1; the Server-Timing header, which shows every client the queries and timings of its
+# requests, needs PROFILING_SERVER_TIMING=1 as well
+PROFILING = {
+    'ENABLED': os.getenv('PROFILING_ENABLED', '0') == '1',
+    'SERVER_TIMING': os.getenv('PROFILING_SERVER_TIMING', '0') == '1',
+    'N_PLUS_ONE_THRESHOLD': int(os.getenv('PROFILING_N_PLUS_ONE_THRESHOLD', 5)),
+    'METRICS_TOKEN': os.getenv('PROFILING_METRICS_TOKEN') or None,
 }
 
 
@@ -170,7 +332,44 @@ DJOSER = {
         'user_create':'Patient.serializers.CustomUserCreatePasswordRetypeSerializer',
         'user':'Patient.serializers.CustomUserCreatePasswordRetypeSerializer',
     },
+    # queued in the outbox and sent by `manage.py send_notifications --interval 1`
+    'EMAIL': {
+        'activation': 'Notification.email.ActivationEmail',
+        'confirmation': 'Notification.email.ConfirmationEmail',
+        'password_reset': 'Notification.email.PasswordResetEmail',
+        'password_changed_confirmation': 'Notification.email.PasswordChangedConfirmationEmail',
+        'username_changed_confirmation': 'Notification.email.UsernameChangedConfirmationEmail',
+        'username_reset': 'Notification.email.UsernameResetEmail',
+    },
 }
 
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+SMS_BACKEND = 'Notification.sms.ConsoleBackend'
+
+# Retries of the outbox worker, see Notification.outbox
+OUTBOX = {
+    'BATCH_SIZE': int(os.getenv('OUTBOX_BATCH_SIZE', 100)),
+    'MAX_ATTEMPTS': int(os.getenv('OUTBOX_MAX_ATTEMPTS', 8)),
+    'RETRY_DELAY': int(os.getenv('OUTBOX_RETRY_DELAY', 30)),
+    'MAX_RETRY_DELAY': int(os.getenv('OUTBOX_MAX_RETRY_DELAY', 3600)),
+}
+
+
+# Reads of patients and records logged by Audit.log: buffered per worker and written in batches of
+# BATCH_SIZE, at least every FLUSH_INTERVAL seconds and at shutdown; past MAX_PENDING unwritten events,
+# reads wait for the write. On PostgreSQL the log is partitioned by month, PARTITIONS_AHEAD months are
+# created ahead by `manage.py partition_audit_log`
+AUDIT = {
+    'BATCH_SIZE': int(os.getenv('AUDIT_BATCH_SIZE', 500)),
+    'FLUSH_INTERVAL': float(os.getenv('AUDIT_FLUSH_INTERVAL', 1)),
+    'MAX_PENDING': int(os.getenv('AUDIT_MAX_PENDING', 50000)),
+    'COPY': os.getenv('AUDIT_COPY', '1') == '1',
+    'PARTITIONS_AHEAD': int(os.getenv('AUDIT_PARTITIONS_AHEAD', 3)),
+}
+
+
+# Length of a bookable appointment slot, in minutes
+AVAILABILITY_SLOT_MINUTES = int(os.getenv('AVAILABILITY_SLOT_MINUTES', 30))
 
+# How long a held appointment slot waits for confirmation, in seconds
+APPOINTMENT_HOLD_SECONDS = int(os.getenv('APPOINTMENT_HOLD_SECONDS', 300))
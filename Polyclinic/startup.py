@@ -0,0 +1,120 @@
+"""
+Worker cold start
+
+A worker started by the autoscaler loads the settings, sets up the apps,
+imports the root URLconf (and through it every eagerly referenced view) and
+builds the middleware chain before it serves its first request. `measure()`
+does the same in a fresh interpreter and times each phase; with `importtime`
+it also returns the import time of every module (`python -X importtime`),
+which `by_group()` sums per installed app. `manage.py profile_startup`
+prints both, and fails when the cold start exceeds STARTUP_TARGET_MS.
+
+Modules in LAZY_MODULES are only needed by rarely used endpoints and must not
+be imported at start-up; see Polyclinic.lazy.
+"""
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+
+LAZY_MODULES = (
+    'drf_spectacular.views',
+    'drf_spectacular.generators',
+    'Polyclinic.schema',
+    'Polyclinic.admin_urls',
+    'django.contrib.auth.admin',
+    'djoser.email',
+    'Notification.email',
+    'Notification.outbox',
+)
+
+# run in the fresh interpreter; prints the phases and the loaded modules as JSON
+BOOTSTRAP = '''
+import time
+started = time.perf_counter()
+import json, sys
+phases = {}
+
+def phase(name):
+    global started
+    now = time.perf_counter()
+    phases[name] = (now - started) * 1000
+    started = now
+
+from django.conf import settings
+settings.INSTALLED_APPS
+phase('settings')
+import django
+django.setup(set_prefix=False)
+phase('apps')
+from django.urls import get_resolver
+get_resolver().url_patterns
+phase('urls')
+from django.core.handlers.wsgi import WSGIHandler
+WSGIHandler()
+phase('middleware')
+print(json.dumps({'phases': phases, 'modules': sorted(sys.modules)}))
+'''
+
+
+class StartupProfile:
+    __slots__ = ('phases', 'modules', 'imports')
+
+    def __init__(self, phases, modules, imports):
+        self.phases = phases
+        self.modules = modules
+        # (module, self microseconds, cumulative microseconds) in import order, with importtime only
+        self.imports = imports
+
+    @property
+    def total(self):
+        """Milliseconds from the first import of Django to a worker ready to serve"""
+        return sum(self.phases.values())
+
+
+def parse_importtime(output):
+    imports = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        imports.append((name.strip(), int(self_us), int(cumulative_us)))
+    return imports
+
+
+def measure(importtime=False):
+    """Profile the start-up of a fresh worker of this project, with the current settings module"""
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [str(settings.BASE_DIR), env.get('PYTHONPATH')]))
+    env['DJANGO_SETTINGS_MODULE'] = settings.SETTINGS_MODULE
+    command = [sys.executable, *(['-X', 'importtime'] if importtime else []), '-c', BOOTSTRAP]
+    result = subprocess.run(command, cwd=settings.BASE_DIR, env=env, capture_output=True, text=True)
+    if result.returncode:
+        raise RuntimeError(f'worker start-up failed:\n{result.stderr[-2000:]}')
+    data = json.loads(result.stdout.splitlines()[-1])
+    return StartupProfile(data['phases'], set(data['modules']),
+                          parse_importtime(result.stderr) if importtime else [])
+
+
+def group(module, app_modules):
+    """The installed app a module belongs to, else its top level package"""
+    for app_module in app_modules:
+        if module == app_module or module.startswith(f'{app_module}.'):
+            return app_module
+    top = module.split('.')[0]
+    return 'django (core)' if top == 'django' else top
+
+
+def by_group(imports):
+    """Milliseconds of import time per installed app (and other top level package), slowest first"""
+    from django.apps import apps
+
+    # the longest first, so that django.contrib.admin is not counted as django
+    app_modules = sorted((config.name for config in apps.get_app_configs()), key=len, reverse=True)
+    totals = {}
+    for module, self_us, _ in imports:
+        name = group(module, app_modules)
+        totals[name] = totals.get(name, 0) + self_us / 1000
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)
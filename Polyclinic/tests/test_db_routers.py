@@ -0,0 +1,40 @@
+from django.core.signals import request_started
+from django.test import SimpleTestCase, override_settings
+
+from Doctor.models import Doctor
+from Patient.models import Record
+from Polyclinic.db_routers import ReplicaRouter
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'], DATABASE_REPLICA_MODELS=['Patient.Record'])
+class ReplicaRouterTest(SimpleTestCase):
+
+    def setUp(self):
+        self.router = ReplicaRouter()
+        request_started.send(sender=self.__class__)
+
+    def test_record_reads_go_to_a_replica(self):
+        self.assertEqual(self.router.db_for_read(Record), 'replica1')
+
+    def test_other_reads_stay_on_the_primary(self):
+        self.assertIsNone(self.router.db_for_read(Doctor))
+
+    def test_writes_go_to_the_primary(self):
+        self.assertEqual(self.router.db_for_write(Record), 'default')
+
+    def test_reads_after_a_write_stay_on_the_primary(self):
+        self.router.db_for_write(Doctor)
+        self.assertIsNone(self.router.db_for_read(Record))
+
+    def test_next_request_reads_from_a_replica_again(self):
+        self.router.db_for_write(Record)
+        request_started.send(sender=self.__class__)
+        self.assertEqual(self.router.db_for_read(Record), 'replica1')
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_without_replicas(self):
+        self.assertIsNone(self.router.db_for_read(Record))
+
+    def test_migrations_only_on_the_primary(self):
+        self.assertTrue(self.router.allow_migrate('default', 'Patient'))
+        self.assertFalse(self.router.allow_migrate('replica1', 'Patient'))
@@ -0,0 +1,109 @@
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from rest_framework.test import APIClient
+
+from Patient.models import CustomUser
+from Polyclinic.profiling import ProfilingMiddleware, metrics_registry
+
+
+def create_user(number, **extra):
+    return CustomUser.objects.create(
+        username=f"user{number}", first_name="John", last_name="Doe", phone_number=f"123456789{number}",
+        email=f"user{number}@example.com", gender="Male", birth_date="1990-01-01", **extra)
+
+
+PROFILING = {'ENABLED': True, 'SERVER_TIMING': True, 'METRICS_TOKEN': 'secret'}
+
+
+@override_settings(PROFILING=PROFILING)
+class ProfilingMiddlewareTest(TestCase):
+
+    def setUp(self):
+        metrics_registry.clear()
+        self.users = [create_user(number) for number in range(6)]
+
+    def profile(self, view):
+        request = RequestFactory().get('/profiled/')
+        request.resolver_match = None
+        return ProfilingMiddleware(view)(request)
+
+    def test_server_timing_counts_queries(self):
+        def view(request):
+            list(CustomUser.objects.all())
+            CustomUser.objects.count()
+            return HttpResponse()
+
+        timing = self.profile(view)['Server-Timing']
+        self.assertIn('desc="2 queries"', timing)
+        self.assertIn('total;dur=', timing)
+        self.assertNotIn('n-plus-one', timing)
+
+    def test_repeated_selects_are_flagged(self):
+        def view(request):
+            for user in self.users:
+                CustomUser.objects.filter(pk=user.pk).exists()
+            return HttpResponse()
+
+        with self.assertLogs('Polyclinic.profiling', 'WARNING') as logs:
+            timing = self.profile(view)['Server-Timing']
+        self.assertIn('n-plus-one;desc="1 statements, up to 6x"', timing)
+        self.assertIn('N+1 query executed 6 times by GET /profiled/', logs.output[0])
+
+    @override_settings(PROFILING={**PROFILING, 'SERVER_TIMING': False})
+    def test_server_timing_can_be_disabled(self):
+        self.assertFalse(self.profile(lambda request: HttpResponse()).has_header('Server-Timing'))
+
+    @override_settings(PROFILING={})
+    def test_disabled_by_default(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            ProfilingMiddleware(lambda request: HttpResponse())
+
+    @override_settings(DECRYPTION_COUNT_HEADER=True)
+    def test_decryptions_are_counted(self):
+        client = APIClient()
+        client.force_authenticate(create_user(9, is_staff=True))
+        response = client.get('/api/v1/patient/search/', {'phone_number': '1234567891'})
+        self.assertIn('decrypt;dur=', response['Server-Timing'])
+        self.assertIn(f'desc="{response["X-Decryption-Count"]} values"', response['Server-Timing'])
+
+    def test_view_serializers_and_rendering_are_timed(self):
+        client = APIClient()
+        client.force_authenticate(create_user(9, is_staff=True))
+        client.get('/api/v1/patient/search/', {'phone_number': '1234567891'})
+        text = self.client.get('/metrics/', headers={'Authorization': 'Bearer secret'}).content.decode()
+        for name in ('view', 'serialize', 'render'):
+            line = next(line for line in text.splitlines()
+                        if line.startswith(f'polyclinic_{name}_seconds_total{{method="GET",view="patient-search"'))
+            self.assertGreater(float(line.split()[-1]), 0)
+
+
+@override_settings(PROFILING=PROFILING)
+class MetricsTest(TestCase):
+
+    def setUp(self):
+        metrics_registry.clear()
+
+    def test_staff_only(self):
+        self.assertEqual(self.client.get('/metrics/').status_code, 403)
+
+    def test_bearer_token(self):
+        self.assertEqual(self.client.get('/metrics/', headers={'Authorization': 'Bearer wrong'}).status_code, 403)
+        response = self.client.get('/metrics/', headers={'Authorization': 'Bearer secret'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+
+    def test_requests_are_summed_per_view(self):
+        self.client.get('/metrics/')
+        self.client.get('/metrics/')
+        text = self.client.get('/metrics/', headers={'Authorization': 'Bearer secret'}).content.decode()
+        self.assertIn('polyclinic_requests_total{method="GET",view="metrics"} 2', text)
+        self.assertIn('polyclinic_request_duration_seconds_count{method="GET",view="metrics"} 2', text)
+        self.assertIn('# TYPE polyclinic_db_queries_total counter', text)
+
+    def test_unknown_methods_share_one_label(self):
+        for method in ('PROPFIND', 'BREW'):
+            self.client.generic(method, '/metrics/')
+        text = self.client.get('/metrics/', headers={'Authorization': 'Bearer secret'}).content.decode()
+        self.assertIn('polyclinic_requests_total{method="OTHER",view="metrics"} 2', text)
+        self.assertNotIn('BREW', text)
@@ -0,0 +1,70 @@
+import uuid
+from datetime import date, datetime, time, timedelta, timezone
+from decimal import Decimal
+from io import BytesIO
+from unittest import mock, skipIf
+
+from django.test import SimpleTestCase
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from Polyclinic import renderers
+from Polyclinic.renderers import ORJSONParser, ORJSONRenderer
+
+DATA = {
+    'id': uuid.UUID('7d5d9c3e-7c57-4a8e-9a4a-0f8a2c4b1e2d'),
+    'text': 'Łódź \u2028\u2029 "quoted"',
+    'created_at': datetime(2024, 5, 1, 12, 30, 15, 123456, tzinfo=timezone.utc),
+    'naive': datetime(2024, 5, 1, 12, 30),
+    'date': date(2024, 5, 1),
+    'time': time(8, 15, 30, 250000),
+    'duration': timedelta(hours=1),
+    'amount': Decimal('12.50'),
+    'lazy': gettext_lazy('Not found.'),
+    'nested': [{'a': None, 'b': True, 'c': 1.5}, ('x', 2)],
+    'set': {3},
+}
+
+
+@skipIf(renderers.orjson is None, "orjson is not installed")
+class ORJSONRendererTest(SimpleTestCase):
+
+    def test_same_bytes_as_json_renderer(self):
+        self.assertEqual(ORJSONRenderer().render(DATA), JSONRenderer().render(DATA))
+
+    def test_keys_other_than_strings(self):
+        data = {1: 'one', None: 'none'}
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_indent(self):
+        for media_type in ('application/json; indent=2', 'application/json; indent=4'):
+            self.assertEqual(ORJSONRenderer().render(DATA, media_type), JSONRenderer().render(DATA, media_type))
+
+    def test_none(self):
+        self.assertEqual(ORJSONRenderer().render(None), b'')
+
+    def test_without_orjson(self):
+        with mock.patch.object(renderers, 'orjson', None):
+            self.assertEqual(ORJSONRenderer().render(DATA), JSONRenderer().render(DATA))
+
+
+@skipIf(renderers.orjson is None, "orjson is not installed")
+class ORJSONParserTest(SimpleTestCase):
+
+    def parse(self, parser, content, encoding='utf-8'):
+        return parser.parse(BytesIO(content), 'application/json', {'encoding': encoding})
+
+    def test_same_data_as_json_parser(self):
+        content = '{"name": "Łódź", "values": [1, 2.5, null, true], "nested": {"a": "\\u2028"}}'.encode()
+        self.assertEqual(self.parse(ORJSONParser(), content), self.parse(JSONParser(), content))
+
+    def test_other_encoding(self):
+        content = '{"name": "Łódź"}'.encode('utf-16')
+        self.assertEqual(self.parse(ORJSONParser(), content, 'utf-16'), {'name': 'Łódź'})
+
+    def test_invalid(self):
+        for content in (b'{"name": ', b'{"value": NaN}'):
+            with self.assertRaises(ParseError):
+                self.parse(ORJSONParser(), content)
@@ -0,0 +1,55 @@
+import gzip
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import SimpleTestCase, override_settings
+
+from Polyclinic import schema
+
+
+class PrecomputedSchemaTest(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        settings = override_settings(OPENAPI_SCHEMA_DIR=directory, DEBUG=False)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.directory = directory
+
+    def test_rendered_once_without_files(self):
+        with mock.patch.object(schema, 'render', wraps=schema.render) as render:
+            first = self.client.get('/api/schema/')
+            second = self.client.get('/api/schema/?format=json')
+        self.assertEqual(render.call_count, 1)
+        self.assertEqual(first.status_code, 200)
+        self.assertTrue(first.content.startswith(b'openapi:'))
+        self.assertEqual(second.json()['openapi'][:2], '3.')
+
+    def test_serves_the_precomputed_files(self):
+        call_command('precompute_schema', stdout=StringIO())
+        self.assertTrue(os.path.exists(os.path.join(self.directory, 'schema.json.gz')))
+        with mock.patch.object(schema, 'render') as render:
+            response = self.client.get('/api/schema/', HTTP_ACCEPT_ENCODING='gzip', HTTP_ACCEPT='application/json')
+        render.assert_not_called()
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        with open(os.path.join(self.directory, 'schema.json'), 'rb') as file:
+            self.assertEqual(gzip.decompress(response.content), file.read())
+
+    def test_revalidation(self):
+        etag = self.client.get('/api/schema/')['ETag']
+        self.assertEqual(self.client.get('/api/schema/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        gzipped = self.client.get('/api/schema/', HTTP_ACCEPT_ENCODING='gzip')
+        # another representation, with its own strong ETag
+        self.assertNotEqual(gzipped['ETag'], etag)
+        self.assertEqual(self.client.get('/api/schema/', HTTP_ACCEPT_ENCODING='gzip',
+                                         HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_accepted_encodings(self):
+        self.assertEqual(schema.accepted_encodings('gzip;q=0, br, deflate;q=0.5'), {'br', 'deflate'})
+        self.assertEqual(schema.accepted_encodings(''), set())
@@ -0,0 +1,33 @@
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+from Polyclinic.startup import LAZY_MODULES, group, measure
+
+
+class ColdStartTest(SimpleTestCase):
+
+    def test_phases(self):
+        # the STARTUP_TARGET_MS budget is checked by manage.py profile_startup, not on every test machine
+        profile = measure()
+        self.assertEqual(list(profile.phases), ['settings', 'apps', 'urls', 'middleware'])
+        self.assertGreater(profile.total, 0)
+
+    def test_lazy_modules_are_not_imported(self):
+        self.assertEqual(sorted(set(LAZY_MODULES) & measure().modules), [])
+
+    def test_group(self):
+        app_modules = ['django.contrib.admin', 'Patient']
+        self.assertEqual(group('django.contrib.admin.options', app_modules), 'django.contrib.admin')
+        self.assertEqual(group('django.db.models', app_modules), 'django (core)')
+        self.assertEqual(group('yaml.loader', app_modules), 'yaml')
+
+
+class LazyUrlsTest(TestCase):
+
+    def test_admin(self):
+        self.assertEqual(reverse('admin:index'), '/admin/')
+        self.assertEqual(self.client.get('/admin/login/').status_code, 200)
+
+    def test_schema_ui(self):
+        self.assertEqual(self.client.get('/api/schema/swagger-ui/').status_code, 200)
+        self.assertEqual(self.client.get('/api/schema/redoc/').status_code, 200)
@@ -14,20 +14,36 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
-from django.contrib import admin
 from django.urls import path, include
-from drf_spectacular.views import SpectacularAPIView, SpectacularRedocView, SpectacularSwaggerView
 import Patient.urls
 import Doctor.urls
+import Appointment.urls
+import Audit.urls
+import Doctor.async_urls
+import Patient.async_urls
+from Polyclinic.profiling import metrics
+from Polyclinic.lazy import lazy_include, lazy_view
 urlpatterns = [
-    path('admin/', admin.site.urls),
+    # Imported on first use, to keep them out of worker start-up
+    lazy_include('admin/', 'Polyclinic.admin_urls', namespace='admin'),
     path('api/v1/patient/', include(Patient.urls)),
     path('api/v1/doctor/', include(Doctor.urls)),
+    path('api/v1/appointment/', include(Appointment.urls)),
+    path('api/v1/audit/', include(Audit.urls)),
+
+    # Async views, for ASGI deployments
+    path('api/v1/async/patient/', include(Patient.async_urls)),
+    path('api/v1/async/doctor/', include(Doctor.async_urls)),
+
+    # Prometheus metrics
+    path('metrics/', metrics, name='metrics'),
 
     # Schema
-    path('api/schema/', SpectacularAPIView.as_view(), name='schema'),
+    path('api/schema/', lazy_view('Polyclinic.schema.PrecomputedSchemaView'), name='schema'),
 
     # Optional UI:
-    path('api/schema/swagger-ui/', SpectacularSwaggerView.as_view(url_name='schema'), name='swagger-ui'),
-    path('api/schema/redoc/', SpectacularRedocView.as_view(url_name='schema'), name='redoc'),
+    path('api/schema/swagger-ui/', lazy_view('drf_spectacular.views.SpectacularSwaggerView', url_name='schema'),
+         name='swagger-ui'),
+    path('api/schema/redoc/', lazy_view('drf_spectacular.views.SpectacularRedocView', url_name='schema'),
+         name='redoc'),
 ]
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Polyclinic.settings')
 
 application = get_wsgi_application()
+
+# each worker writes its audit log from a thread, see Audit.log
+from Audit.log import start_background_flush  # noqa: E402
+
+start_background_flush()
@@ -0,0 +1,94 @@
+"""
+Benchmarks and load tests
+
+Run from the project root, e.g.
+
+    python -m benchmarks.bench_booking
+
+By default they run against a throwaway SQLite database (see
+`benchmarks.settings`); set BENCH_DB=postgres to use the database configured
+in env_file/ instead (it is flushed first).
+
+`python -m benchmarks.run` runs the regression suite and writes its results
+as JSON, which `python -m benchmarks.compare` compares between two commits.
+"""
+import json
+import os
+import platform
+import subprocess
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+# (title, label, value, unit) of every reported row, see write_results()
+RESULTS = []
+
+
+def setup():
+    """Configure Django and create the schema of a fresh benchmark database"""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+    import django
+    from django.conf import settings
+    from django.core.management import call_command
+    from django.db import connections
+
+    database = settings.DATABASES['default']
+    # benchmarks run one after another start from an empty database each
+    connections.close_all()
+    if database['ENGINE'] == 'django.db.backends.sqlite3' and os.path.exists(database['NAME']):
+        os.remove(database['NAME'])
+    django.setup()
+    call_command('migrate', run_syncdb=True, verbosity=0)
+    if database['ENGINE'] != 'django.db.backends.sqlite3':
+        call_command('flush', interactive=False, verbosity=0)
+
+
+@contextmanager
+def timer(results, name):
+    """Store the elapsed wall time of the block in results[name], in seconds"""
+    start = time.perf_counter()
+    yield
+    results[name] = time.perf_counter() - start
+
+
+def report(title, rows, unit=None):
+    """
+       Print (label, value) rows as an aligned table
+       Rows with a `unit` are also kept for write_results(); units per second count as higher is better
+    """
+    print(title)
+    width = max(len(label) for label, _ in rows)
+    for label, value in rows:
+        RESULTS.append({'title': title, 'label': label, 'value': value, 'unit': unit})
+        if isinstance(value, float):
+            value = f'{value:,.2f}'
+        print(f'  {label:<{width}}  {value}')
+
+
+def _git(*args):
+    try:
+        return subprocess.run(['git', *args], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def write_results(path, parameters):
+    """Write the reported rows with the commit and environment they were measured in"""
+    import django
+    from django.db import connection
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w') as file:
+        json.dump({
+            'commit': _git('rev-parse', 'HEAD'),
+            'dirty': bool(_git('status', '--porcelain', '--untracked-files=no')),
+            'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'machine': f'{platform.machine()}, {os.cpu_count()} CPUs',
+            'parameters': parameters,
+            'results': [row for row in RESULTS if row['unit']],
+        }, file, indent=2)
@@ -0,0 +1,110 @@
+"""
+Blood type distribution: decrypting the patients table against the category counters
+
+    python -m benchmarks.bench_aggregates --rows 20000 --workers 4
+
+Also times single patient creates with the counters against bulk_create, which
+skips them, and the `rebuild_aggregates` recount.
+"""
+import argparse
+import os
+import random
+import time
+from collections import Counter
+from io import StringIO
+
+from . import report, setup
+
+BLOOD_TYPES = ['O+', 'O-', 'A+', 'A-', 'B+', 'B-', 'AB+', 'AB-']
+CITIES = ['Kyiv', 'Lviv', 'Odesa', 'Dnipro', 'Kharkiv']
+
+
+def build(number):
+    from Patient.models import CustomUser, Patient
+
+    user = CustomUser(username=f'patient{number}', first_name='John', last_name='Doe', phone_number=f'{number:010d}',
+                      email=f'patient{number}@example.com', gender=random.choice(['Male', 'Woman']),
+                      birth_date='1990-01-01')
+    patient = Patient(user=user, region='Region', neighborhood='Neighborhood', city=random.choice(CITIES),
+                      allergy='None', blood_type=random.choice(BLOOD_TYPES), medical_insurance_number=f'INS{number}')
+    return user, patient
+
+
+def create_patients(rows, batch_size=5000):
+    from Patient.models import CustomUser, Patient
+
+    for offset in range(0, rows, batch_size):
+        built = [build(number) for number in range(offset, min(rows, offset + batch_size))]
+        CustomUser.objects.bulk_create(user for user, _ in built)
+        Patient.objects.bulk_create(patient for _, patient in built)
+
+
+def decrypted_distribution():
+    from Patient.models import Patient
+
+    return Counter(patient.blood_type for patient in Patient.objects.only('blood_type').iterator(chunk_size=2000))
+
+
+def run(rows, workers, sample):
+    from django.core.management import call_command
+
+    from Patient import aggregates
+
+    create_patients(rows)
+    rebuilds = {}
+    for count in sorted({0, workers}):
+        started = time.perf_counter()
+        call_command('rebuild_aggregates', workers=count, stdout=StringIO())
+        rebuilds[count] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    expected = decrypted_distribution()
+    decrypting = time.perf_counter() - started
+    started = time.perf_counter()
+    for _ in range(100):
+        counted = aggregates.distribution('blood_type')
+    counters = (time.perf_counter() - started) / 100
+    assert counted == dict(expected), (counted, expected)
+    report(f'Blood type distribution of {rows} patients, ms', [
+        ('decrypting the table', decrypting * 1000),
+        ('category counters', counters * 1000),
+        *((f'rebuild_aggregates, {count} workers', seconds * 1000) for count, seconds in rebuilds.items()),
+    ])
+
+    report(f'Creating a user and a patient, ms ({sample} pairs)', [
+        ('without counters', creates(rows, sample, counted=False)),
+        ('with counters', creates(rows + sample, sample, counted=True)),
+    ])
+
+
+def creates(first, sample, counted):
+    """Milliseconds per user and patient created with save()"""
+    from Patient.models import CustomUser, Patient
+
+    built = [build(first + number) for number in range(sample)]
+    saved = {model: model.counted_fields for model in (CustomUser, Patient)}
+    if not counted:
+        CustomUser.counted_fields = Patient.counted_fields = ()
+    try:
+        started = time.perf_counter()
+        for user, patient in built:
+            user.save()
+            patient.save()
+        return (time.perf_counter() - started) / sample * 1000
+    finally:
+        for model, fields in saved.items():
+            model.counted_fields = fields
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--sample', type=int, default=500)
+    args = parser.parse_args()
+    setup()
+    run(args.rows, args.workers, args.sample)
+
+
+if __name__ == '__main__':
+    main()
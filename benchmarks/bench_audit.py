@@ -0,0 +1,71 @@
+"""
+Access logging of the record timeline: a synchronous INSERT per read against the write-behind buffer
+
+    python -m benchmarks.bench_audit --requests 500 --page-size 50
+
+Each mode serves the same pages of a patient's records to a doctor. The
+write-behind buffer runs as under a server, written by its background thread.
+"""
+import argparse
+import time
+from unittest import mock
+
+from . import report, setup
+from .bench_timeline import create_records
+
+
+def synchronous(request, instances, action='read'):
+    from Audit import log
+
+    for event in log.events(request, instances, action):
+        event.save()
+
+
+def milliseconds(client, url, requests):
+    start = time.perf_counter()
+    for _ in range(requests):
+        response = client.get(url)
+        assert response.status_code == 200, response.status_code
+    return (time.perf_counter() - start) / requests * 1000
+
+
+def run(requests, page_size):
+    from rest_framework.test import APIClient
+
+    from Audit import log
+    from Audit.models import AccessEvent
+    from Doctor.models import Doctor
+
+    patient = create_records(page_size * 4)
+    client = APIClient()
+    client.force_authenticate(Doctor.objects.get().user)
+    url = f'/api/v1/patient/{patient.pk}/records/?page_size={page_size}'
+    milliseconds(client, url, 20)
+
+    rows = []
+    with mock.patch.object(log, 'record'):
+        rows.append(('not logged', milliseconds(client, url, requests)))
+    with mock.patch.object(log, 'record', synchronous):
+        rows.append(('INSERT per event', milliseconds(client, url, requests)))
+    log.start_background_flush()
+    rows.append(('write-behind buffer', milliseconds(client, url, requests)))
+    started = time.perf_counter()
+    log.buffer.flush()
+    rows.append(('(final write of the buffer)', (time.perf_counter() - started) * 1000))
+    report(f'Record timeline page of {page_size} records, ms per request', rows)
+
+    expected = (20 + 2 * requests) * page_size
+    assert AccessEvent.objects.count() == expected, (AccessEvent.objects.count(), expected)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--page-size', type=int, default=50)
+    args = parser.parse_args()
+    setup()
+    run(args.requests, args.page_size)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+Per-request authentication latency: TokenAuthentication against CachedTokenAuthentication
+
+    python -m benchmarks.bench_auth --requests 2000 --users 100
+"""
+import argparse
+import time
+
+from . import report, setup
+
+
+def create_tokens(users):
+    from rest_framework.authtoken.models import Token
+
+    from Patient.models import CustomUser
+
+    users = CustomUser.objects.bulk_create(
+        CustomUser(username=f'patient{number}', first_name='John', last_name='Doe', phone_number=f'{number:010d}',
+                   email=f'patient{number}@example.com', gender='Male', birth_date='1990-01-01', is_active=True)
+        for number in range(users)
+    )
+    return [Token.objects.create(user=user).key for user in users]
+
+
+def microseconds_per_request(authentication, keys, requests):
+    from rest_framework.request import Request
+    from rest_framework.test import APIRequestFactory
+
+    factory = APIRequestFactory()
+    wsgi_requests = [factory.get('/', HTTP_AUTHORIZATION=f'Token {key}') for key in keys]
+    start = time.perf_counter()
+    for number in range(requests):
+        request = Request(wsgi_requests[number % len(wsgi_requests)], authenticators=[authentication])
+        assert request.user.is_authenticated
+    return (time.perf_counter() - start) / requests * 1e6
+
+
+def run(requests, users):
+    from rest_framework.authentication import TokenAuthentication
+
+    from Patient.authentication import CachedTokenAuthentication, get_token_cache
+
+    keys = create_tokens(users)
+    plain = microseconds_per_request(TokenAuthentication(), keys, requests)
+    get_token_cache().clear()
+    cold = microseconds_per_request(CachedTokenAuthentication(), keys, len(keys))
+    warm = microseconds_per_request(CachedTokenAuthentication(), keys, requests)
+    report(f'Token authentication, µs/request ({users} tokens)', [
+        ('TokenAuthentication', plain),
+        ('cached, cache misses', cold),
+        ('cached, cache hits', warm),
+        ('saving per request', plain - warm),
+    ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--users', type=int, default=100)
+    args = parser.parse_args()
+    setup()
+    run(args.requests, args.users)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""
+Concurrent booking load test
+
+Many patients race for the first slots of one popular doctor. Afterwards
+every slot must be held by at most one active appointment.
+
+    python -m benchmarks.bench_booking --patients 500 --threads 32 --slots 8
+"""
+import argparse
+import random
+import sys
+import threading
+from collections import Counter
+from datetime import datetime, time, timedelta
+
+from . import report, setup, timer
+
+
+def create_fixtures(patient_count):
+    from django.utils import timezone
+
+    from Doctor.models import Doctor, OpeningHours
+    from Patient.models import CustomUser, Patient
+
+    doctor_user = CustomUser.objects.create(username='doctor', first_name='Popular', last_name='Doctor',
+                                            phone_number='1000000000', email='doctor@example.com',
+                                            gender='Male', birth_date='1970-01-01')
+    doctor = Doctor.objects.create(user=doctor_user, specialty='Cardiology', phone_general='1', cabinet='1')
+    OpeningHours.objects.create(weekday=1, open_hour=time(8, 0), close_hour=time(16, 0), doctor=doctor)
+
+    users = CustomUser.objects.bulk_create(
+        CustomUser(username=f'patient{number}', first_name='Test', last_name='Patient',
+                   phone_number=f'2{number:09d}', email=f'patient{number}@example.com',
+                   gender='Woman', birth_date='1990-01-01')
+        for number in range(patient_count)
+    )
+    patients = Patient.objects.bulk_create(
+        Patient(user=user, region='Region', neighborhood='Neighborhood', city='City',
+                allergy='None', blood_type='O+')
+        for user in users
+    )
+    today = timezone.localdate()
+    next_monday = today + timedelta(days=7 - today.weekday())
+    first_slot = timezone.make_aware(datetime.combine(next_monday, time(8, 0)))
+    return doctor, patients, first_slot
+
+
+def run(patients, threads, slots):
+    from django.db import connection
+
+    from Appointment import booking
+    from Appointment.models import Appointment
+    from Doctor.availability import slot_minutes
+
+    doctor, patients, first_slot = create_fixtures(patients)
+    candidates = [first_slot + timedelta(minutes=slot_minutes() * number) for number in range(slots)]
+    outcome = Counter()
+    lock = threading.Lock()
+    queue = list(patients)
+
+    def worker():
+        try:
+            while True:
+                with lock:
+                    if not queue:
+                        return
+                    patient = queue.pop()
+                try:
+                    booking.hold(patient, doctor.pk, random.choice(candidates))
+                    result = 'booked'
+                except booking.SlotUnavailable:
+                    result = 'conflict'
+                with lock:
+                    outcome[result] += 1
+        finally:
+            connection.close()
+
+    timings = {}
+    with timer(timings, 'total'):
+        pool = [threading.Thread(target=worker) for _ in range(threads)]
+        for thread in pool:
+            thread.start()
+        for thread in pool:
+            thread.join()
+
+    per_slot = Counter(Appointment.objects.active().filter(doctor=doctor).values_list('start_at', flat=True))
+    double_booked = sum(1 for count in per_slot.values() if count > 1)
+    attempts = outcome['booked'] + outcome['conflict']
+    report('Booking under contention', [
+        ('attempts', attempts),
+        ('booked', outcome['booked']),
+        ('conflicts', outcome['conflict']),
+        ('double-booked slots', double_booked),
+        ('seconds', timings['total']),
+        ('attempts/sec', attempts / timings['total']),
+        ('bookings/sec', outcome['booked'] / timings['total']),
+    ])
+    return double_booked == 0 and outcome['booked'] == len(per_slot) <= slots
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--patients', type=int, default=200)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--slots', type=int, default=8, help="number of contended slots")
+    args = parser.parse_args()
+    setup()
+    if not run(args.patients, args.threads, args.slots):
+        print('FAILED: a slot was booked more than once')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
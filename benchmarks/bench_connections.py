@@ -0,0 +1,61 @@
+"""
+Per-request database overhead: a new connection per request against persistent connections
+
+Each simulated request runs one query between the request_started and
+request_finished signals, which open and close connections as in a server.
+Connecting is cheap with SQLite; run it with BENCH_DB=postgres to measure the
+TCP, TLS and authentication round trips that CONN_MAX_AGE (or DB_POOL=1) saves.
+
+    BENCH_DB=postgres python -m benchmarks.bench_connections --requests 500
+"""
+import argparse
+import time
+
+from . import report, setup
+
+
+def milliseconds_per_request(requests, conn_max_age):
+    from django.core.signals import request_finished, request_started
+    from django.db import connection
+
+    from Patient.models import Record
+
+    connection.close()
+    connection.settings_dict['CONN_MAX_AGE'] = conn_max_age
+    start = time.perf_counter()
+    for _ in range(requests):
+        request_started.send(sender=None)
+        Record.objects.exists()
+        request_finished.send(sender=None)
+    return (time.perf_counter() - start) / requests * 1e3
+
+
+def run(requests):
+    from django.db import connection
+
+    if connection.settings_dict.get('OPTIONS', {}).get('pool'):
+        # the pool hands out its connections whatever CONN_MAX_AGE is, so there is nothing to compare with
+        report(f'Per-request database overhead, ms/request ({connection.vendor})', [
+            ('DB_POOL=1', milliseconds_per_request(requests, 0)),
+        ])
+        return
+    conn_max_age = connection.settings_dict.get('CONN_MAX_AGE') or 60
+    fresh = milliseconds_per_request(requests, 0)
+    reused = milliseconds_per_request(requests, conn_max_age)
+    report(f'Per-request database overhead, ms/request ({connection.vendor})', [
+        ('new connection per request', fresh),
+        (f'CONN_MAX_AGE={conn_max_age}', reused),
+        ('saving per request', fresh - reused),
+    ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=500)
+    args = parser.parse_args()
+    setup()
+    run(args.requests)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+"""
+Create, read, update and list throughput of the encrypted models at growing table sizes
+
+Every model gets `size` rows (bulk created, which is measured too), then
+`--sample` single creates, reads (with every column decrypted), updates of an
+encrypted column and pages of 100 rows are timed.
+
+    python -m benchmarks.bench_crud --sizes 1000,100000,1000000 --sample 200
+"""
+import argparse
+import time
+import warnings
+from datetime import datetime, time as clock, timedelta, timezone
+
+from . import report, setup
+
+CHUNK = 5000
+PAGE = 100
+# numbers of the rows created one by one, apart from those of the bulk created rows
+SAMPLE_NUMBERS = 9_000_000_000
+START = datetime(2030, 1, 1, tzinfo=timezone.utc)
+
+# SQLite stores (and so encrypts) datetimes without their offset, saving them back warns
+warnings.filterwarnings('ignore', r'DateTimeField .* received a naive datetime', RuntimeWarning)
+
+
+def build(model_name, number, users, doctors, patients):
+    """An unsaved row of the model; `users`, `doctors` and `patients` map numbers to the pks of saved rows"""
+    from Doctor.models import Doctor, OpeningHours
+    from Patient.models import CustomUser, Patient, Record
+
+    if model_name == 'CustomUser':
+        return CustomUser(username=f'user{number}', first_name='John', last_name=f'Doe{number}',
+                          phone_number=f'{number:010d}', email=f'user{number}@example.com', gender='Male',
+                          birth_date='1990-01-01')
+    if model_name == 'Patient':
+        return Patient(user_id=users[number], region='Region', neighborhood='Neighborhood', city='City',
+                       street='Street', house='1', apartment='2', allergy='None', blood_type='O+',
+                       medical_insurance_number=f'INS{number}')
+    if model_name == 'Doctor':
+        return Doctor(user_id=users[number], specialty='Cardiology', phone_general=f'{number}', cabinet='101')
+    if model_name == 'OpeningHours':
+        return OpeningHours(doctor_id=doctors[number], weekday=number % 7 + 1, open_hour=clock(9), close_hour=clock(17))
+    created_at = START - timedelta(seconds=number % 10**9)
+    # written by the doctor of another number, never by the patient
+    return Record(doctor_autohor_id=doctors.get(number - 1) or doctors[number + 1], patient_id=patients[number],
+                  description=f'Visit {number}', created_at=created_at, timeline_key=created_at)
+
+
+MODELS = ['CustomUser', 'Patient', 'Doctor', 'OpeningHours', 'Record']
+# the models other rows refer to, with their argument of build()
+REFERENCED = {'CustomUser': 'users', 'Doctor': 'doctors', 'Patient': 'patients'}
+UPDATES = {
+    'CustomUser': ('first_name', 'Jane'),
+    'Patient': ('city', 'Town'),
+    'Doctor': ('cabinet', '102'),
+    'OpeningHours': ('close_hour', clock(18)),
+    'Record': ('description', 'Follow-up'),
+}
+
+
+def model(model_name):
+    from django.apps import apps
+
+    return apps.get_model('Doctor' if model_name in ('Doctor', 'OpeningHours') else 'Patient', model_name)
+
+
+def touch(instance):
+    """Read every column, which decrypts the encrypted ones"""
+    for field in instance._meta.concrete_fields:
+        getattr(instance, field.attname)
+
+
+def fill(start, stop):
+    """Bulk create the rows numbered start..stop of every model; returns the rows per second of each"""
+    seconds = dict.fromkeys(MODELS, 0.0)
+    refs = {key: {} for key in REFERENCED.values()}
+    for chunk_start in range(start, stop, CHUNK):
+        numbers = range(chunk_start, min(chunk_start + CHUNK, stop))
+        # only the previous number is referred to across chunks
+        refs = {key: {chunk_start - 1: pks[chunk_start - 1]} if chunk_start - 1 in pks else {}
+                for key, pks in refs.items()}
+        for model_name in MODELS:
+            started = time.perf_counter()
+            rows = model(model_name).objects.bulk_create([build(model_name, number, **refs) for number in numbers])
+            seconds[model_name] += time.perf_counter() - started
+            if model_name in REFERENCED:
+                refs[REFERENCED[model_name]].update(zip(numbers, (row.pk for row in rows)))
+    return {model_name: (stop - start) / elapsed for model_name, elapsed in seconds.items()}
+
+
+def measure(first, sample):
+    """Operations per second of single creates, reads, updates and pages of every model"""
+    refs = {key: {} for key in REFERENCED.values()}
+    results = {}
+    for model_name in MODELS:
+        model_class = model(model_name)
+        numbers = range(first, first + sample)
+        instances = [build(model_name, number, **refs) for number in numbers]
+        started = time.perf_counter()
+        for instance in instances:
+            instance.save()
+        create = sample / (time.perf_counter() - started)
+        if model_name in REFERENCED:
+            refs[REFERENCED[model_name]].update(zip(numbers, (instance.pk for instance in instances)))
+
+        pks = list(model_class.objects.order_by('?').values_list('pk', flat=True)[:sample])
+        started = time.perf_counter()
+        loaded = []
+        for pk in pks:
+            instance = model_class.objects.get(pk=pk)
+            touch(instance)
+            loaded.append(instance)
+        read = len(pks) / (time.perf_counter() - started)
+
+        name, value = UPDATES[model_name]
+        started = time.perf_counter()
+        for instance in loaded:
+            setattr(instance, name, value)
+            instance.save()
+        update = len(loaded) / (time.perf_counter() - started)
+
+        started = time.perf_counter()
+        rows = 0
+        for pk in pks:
+            for instance in model_class.objects.filter(pk__gte=pk).order_by('pk')[:PAGE]:
+                touch(instance)
+                rows += 1
+        listed = rows / (time.perf_counter() - started)
+        results[model_name] = create, read, update, listed
+    return results
+
+
+def run(sizes, sample):
+    current = 0
+    for number, size in enumerate(sizes):
+        bulk = fill(current, size)
+        current = size
+        measured = measure(SAMPLE_NUMBERS + number * sample, sample)
+        for model_name in MODELS:
+            create, read, update, listed = measured[model_name]
+            report(f'{model_name}, {size:,} rows, operations/s', [
+                ('bulk create (rows)', bulk[model_name]),
+                ('create', create),
+                ('read', read),
+                ('update', update),
+                (f'list, pages of {PAGE} (rows)', listed),
+            ], unit='ops/s')
+
+
+def sizes(value):
+    sizes = sorted(int(size) for size in value.split(','))
+    if sizes[0] < 2:
+        raise argparse.ArgumentTypeError('sizes start at 2 rows')
+    return sizes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=sizes, default=[1000], help="comma separated table sizes, ascending")
+    parser.add_argument('--sample', type=int, default=200, help="single operations timed per model and size")
+    args = parser.parse_args()
+    if args.sample < 2:
+        parser.error('--sample must be at least 2')
+    setup()
+    run(args.sizes, args.sample)
+
+
+if __name__ == '__main__':
+    main()
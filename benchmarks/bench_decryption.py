@@ -0,0 +1,79 @@
+"""
+List serialization of encrypted patients: per-value against batched decryption
+
+    python -m benchmarks.bench_decryption --rows 500 --repeat 10 --workers 4
+"""
+import argparse
+import time
+
+from . import report, setup
+
+
+def create_patients(rows):
+    from Patient.models import CustomUser, Patient
+
+    users = CustomUser.objects.bulk_create(
+        CustomUser(username=f'patient{number}', first_name='John', last_name='Doe', phone_number=f'{number:010d}',
+                   email=f'patient{number}@example.com', gender='Male', birth_date='1990-01-01')
+        for number in range(rows)
+    )
+    Patient.objects.bulk_create(
+        Patient(user=user, region='Region', neighborhood='Neighborhood', city='City', street='Street',
+                house='1', apartment='2', allergy='None', blood_type='O+', medical_insurance_number=f'INS{number}')
+        for number, user in enumerate(users)
+    )
+
+
+def rows_per_second(serialize, rows, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        serialize()
+    return rows * repeat / (time.perf_counter() - start)
+
+
+def run(rows, repeat, workers):
+    from django.conf import settings
+    from rest_framework import serializers
+
+    from Patient.models import Patient
+    from Patient.serializers import PatientSerializer
+
+    create_patients(rows)
+
+    class PatientSummarySerializer(PatientSerializer):
+        class Meta(PatientSerializer.Meta):
+            fields = ['id', 'user', 'blood_type']
+
+    def plain(serializer_class):
+        return lambda: serializers.ListSerializer(Patient.objects.all(), child=serializer_class()).data
+
+    def batched(serializer_class):
+        return lambda: serializer_class(Patient.objects.all(), many=True).data
+
+    results = [
+        ('per-value, all columns', rows_per_second(plain(PatientSerializer), rows, repeat)),
+        ('batched, all columns', rows_per_second(batched(PatientSerializer), rows, repeat)),
+    ]
+    settings.SECURED_FIELDS_DECRYPT_WORKERS = workers
+    results.append((f'batched, all columns, {workers} threads',
+                    rows_per_second(batched(PatientSerializer), rows, repeat)))
+    settings.SECURED_FIELDS_DECRYPT_WORKERS = 0
+    results += [
+        ('per-value, 1 of 9 columns rendered', rows_per_second(plain(PatientSummarySerializer), rows, repeat)),
+        ('batched, 1 of 9 columns rendered', rows_per_second(batched(PatientSummarySerializer), rows, repeat)),
+    ]
+    report(f'Patient list serialization, rows/sec ({rows} rows per page)', results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+    setup()
+    run(args.rows, args.repeat, args.workers)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+Doctor directory: serializing the doctors per request against the cached snapshot
+
+    python -m benchmarks.bench_directory --doctors 500 --repeat 20
+"""
+import argparse
+import time
+from datetime import time as clock
+
+from . import report, setup
+
+
+def create_doctors(doctors):
+    from Doctor.models import Doctor, OpeningHours
+    from Patient.models import CustomUser
+
+    users = CustomUser.objects.bulk_create(
+        CustomUser(username=f'doctor{number}', first_name='Test', last_name=f'Doctor{number}',
+                   phone_number=f'{number:010d}', email=f'doctor{number}@example.com', gender='Male',
+                   birth_date='1980-01-01')
+        for number in range(doctors)
+    )
+    doctors = Doctor.objects.bulk_create(
+        Doctor(user=user, specialty=f'Specialty{number % 10}', phone_general='1', cabinet=str(number % 50))
+        for number, user in enumerate(users)
+    )
+    OpeningHours.objects.bulk_create(
+        OpeningHours(doctor=doctor, weekday=number % 7 + 1, open_hour=clock(9, 0), close_hour=clock(17, 0))
+        for number, doctor in enumerate(doctors)
+    )
+
+def milliseconds(request, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        response = request()
+    return (time.perf_counter() - start) / repeat * 1000, response
+
+
+def run(doctors, repeat):
+    from django.core.cache import cache
+    from rest_framework.test import APIClient
+
+    from Doctor.models import Doctor
+    from Doctor.serializers import DoctorDirectorySerializer
+
+    create_doctors(doctors)
+    cache.clear()
+    client = APIClient()
+
+    def per_request():
+        queryset = Doctor.objects.select_related('user').prefetch_related('openinghours_set')
+        return DoctorDirectorySerializer(queryset, many=True).data
+
+    naive, _ = milliseconds(per_request, repeat)
+    start = time.perf_counter()
+    response = client.get('/api/v1/doctor/')
+    cold = (time.perf_counter() - start) * 1000
+    warm, response = milliseconds(lambda: client.get('/api/v1/doctor/'), repeat)
+    not_modified, _ = milliseconds(lambda: client.get('/api/v1/doctor/', HTTP_IF_NONE_MATCH=response['ETag']), repeat)
+    report(f'Doctor directory, ms/request ({doctors} doctors)', [
+        ('serialized per request (no HTTP)', naive),
+        ('snapshot, first request', cold),
+        ('snapshot, cached', warm),
+        ('snapshot, 304 Not Modified', not_modified),
+    ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--doctors', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+    setup()
+    run(args.doctors, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
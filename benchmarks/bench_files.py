@@ -0,0 +1,68 @@
+"""
+Peak memory of saving and reading an encrypted file: whole-file against chunked encryption
+
+    python -m benchmarks.bench_files --megabytes 100
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import tracemalloc
+
+from . import report, setup
+
+
+def peak_megabytes(operation):
+    tracemalloc.start()
+    operation()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak / 2 ** 20
+
+
+def run(megabytes):
+    from django.core.files import File
+    from secured_fields.storage import EncryptedFileSystemStorage
+
+    from Patient.storage import ChunkedEncryptedFileSystemStorage
+
+    directory = tempfile.mkdtemp()
+    try:
+        source = os.path.join(directory, 'source.bin')
+        with open(source, 'wb') as file:
+            for _ in range(megabytes):
+                file.write(os.urandom(2 ** 20))
+
+        rows = []
+        for label, storage in [('whole file', EncryptedFileSystemStorage(location=directory)),
+                               ('chunked', ChunkedEncryptedFileSystemStorage(location=directory))]:
+            names = []
+
+            # secured_fields writes the ciphertext back into the uploaded file
+            upload = shutil.copy(source, os.path.join(directory, 'upload.bin'))
+
+            def save():
+                with open(upload, 'r+b') as file:
+                    names.append(storage.save('analysis.bin', File(file)))
+
+            def read():
+                with storage.open(names[0]) as file:
+                    for _ in file.chunks():
+                        pass
+
+            rows += [(f'{label}, save', peak_megabytes(save)), (f'{label}, read', peak_megabytes(read))]
+        report(f'Peak Python memory, MiB ({megabytes} MiB file)', rows)
+    finally:
+        shutil.rmtree(directory)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--megabytes', type=int, default=100)
+    args = parser.parse_args()
+    setup()
+    run(args.megabytes)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+Patient import throughput: per-row save() against the import_patients command
+
+    python -m benchmarks.bench_import --rows 5000 --workers 4
+"""
+import argparse
+import csv
+import os
+import tempfile
+import time
+from io import StringIO
+
+from . import report, setup
+
+COLUMNS = ['username', 'email', 'first_name', 'last_name', 'phone_number', 'gender', 'birth_date', 'region',
+           'neighborhood', 'city', 'allergy', 'blood_type', 'medical_insurance_number']
+
+
+def row(prefix, number):
+    return [f'{prefix}{number}', f'{prefix}{number}@example.com', 'John', f'Doe{number % 100}',
+            f'{number:010d}', 'Male', '1990-01-01', 'Region', 'Neighborhood', 'City', 'None', 'O+',
+            f'{prefix}{number}']
+
+
+def per_row(rows):
+    from Patient.models import CustomUser, Patient
+
+    start = time.perf_counter()
+    for number in range(rows):
+        values = dict(zip(COLUMNS, row('saved', number)))
+        user = CustomUser.objects.create(**{column: values[column] for column in COLUMNS[:7]})
+        Patient.objects.create(user=user, **{column: values[column] for column in COLUMNS[7:]})
+    return rows / (time.perf_counter() - start)
+
+
+def imported(rows, workers, prefix):
+    from django.core.management import call_command
+
+    with tempfile.NamedTemporaryFile('w', suffix='.csv', newline='', delete=False) as file:
+        writer = csv.writer(file)
+        writer.writerow(COLUMNS)
+        writer.writerows(row(prefix, number) for number in range(rows))
+    try:
+        start = time.perf_counter()
+        call_command('import_patients', file.name, workers=workers, stdout=StringIO())
+        return rows / (time.perf_counter() - start)
+    finally:
+        os.remove(file.name)
+
+
+def run(rows, workers):
+    report(f'Patient import, rows/sec ({rows} rows, no passwords)', [
+        ('CustomUser/Patient save() per row', per_row(min(rows, 1000))),
+        ('import_patients, in process', imported(rows, 0, 'serial')),
+        (f'import_patients, {workers} processes', imported(rows, workers, 'parallel')),
+    ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+    setup()
+    run(args.rows, args.workers)
+
+
+if __name__ == '__main__':
+    main()
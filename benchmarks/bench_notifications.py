@@ -0,0 +1,72 @@
+"""
+Registration latency with the activation email sent in the request (before) against queued in the outbox
+
+The SMTP server is simulated by a backend taking --smtp-ms per message.
+
+    python -m benchmarks.bench_notifications --registrations 30 --smtp-ms 200
+"""
+import argparse
+import time
+
+from django.core.mail.backends.locmem import EmailBackend
+
+from . import report, setup
+from .bench_registration import latencies
+
+SMTP_SECONDS = 0.2
+
+
+class SlowEmailBackend(EmailBackend):
+
+    def send_messages(self, messages):
+        time.sleep(SMTP_SECONDS * len(messages))
+        return super().send_messages(messages)
+
+
+def run(registrations):
+    from django.conf import settings
+    from django.test import override_settings
+    from djoser import email
+
+    from Notification.outbox import send_pending
+
+    def percentiles(results):
+        results = sorted(results[1:])
+        return results[len(results) // 2], results[min(int(len(results) * 0.99), len(results) - 1)]
+
+    backend = f'{__name__}.SlowEmailBackend'
+    djoser_emails = {'activation': email.ActivationEmail, 'confirmation': email.ConfirmationEmail}
+    with override_settings(EMAIL_BACKEND=backend, DJOSER={**settings.DJOSER, 'EMAIL': djoser_emails}):
+        before = percentiles(latencies(registrations))
+    with override_settings(EMAIL_BACKEND=backend):
+        after = percentiles(latencies(registrations, first=registrations))
+        start = time.perf_counter()
+        sent = 0
+        while True:
+            count, _ = send_pending()
+            if not count:
+                break
+            sent += count
+        drained = sent / (time.perf_counter() - start)
+    report(f'Registration with activation email, ms ({SMTP_SECONDS * 1000:g} ms SMTP)', [
+        ('sent in the request, p50', before[0]),
+        ('sent in the request, p99', before[1]),
+        ('queued, p50', after[0]),
+        ('queued, p99', after[1]),
+    ])
+    report('Outbox worker, emails/s', [('one SMTP connection per batch', drained)])
+
+
+def main():
+    global SMTP_SECONDS
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--registrations', type=int, default=30)
+    parser.add_argument('--smtp-ms', type=float, default=200)
+    args = parser.parse_args()
+    SMTP_SECONDS = args.smtp_ms / 1000
+    setup()
+    run(args.registrations)
+
+
+if __name__ == '__main__':
+    main()
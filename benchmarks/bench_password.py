@@ -0,0 +1,56 @@
+"""
+Cost of CustomUser.save() for a profile-only update, by the algorithm of the stored password hash
+
+    python -m benchmarks.bench_password --saves 20
+"""
+import argparse
+import time
+
+from . import report, setup
+
+
+def milliseconds_per_save(user, saves, save):
+    start = time.perf_counter()
+    for number in range(saves):
+        user.first_name = f'John{number}'
+        save(user)
+    return (time.perf_counter() - start) / saves * 1000
+
+
+def run(saves):
+    from django.contrib.auth.hashers import make_password
+    from django.db import models
+
+    from Patient.models import CustomUser
+
+    def before(user):
+        # the previous check: anything not starting with pbkdf2_sha256$ was hashed again
+        if user.password and not user.password.startswith('pbkdf2_sha256$'):
+            user.password = make_password(user.password)
+        models.Model.save(user)
+
+    rows = []
+    for hasher in ['pbkdf2_sha256', 'scrypt', 'pbkdf2_sha1']:
+        user = CustomUser.objects.create(username=hasher, first_name='John', last_name='Doe',
+                                         phone_number=str(len(rows)).zfill(10), email=f'{hasher}@example.com',
+                                         gender='Male', birth_date='1990-01-01',
+                                         password=make_password('secret-password', hasher=hasher))
+        stored = user.password
+        rows.append((f'{hasher}, before', milliseconds_per_save(user, saves, before)))
+        # the previous check replaced the hash with a hash of the hash
+        CustomUser.objects.filter(pk=user.pk).update(password=stored)
+        user = CustomUser.objects.get(pk=user.pk)
+        rows.append((f'{hasher}, now', milliseconds_per_save(user, saves, CustomUser.save)))
+    report('Profile-only CustomUser.save(), ms/save', rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--saves', type=int, default=20)
+    args = parser.parse_args()
+    setup()
+    run(args.saves)
+
+
+if __name__ == '__main__':
+    main()
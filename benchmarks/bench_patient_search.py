@@ -0,0 +1,89 @@
+"""
+Patient search: blind index lookups against decrypt-and-filter
+
+    python -m benchmarks.bench_patient_search --rows 1000000
+
+Loading a million encrypted patients takes a while; the decrypt-and-filter
+baseline is measured on --baseline-rows rows and extrapolated linearly.
+"""
+import argparse
+import random
+import string
+import time
+
+from . import report, setup, timer
+
+LAST_NAMES = ['Doe', 'Smith', 'Shevchenko', 'Kovalenko', 'Bondarenko', 'Tkachenko', 'Kravchenko', 'Oliinyk']
+
+
+def create_patients(rows, batch_size=5000):
+    from Patient import blind_index
+    from Patient.models import CustomUser, LastNameBlindIndex, Patient
+
+    for offset in range(0, rows, batch_size):
+        users = []
+        for number in range(offset, min(rows, offset + batch_size)):
+            suffix = ''.join(random.choices(string.ascii_lowercase, k=4))
+            user = CustomUser(username=f'patient{number}', first_name='John',
+                              last_name=random.choice(LAST_NAMES) + suffix, phone_number=f'{number:010d}',
+                              email=f'patient{number}@example.com', gender='Male', birth_date='1990-01-01')
+            blind_index.update_hashes(user)
+            users.append(user)
+        CustomUser.objects.bulk_create(users)
+        LastNameBlindIndex.objects.bulk_create(row for user in users for row in blind_index.last_name_rows(user))
+        patients = [Patient(user=user, region='Region', neighborhood='Neighborhood', city='City', allergy='None',
+                            blood_type='O+', medical_insurance_number=f'INS{user.phone_number}')
+                    for user in users]
+        for patient in patients:
+            blind_index.update_hashes(patient)
+        Patient.objects.bulk_create(patients)
+
+
+def run(rows, baseline_rows, queries):
+    from rest_framework.test import APIClient
+
+    from Patient.models import CustomUser
+
+    timings = {}
+    with timer(timings, 'load'):
+        create_patients(rows)
+
+    client = APIClient()
+    client.force_authenticate(CustomUser.objects.create(username='staff', phone_number='x', email='staff@example.com',
+                                                 gender='Other', birth_date='1980-01-01', is_staff=True))
+    searches = {
+        'exact phone number': lambda: {'phone_number': f'{random.randrange(rows):010d}'},
+        'last name prefix': lambda: {'last_name': random.choice(LAST_NAMES)[:3] + random.choice('abc') + '*'},
+        'sounds like': lambda: {'sounds_like': random.choice(LAST_NAMES)},
+    }
+    results = []
+    for name, params in searches.items():
+        start = time.perf_counter()
+        for _ in range(queries):
+            response = client.get('/api/v1/patient/search/', params())
+            assert response.status_code == 200, response.content
+        results.append((f'{name} (ms/query)', (time.perf_counter() - start) / queries * 1000))
+
+    # what staff scripts did so far: decrypt every last name and compare in Python
+    sample = min(rows, baseline_rows)
+    with timer(timings, 'baseline'):
+        prefix = LAST_NAMES[0][:3].casefold()
+        [user for user in CustomUser.objects.only('last_name')[:sample]
+         if user.last_name.casefold().startswith(prefix)]
+    results.append(('decrypt-and-filter (ms/query)', timings['baseline'] / sample * rows * 1000))
+
+    report(f'Patient search over {rows:,} patients (loaded in {timings["load"]:.0f} s)', results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--baseline-rows', type=int, default=20_000)
+    parser.add_argument('--queries', type=int, default=200)
+    args = parser.parse_args()
+    setup()
+    run(args.rows, args.baseline_rows, args.queries)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""
+Latency of a djoser registration, POST /api/v1/patient/auth/users/, queuing its activation email
+
+The password hashing of the first of PASSWORD_HASHERS takes most of the time.
+
+    python -m benchmarks.bench_registration --registrations 50
+"""
+import argparse
+import statistics
+import time
+
+from . import report, setup
+
+URL = '/api/v1/patient/auth/users/'
+
+
+def latencies(registrations, first=0):
+    """Milliseconds taken by every registration, of the users numbered from `first`"""
+    from django.test import Client
+
+    client = Client()
+    results = []
+    for number in range(first, first + registrations):
+        data = {
+            'username': f'registered{number}', 'email': f'registered{number}@example.com',
+            'first_name': 'John', 'last_name': 'Doe', 'phone_number': f'5{number:09d}', 'gender': 'Male',
+            'birth_date': '1990-01-01', 'password': 'Secret-password-1', 're_password': 'Secret-password-1',
+        }
+        start = time.perf_counter()
+        response = client.post(URL, data, content_type='application/json')
+        results.append((time.perf_counter() - start) * 1000)
+        if response.status_code != 201:
+            raise RuntimeError(f'registration failed with {response.status_code}: {response.content[:200]}')
+    return results
+
+
+def run(registrations):
+    from django.conf import settings
+
+    results = latencies(registrations)
+    # the first request also imports and builds the views
+    steady = sorted(results[1:])
+    hasher = settings.PASSWORD_HASHERS[0].rsplit('.', 1)[-1]
+    report(f'djoser registration, {hasher}, ms', [
+        ('first', results[0]),
+        ('mean', statistics.fmean(steady)),
+        ('p50', steady[len(steady) // 2]),
+        ('p95', steady[min(int(len(steady) * 0.95), len(steady) - 1)]),
+    ], unit='ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--registrations', type=int, default=50)
+    args = parser.parse_args()
+    if args.registrations < 2:
+        parser.error('--registrations must be at least 2')
+    setup()
+    run(args.registrations)
+
+
+if __name__ == '__main__':
+    main()
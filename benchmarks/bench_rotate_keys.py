@@ -0,0 +1,55 @@
+"""
+Key rotation throughput: rotate_keys in this process against worker processes
+
+    python -m benchmarks.bench_rotate_keys --records 20000 --workers 4
+"""
+import argparse
+import os
+import tempfile
+import time
+from io import StringIO
+
+from . import report, setup
+from .bench_timeline import create_records
+
+
+def values_per_second(records, workers, keys):
+    from django.core.management import call_command
+    from django.test import override_settings
+
+    checkpoint = os.path.join(tempfile.gettempdir(), 'bench-rotate-keys.checkpoint')
+    # left behind by an interrupted run, it would skip rows of this database
+    if os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    with override_settings(SECURED_FIELDS_KEY=keys):
+        start = time.perf_counter()
+        call_command('rotate_keys', workers=workers, checkpoint=checkpoint, skip_files=True, stdout=StringIO())
+        elapsed = time.perf_counter() - start
+    # description, created_at and updated_at of every record
+    return records * 3 / elapsed
+
+
+def run(records, workers):
+    from cryptography.fernet import Fernet
+    from django.conf import settings
+
+    create_records(records)
+    # every run rotates all values to a fresh key
+    first, second = Fernet.generate_key().decode(), Fernet.generate_key().decode()
+    report(f'rotate_keys, values/s ({records} records)', [
+        ('in this process', values_per_second(records, 0, [first, *settings.SECURED_FIELDS_KEY])),
+        (f'{workers} worker processes', values_per_second(records, workers, [second, first])),
+    ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--records', type=int, default=20000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+    setup()
+    run(args.records, args.workers)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+Re-publishing the weekly rotas of many doctors: row by row through the ORM (before) against Doctor.schedule
+
+    python -m benchmarks.bench_schedule --doctors 500
+"""
+import argparse
+import time
+from datetime import time as clock
+
+from django.db import connection, transaction
+
+from . import report, setup
+
+# two shifts on weekdays, one on Saturday
+ROTA = [(weekday, clock(8), clock(12)) for weekday in range(1, 7)] + \
+       [(weekday, clock(13), clock(17)) for weekday in range(1, 6)]
+
+
+def create_doctors(doctors):
+    from Doctor.models import Doctor
+    from Patient.models import CustomUser
+
+    users = CustomUser.objects.bulk_create(
+        CustomUser(username=f'doctor{number}', first_name='Test', last_name=f'Doctor{number}',
+                   phone_number=f'{number:010d}', email=f'doctor{number}@example.com', gender='Male',
+                   birth_date='1980-01-01')
+        for number in range(doctors)
+    )
+    return [doctor.pk for doctor in Doctor.objects.bulk_create(
+        Doctor(user=user, specialty=f'Specialty{number % 10}', phone_general='1', cabinet=str(number % 50))
+        for number, user in enumerate(users)
+    )]
+
+
+def row_by_row(schedules):
+    from Doctor.models import OpeningHours
+
+    with transaction.atomic():
+        for doctor_id, intervals in schedules.items():
+            OpeningHours.objects.filter(doctor_id=doctor_id).delete()
+            for weekday, open_hour, close_hour in intervals:
+                OpeningHours.objects.create(doctor_id=doctor_id, weekday=weekday, open_hour=open_hour,
+                                            close_hour=close_hour)
+
+
+def timed(function, schedules):
+    queries = []
+
+    def count(execute, sql, params, many, context):
+        queries.append(sql)
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(count):
+        start = time.perf_counter()
+        function(schedules)
+        elapsed = time.perf_counter() - start
+    return elapsed * 1000, len(queries)
+
+
+def run(doctors):
+    from Doctor.schedule import publish
+
+    doctor_ids = create_doctors(doctors)
+    rota = {doctor_id: ROTA for doctor_id in doctor_ids}
+    # every doctor swaps the afternoon shift for a later one
+    changed = {doctor_id: ROTA[:6] + [(weekday, clock(14), clock(18)) for weekday in range(1, 6)]
+               for doctor_id in doctor_ids}
+    rows = []
+    for label, function in [('row by row', row_by_row), ('diff upsert', publish)]:
+        for name, schedules in [('first publish', rota), ('afternoons changed', changed), ('unchanged', changed)]:
+            if name == 'first publish':
+                row_by_row({doctor_id: [] for doctor_id in doctor_ids})
+            elapsed, queries = timed(function, schedules)
+            rows.append((f'{label}, {name}, ms ({queries} queries)', elapsed))
+    report(f'Publishing the rotas of {doctors} doctors', rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--doctors', type=int, default=500)
+    args = parser.parse_args()
+    setup()
+    run(args.doctors)
+
+
+if __name__ == '__main__':
+    main()
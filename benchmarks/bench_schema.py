@@ -0,0 +1,56 @@
+"""
+Cost of GET /api/schema/: rendered on every request (before) against the precomputed variants
+
+    python -m benchmarks.bench_schema --requests 20
+"""
+import argparse
+import tempfile
+import time
+from io import StringIO
+
+from . import report, setup
+
+
+def milliseconds_per_request(get, requests, **headers):
+    start = time.perf_counter()
+    for _ in range(requests):
+        response = get('/api/schema/', **headers)
+        assert response.status_code in (200, 304), response.status_code
+    return (time.perf_counter() - start) / requests * 1000, len(response.content)
+
+
+def run(requests):
+    from django.core.management import call_command
+    from django.test import Client, RequestFactory, override_settings
+    from drf_spectacular.views import SpectacularAPIView
+
+    view = SpectacularAPIView.as_view()
+
+    def rendered(path, **headers):
+        return view(RequestFactory().get(path, **headers)).render()
+
+    client = Client()
+    elapsed, size = milliseconds_per_request(rendered, requests)
+    rows = [(f'rendered per request, {size:,} bytes', elapsed)]
+    with tempfile.TemporaryDirectory() as directory, override_settings(OPENAPI_SCHEMA_DIR=directory):
+        call_command('precompute_schema', stdout=StringIO())
+        for label, headers in [('precomputed', {}), ('precomputed, gzip', {'HTTP_ACCEPT_ENCODING': 'gzip'}),
+                               ('precomputed, brotli', {'HTTP_ACCEPT_ENCODING': 'br'})]:
+            elapsed, size = milliseconds_per_request(client.get, requests, **headers)
+            rows.append((f'{label}, {size:,} bytes', elapsed))
+        etag = client.get('/api/schema/')['ETag']
+        elapsed, _ = milliseconds_per_request(client.get, requests, HTTP_IF_NONE_MATCH=etag)
+        rows.append(('precomputed, revalidated (304)', elapsed))
+    report('GET /api/schema/, ms/request', rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=20)
+    args = parser.parse_args()
+    setup()
+    run(args.requests)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""
+Serializer throughput: rows rendered (decryption included) and registrations validated per second
+
+Rows are loaded before the clock starts, fresh for every repeat, so only
+serialization and the decryption it triggers are timed. The compiled
+serializers (Patient.compiled) are compared with the DRF path they replace,
+exports (query included) with the rows of `values_list()`, and the orjson
+renderer with DRF's JSONRenderer.
+
+    python -m benchmarks.bench_serializers --rows 500 --repeat 10
+"""
+import argparse
+import time
+
+from . import report, setup
+from .bench_crud import fill
+
+
+def rows_per_second(load, serialize, repeat):
+    elapsed = rows = 0
+    # warm up (compiled serializers, caches)
+    serialize(load())
+    for _ in range(repeat):
+        instances = load()
+        start = time.perf_counter()
+        serialize(instances)
+        elapsed += time.perf_counter() - start
+        rows += len(instances)
+    return rows / elapsed
+
+
+def per_second(function, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return repeat / (time.perf_counter() - start)
+
+
+def uncompiled(serializer_class):
+    return type(serializer_class.__name__, (serializer_class,), {'compile_representation': False})
+
+
+def validations_per_second(repeat):
+    from Patient.serializers import CustomUserCreatePasswordRetypeSerializer
+
+    start = time.perf_counter()
+    for number in range(repeat):
+        serializer = CustomUserCreatePasswordRetypeSerializer(data={
+            'username': f'validated{number}', 'email': f'validated{number}@example.com', 'first_name': 'John',
+            'last_name': 'Doe', 'phone_number': f'7{number:09d}', 'gender': 'Male', 'birth_date': '1990-01-01',
+            'password': 'Secret-password-1', 're_password': 'Secret-password-1',
+        })
+        if not serializer.is_valid():
+            raise RuntimeError(serializer.errors)
+    return repeat / (time.perf_counter() - start)
+
+
+def run(rows, repeat):
+    from django.db.models import Prefetch
+
+    from rest_framework.renderers import JSONRenderer
+
+    from Doctor.models import Doctor, OpeningHours
+    from Doctor.serializers import DoctorDirectorySerializer
+    from Patient.compiled import compile_serializer
+    from Patient.models import CustomUser, Patient, Record
+    from Patient.serializers import CustomUserCreatePasswordRetypeSerializer, PatientSerializer, RecordSerializer
+    from Polyclinic import renderers
+
+    fill(0, rows)
+    patients = Patient.objects.order_by('pk')[:rows]
+    records = Record.objects.order_by('pk')[:rows]
+    users = CustomUser.objects.order_by('pk')[:rows]
+    doctors = (Doctor.objects.select_related('user').order_by('pk')
+               .prefetch_related(Prefetch('openinghours_set', OpeningHours.objects.order_by('weekday')))[:rows])
+
+    def listed(serializer_class):
+        return lambda instances: serializer_class(instances, many=True).data
+
+    def one_by_one(serializer_class):
+        return lambda instances: [serializer_class(instance).data for instance in instances]
+
+    report(f'Serializers, rows/s ({rows} rows)', [
+        ('PatientSerializer, list', rows_per_second(lambda: list(patients), listed(PatientSerializer), repeat)),
+        ('PatientSerializer, list, DRF',
+         rows_per_second(lambda: list(patients), listed(uncompiled(PatientSerializer)), repeat)),
+        ('PatientSerializer, one by one',
+         rows_per_second(lambda: list(patients), one_by_one(PatientSerializer), repeat)),
+        ('PatientSerializer, one by one, DRF',
+         rows_per_second(lambda: list(patients), one_by_one(uncompiled(PatientSerializer)), repeat)),
+        ('user serializer, list',
+         rows_per_second(lambda: list(users), listed(CustomUserCreatePasswordRetypeSerializer), repeat)),
+        ('user serializer, list, DRF',
+         rows_per_second(lambda: list(users), listed(uncompiled(CustomUserCreatePasswordRetypeSerializer)), repeat)),
+        ('RecordSerializer, list', rows_per_second(lambda: list(records), listed(RecordSerializer), repeat)),
+        ('RecordSerializer, list, DRF',
+         rows_per_second(lambda: list(records), listed(uncompiled(RecordSerializer)), repeat)),
+        ('DoctorDirectorySerializer, list',
+         rows_per_second(lambda: list(doctors), listed(DoctorDirectorySerializer), repeat)),
+        ('registration, validated', validations_per_second(rows)),
+    ], unit='rows/s')
+
+    compiled = compile_serializer(PatientSerializer)
+    report(f'Patient export, queried and serialized, exports/s ({rows} rows)', [
+        ('instances, DRF', per_second(lambda: uncompiled(PatientSerializer)(patients.all(), many=True).data, repeat)),
+        ('instances, compiled', per_second(lambda: PatientSerializer(patients.all(), many=True).data, repeat)),
+        ('values_list rows, compiled', per_second(lambda: compiled.rows(patients.all()), repeat)),
+    ], unit='exports/s')
+
+    payload = PatientSerializer(patients, many=True).data
+    rendering = [('JSONRenderer', per_second(lambda: JSONRenderer().render(payload), repeat * 10))]
+    if renderers.orjson is not None:
+        rendering.append(('ORJSONRenderer', per_second(lambda: renderers.ORJSONRenderer().render(payload), repeat * 10)))
+    report(f'Rendering a page of patients as JSON, pages/s ({rows} rows)', rendering, unit='pages/s')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+    setup()
+    run(args.rows, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""
+Credential stuffing against POST /api/v1/patient/auth/token/login/, with and without the auth throttle
+
+Wrong passwords for random usernames are sent from a few addresses, then a
+legitimate user logs in. Every admitted attempt costs a password hash (the
+first of PASSWORD_HASHERS), a rejected one is answered 429 before it. The
+benchmark settings disable the throttle; it is enabled here with the
+limits of Polyclinic.settings.
+
+    python -m benchmarks.bench_throttle --attempts 60 --addresses 2
+"""
+import argparse
+import statistics
+import time
+
+from . import report, setup
+
+URL = '/api/v1/patient/auth/token/login/'
+
+
+def attack(attempts, addresses, enabled):
+    from django.conf import settings
+    from django.test import Client, override_settings
+
+    from Patient import throttling
+
+    throttling.get_bucket_store().clear()
+    throttling.throttle_metrics.clear()
+    client = Client()
+    latencies = {200: [], 400: [], 429: []}
+    with override_settings(AUTH_THROTTLE={**settings.AUTH_THROTTLE, 'ENABLED': enabled}):
+        cpu = time.process_time()
+        for number in range(attempts):
+            start = time.perf_counter()
+            response = client.post(URL, {'username': f'victim{number}', 'password': 'guess'},
+                                   content_type='application/json', REMOTE_ADDR=f'203.0.113.{number % addresses}')
+            latencies[response.status_code].append((time.perf_counter() - start) * 1000)
+        cpu = time.process_time() - cpu
+        start = time.perf_counter()
+        response = client.post(URL, {'username': 'legitimate', 'password': 'Secret-password-1'},
+                               content_type='application/json', REMOTE_ADDR='198.51.100.1')
+        legitimate = (time.perf_counter() - start) * 1000
+        if response.status_code != 200:
+            raise RuntimeError(f'the legitimate login failed with {response.status_code}')
+    state = 'on' if enabled else 'off'
+    report(f'Credential stuffing, throttle {state} ({attempts} attempts from {addresses} addresses)', [
+        ('admitted attempts', len(latencies[400])),
+        ('rejected attempts', len(latencies[429])),
+        ('CPU seconds', cpu),
+        ('admitted attempt, mean ms', statistics.fmean(latencies[400]) if latencies[400] else 0.0),
+        ('rejected attempt, mean ms', statistics.fmean(latencies[429]) if latencies[429] else 0.0),
+        ('legitimate login, ms', legitimate),
+    ])
+
+
+def run(attempts, addresses):
+    from Patient.models import CustomUser
+
+    CustomUser.objects.create_user(username='legitimate', password='Secret-password-1', is_active=True,
+                                   email='legitimate@example.com', phone_number='5550000000', gender='Female',
+                                   birth_date='1990-01-01')
+    attack(attempts, addresses, enabled=False)
+    attack(attempts, addresses, enabled=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--attempts', type=int, default=60)
+    parser.add_argument('--addresses', type=int, default=2)
+    args = parser.parse_args()
+    setup()
+    run(args.attempts, args.addresses)
+
+
+if __name__ == '__main__':
+    main()
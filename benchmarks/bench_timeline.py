@@ -0,0 +1,90 @@
+"""
+Record timeline of one patient: OFFSET pages against cursor pages
+
+    python -m benchmarks.bench_timeline --records 20000 --page-size 50
+"""
+import argparse
+import time
+from datetime import timedelta
+
+from . import report, setup
+
+
+def create_records(records):
+    from django.utils import timezone
+
+    from Doctor.models import Doctor
+    from Patient.models import CustomUser, Patient, Record
+
+    users = [CustomUser.objects.create(username=f'user{number}', first_name='John', last_name='Doe',
+                                       phone_number=f'{number:010d}', email=f'user{number}@example.com',
+                                       gender='Male', birth_date='1990-01-01')
+             for number in range(2)]
+    doctor = Doctor.objects.create(user=users[0], specialty='Cardiology', phone_general='1', cabinet='1')
+    patient = Patient.objects.create(user=users[1], region='Region', neighborhood='Neighborhood', city='City',
+                                     allergy='None', blood_type='O+')
+    start = timezone.now()
+    Record.objects.bulk_create(
+        Record(description=f'Visit {number}', doctor_autohor=doctor, patient=patient,
+               created_at=start - timedelta(hours=number), timeline_key=start - timedelta(hours=number))
+        for number in range(records)
+    )
+    return patient
+
+
+def milliseconds(fetch, repeat=5):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fetch()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def run(records, page_size):
+    from rest_framework.request import Request
+    from rest_framework.test import APIClient, APIRequestFactory
+
+    from Patient.models import CustomUser, Record
+    from Patient.pagination import TimelinePagination
+
+    patient = create_records(records)
+    queryset = Record.objects.filter(patient=patient).order_by('-timeline_key', '-id')
+    last_page = records // page_size - 1
+    # the cursor of the last page points at the record just before it
+    cursor = TimelinePagination().encode_cursor(queryset[last_page * page_size - 1])
+
+    def offset_page(page):
+        return lambda: list(queryset[page * page_size:(page + 1) * page_size])
+
+    def cursor_page(params):
+        request = Request(APIRequestFactory().get('/', {'page_size': page_size, **params}))
+        return lambda: TimelinePagination().paginate_queryset(queryset, request)
+
+    client = APIClient()
+    client.force_authenticate(CustomUser.objects.create(username='staff', phone_number='5555555555',
+                                                        email='staff@example.com', birth_date='1980-01-01',
+                                                        is_staff=True))
+    url = f'/api/v1/patient/{patient.pk}/records/'
+    client.get(url)
+
+    report(f'Record timeline, ms/page ({records} records, {page_size} per page)', [
+        ('OFFSET query, first page', milliseconds(offset_page(0))),
+        (f'OFFSET query, page {last_page + 1}', milliseconds(offset_page(last_page))),
+        ('cursor query, first page', milliseconds(cursor_page({}))),
+        (f'cursor query, page {last_page + 1}', milliseconds(cursor_page({'cursor': cursor}))),
+        ('endpoint, first page', milliseconds(lambda: client.get(url, {'page_size': page_size}))),
+        (f'endpoint, page {last_page + 1}',
+         milliseconds(lambda: client.get(url, {'page_size': page_size, 'cursor': cursor}))),
+    ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--records', type=int, default=20000)
+    parser.add_argument('--page-size', type=int, default=50)
+    args = parser.parse_args()
+    setup()
+    run(args.records, args.page_size)
+
+
+if __name__ == '__main__':
+    main()
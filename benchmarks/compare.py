@@ -0,0 +1,60 @@
+"""
+Compare two result files of benchmarks.run, e.g. of a commit and its parent
+
+Rows are matched by title and label. Units per second are better when
+higher, the others (ms) when lower. Exits with status 1 when any row got
+worse by more than --threshold percent.
+
+    python -m benchmarks.compare before.json after.json --threshold 10
+"""
+import argparse
+import json
+import sys
+
+
+def load(path):
+    with open(path) as file:
+        return json.load(file)
+
+
+def changes(before, after):
+    """(title, label, unit, before, after, percent better) of the rows measured in both runs"""
+    measured = {(row['title'], row['label']): row for row in before['results']}
+    for row in after['results']:
+        old = measured.get((row['title'], row['label']))
+        if old is None or not old['value']:
+            continue
+        change = (row['value'] - old['value']) / old['value'] * 100
+        better = change if row['unit'].endswith('/s') else -change
+        yield row['title'], row['label'], row['unit'], old['value'], row['value'], better
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('before')
+    parser.add_argument('after')
+    parser.add_argument('--threshold', type=float, default=10, help="percent a row may get worse")
+    args = parser.parse_args()
+    before, after = load(args.before), load(args.after)
+
+    for name in ['database', 'machine', 'parameters']:
+        if before.get(name) != after.get(name):
+            print(f'warning: {name} differs: {before.get(name)} / {after.get(name)}')
+    print(f"{(before['commit'] or '?')[:10]} -> {(after['commit'] or '?')[:10]}")
+
+    regressions = 0
+    title = None
+    for row_title, label, unit, old, new, better in changes(before, after):
+        if row_title != title:
+            title = row_title
+            print(title)
+        regressed = better < -args.threshold
+        regressions += regressed
+        print(f"  {label:<40} {old:>14,.2f} {new:>14,.2f} {unit:<6} {better:+7.1f}%{'  REGRESSION' if regressed else ''}")
+    if regressions:
+        print(f'{regressions} row(s) worse by more than {args.threshold:g}%')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""
+HTTP load test of one endpoint, to compare a WSGI and an ASGI deployment
+
+Prepare a patient with records and a token in the benchmark database:
+
+    python -m benchmarks.load_test prepare --records 200
+
+then serve the project with DJANGO_SETTINGS_MODULE=benchmarks.settings, e.g.
+
+    gunicorn Polyclinic.wsgi --workers 1 --threads 16 --bind 127.0.0.1:8000
+    uvicorn Polyclinic.asgi:application --workers 1 --port 8001
+
+and load the sync and the async variant of an endpoint:
+
+    python -m benchmarks.load_test run --url http://127.0.0.1:8000/api/v1/patient/me/ --token <token>
+    python -m benchmarks.load_test run --url http://127.0.0.1:8001/api/v1/async/patient/me/ --token <token>
+
+--slow-client holds every connection open for the given number of milliseconds
+before finishing the request, like a mobile client on a slow network.
+"""
+import argparse
+import asyncio
+import time
+from datetime import timedelta
+from urllib.parse import urlsplit
+
+from . import report, setup
+
+
+def prepare(records):
+    from django.utils import timezone
+    from rest_framework.authtoken.models import Token
+
+    from Doctor.models import Doctor
+    from Patient.models import CustomUser, Patient, Record
+
+    users = [CustomUser.objects.create(username=f'user{number}', first_name='John', last_name='Doe',
+                                       phone_number=f'{number:010d}', email=f'user{number}@example.com',
+                                       gender='Male', birth_date='1990-01-01', is_active=True)
+             for number in range(2)]
+    doctor = Doctor.objects.create(user=users[0], specialty='Cardiology', phone_general='1', cabinet='1')
+    patient = Patient.objects.create(user=users[1], region='Region', neighborhood='Neighborhood', city='City',
+                                     allergy='None', blood_type='O+')
+    now = timezone.now()
+    Record.objects.bulk_create(
+        Record(description=f'Visit {number}', doctor_autohor=doctor, patient=patient,
+               created_at=now - timedelta(days=number), timeline_key=now - timedelta(days=number))
+        for number in range(records)
+    )
+    print(f'token:   {Token.objects.create(user=patient.user).key}')
+    print(f'patient: {patient.pk}')
+
+
+async def fetch(url, token, slow_client):
+    """Status code and latency in seconds of one GET, on its own connection"""
+    parts = urlsplit(url)
+    start = time.perf_counter()
+    reader, writer = await asyncio.open_connection(parts.hostname, parts.port or 80)
+    try:
+        path = parts.path + (f'?{parts.query}' if parts.query else '')
+        writer.write(f'GET {path} HTTP/1.1\r\nHost: {parts.netloc}\r\n'.encode())
+        if slow_client:
+            await writer.drain()
+            await asyncio.sleep(slow_client / 1000)
+        authorization = f'Authorization: Token {token}\r\n' if token else ''
+        writer.write(f'{authorization}Connection: close\r\n\r\n'.encode())
+        await writer.drain()
+        status = int((await reader.readline()).split()[1])
+        await reader.read()
+        return status, time.perf_counter() - start
+    finally:
+        writer.close()
+
+
+async def load(url, token, requests, concurrency, slow_client):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], 0
+
+    async def one():
+        nonlocal errors
+        async with semaphore:
+            try:
+                status, latency = await fetch(url, token, slow_client)
+            except (OSError, ValueError, IndexError):
+                errors += 1
+                return
+            if status >= 400:
+                errors += 1
+            latencies.append(latency)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+
+    def percentile(fraction):
+        return latencies[min(int(len(latencies) * fraction), len(latencies) - 1)] * 1000 if latencies else 0.0
+
+    report(f'{url} ({requests} requests, {concurrency} concurrent)', [
+        ('requests/sec', requests / elapsed),
+        ('errors', errors),
+        ('p50 ms', percentile(0.5)),
+        ('p99 ms', percentile(0.99)),
+    ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+    prepare_parser = commands.add_parser('prepare')
+    prepare_parser.add_argument('--records', type=int, default=200)
+    run_parser = commands.add_parser('run')
+    run_parser.add_argument('--url', required=True)
+    run_parser.add_argument('--token')
+    run_parser.add_argument('--requests', type=int, default=2000)
+    run_parser.add_argument('--concurrency', type=int, default=200)
+    run_parser.add_argument('--slow-client', type=int, default=0, metavar='MS')
+    args = parser.parse_args()
+    if args.command == 'prepare':
+        setup()
+        prepare(args.records)
+    else:
+        asyncio.run(load(args.url, args.token, args.requests, args.concurrency, args.slow_client))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+"""
+Regression suite: CRUD, serializer and registration benchmarks, written as JSON for benchmarks.compare
+
+Each benchmark starts from an empty database. The results go to
+benchmarks/results/<commit>.json unless --output is given.
+
+    python -m benchmarks.run --sizes 1000,100000,1000000
+    python -m benchmarks.compare benchmarks/results/<before>.json benchmarks/results/<after>.json
+"""
+import argparse
+import os
+
+from . import _git, bench_crud, bench_registration, bench_serializers, setup, write_results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=bench_crud.sizes, default=[1000, 100000],
+                        help="comma separated table sizes of the CRUD benchmark, ascending")
+    parser.add_argument('--sample', type=int, default=200, help="single operations timed per model and size")
+    parser.add_argument('--rows', type=int, default=500, help="rows per serializer call")
+    parser.add_argument('--repeat', type=int, default=10, help="serializer calls timed")
+    parser.add_argument('--registrations', type=int, default=50)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+    if args.sample < 2 or args.registrations < 2:
+        parser.error('--sample and --registrations must be at least 2')
+
+    setup()
+    bench_crud.run(args.sizes, args.sample)
+    setup()
+    bench_serializers.run(args.rows, args.repeat)
+    setup()
+    bench_registration.run(args.registrations)
+
+    output = args.output or os.path.join('benchmarks', 'results', f"{_git('rev-parse', '--short', 'HEAD')}.json")
+    parameters = {name: value for name, value in vars(args).items() if name != 'output'}
+    write_results(output, parameters)
+    print(f'Results written to {output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,29 @@
+import base64
+import hashlib
+import os
+import tempfile
+
+# benchmarks must not require a configured env_file/.env.app; the key is fixed so that
+# servers started for load tests can read the data the benchmarks wrote
+os.environ.setdefault('SECRET_KEY', 'benchmark')
+os.environ.setdefault('ENCRYPTION_KEY', base64.urlsafe_b64encode(hashlib.sha256(b'benchmark').digest()).decode())
+os.environ.setdefault('SECURED_FILDS_HASH', 'benchmark')
+os.environ.setdefault('BLIND_INDEX_KEY', 'benchmark')
+
+from Polyclinic.settings import *  # noqa: E402,F401,F403
+
+DEBUG = False
+ALLOWED_HOSTS = ['*']
+
+if os.getenv('BENCH_DB', 'sqlite') == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.getenv('BENCH_SQLITE_PATH', os.path.join(tempfile.gettempdir(), 'polyclinic-bench.sqlite3')),
+            'OPTIONS': {'timeout': 60},
+        }
+    }
+    DATABASE_REPLICAS = []
+
+# the benchmarks register and log in far more users per second than a client may
+AUTH_THROTTLE = {**AUTH_THROTTLE, 'ENABLED': False}  # noqa: F405